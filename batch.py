@@ -0,0 +1,275 @@
+"""多核批量处理Markdown文件
+
+同一目录下的Markdown文件共用一个图片目录，按图片描述生成的文件名可能互相冲突，
+因此按所在目录分组：组内串行处理，各组之间并行处理。
+文件流被切成同一目录内的小块依次提交，这样进度可以按块更新，取消也能在块之间生效。
+输入可以是扫描器产出的生成器，边发现边处理，已排队的块数有上限，不会一次读入整个目录树。
+"""
+import os
+import uuid
+from collections import Counter, deque, namedtuple
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+)
+
+import core_logic
+import events
+import file_ops
+import naming
+from note_index import NoteIndex
+
+# 每次提交给工作进程的文件数
+CHUNK_SIZE = 8
+# 每个并行单位最多排队的块数，超过后暂停从输入中取文件
+QUEUED_CHUNKS_PER_WORKER = 4
+# 工作进程中每块最多收集的消息数
+CHUNK_EVENT_CAPACITY = 1000
+
+# 批量处理的汇总结果
+# results 为 (文件路径, 图片数) 列表，cancelled 表示是否被中途取消，
+# stats 为 process_md_file 累加的计数器（复制/跳过的文件数和字节数、处理失败的笔记数 errors）
+BatchResult = namedtuple("BatchResult", ["files", "images", "results", "cancelled", "stats"])
+
+
+def directory_key(md_file):
+    """返回文件所在目录的分组键"""
+    return os.path.normcase(os.path.dirname(os.path.abspath(md_file)))
+
+
+def iter_chunks(md_files, size=CHUNK_SIZE):
+    """把文件流切成块，产出 (目录键, 文件列表)
+
+    块内文件属于同一目录且不超过 size 个（为 None 时不限制，每个目录一块）。
+    扫描器连续产出同一目录的文件，因此切出的块通常是满的。
+    """
+    key = None
+    chunk = []
+    for md_file in md_files:
+        k = directory_key(md_file)
+        if chunk and (k != key or (size is not None and len(chunk) >= size)):
+            yield key, chunk
+            chunk = []
+        key = k
+        chunk.append(md_file)
+    if chunk:
+        yield key, chunk
+
+
+# 当前进程中本批次的状态:
+# (批次标识, DirCache, {目录键: (图片目录的 NameIndex, 去重模式下图片目录的 ContentIndex)})
+_batch_state = None
+
+
+def _dir_indexes(dir_cache, img_dir, dedup):
+    contents = file_ops.ContentIndex(img_dir) if dedup else None
+    return naming.NameIndex(img_dir, dir_cache.names(img_dir)), contents
+
+
+def _chunk_state(batch_id, note_dir, img_dir, reuse, dedup=False):
+    """返回本进程中该批次共用的目录列表缓存，以及块所在目录的文件名索引和内容索引
+
+    同一目录的块依次处理。上一块在本进程中处理时（reuse），直接沿用缓存的目录列表和索引；
+    否则这两个目录可能刚被其他进程改动过，重新读取。新批次开始时丢弃旧的状态。
+    """
+    global _batch_state
+    if batch_id is None:
+        dir_cache = file_ops.DirCache()
+        return (dir_cache,) + _dir_indexes(dir_cache, img_dir, dedup)
+    if _batch_state is None or _batch_state[0] != batch_id:
+        _batch_state = (batch_id, file_ops.DirCache(), {})
+    _, dir_cache, indexes_by_dir = _batch_state
+    key = os.path.normcase(note_dir)
+    indexes = indexes_by_dir.get(key) if reuse else None
+    if indexes is None:
+        if not reuse:
+            dir_cache.forget(note_dir)
+            dir_cache.forget(img_dir)
+        indexes = indexes_by_dir[key] = _dir_indexes(dir_cache, img_dir, dedup)
+    return (dir_cache,) + indexes
+
+
+def _process_chunk(md_files, img_dir_name, index_path=None, dedup=False, move=False,
+                   shared_images=None, copy_strategy="auto", batch_id=None, remote_images=None,
+                   event_level=None, previous_worker=None):
+    """串行处理同一目录下的一块文件，返回 ((文件路径, 图片数) 列表, 计数器, 消息, 进程号)
+
+    需要定义在模块顶层，以便进程池序列化。
+    每块单独打开增量索引，处理完后提交，SQLite 负责多进程间的并发写入。
+    同一进程处理的同一批次的块共用一个目录列表缓存，同一目录的块共用图片目录的文件名索引。
+    previous_worker 为处理同一目录上一块的进程号；不是本进程时（包括第一块），块所在的目录和
+    图片目录可能被其他进程改动过，重新读取。
+    在工作进程中运行时 event_level 为主进程接收器的级别，不低于该级别的消息收集起来
+    作为 (事件列表, 丢弃数) 返回；否则消息直接交给当前接收器，返回 None。
+    """
+    reuse = previous_worker == os.getpid()
+    if event_level is None:
+        return _process_chunk_files(md_files, img_dir_name, index_path, dedup, move,
+                                    shared_images, copy_strategy, batch_id, remote_images,
+                                    reuse) + (None, os.getpid())
+    sink = events.RingBufferSink(CHUNK_EVENT_CAPACITY, event_level)
+    previous = events.set_sink(sink)
+    try:
+        results, stats = _process_chunk_files(md_files, img_dir_name, index_path, dedup, move,
+                                              shared_images, copy_strategy, batch_id,
+                                              remote_images, reuse)
+    finally:
+        events.set_sink(previous)
+    return results, stats, sink.drain(), os.getpid()
+
+
+def _process_chunk_files(md_files, img_dir_name, index_path, dedup, move, shared_images,
+                         copy_strategy, batch_id, remote_images, reuse):
+    stats = Counter()
+    note_dir = os.path.dirname(os.path.abspath(md_files[0]))
+    img_dir = os.path.join(note_dir, img_dir_name)
+    dir_cache, names, contents = _chunk_state(batch_id, note_dir, img_dir, reuse, dedup)
+    if index_path is None:
+        results = [(md_file, core_logic.process_md_file(md_file, None, img_dir_name, stats,
+                                                        dedup=dedup, move=move,
+                                                        shared_images=shared_images,
+                                                        copy_strategy=copy_strategy,
+                                                        dir_cache=dir_cache, names=names,
+                                                        remote_images=remote_images,
+                                                        content_index=contents))
+                   for md_file in md_files]
+        return results, stats
+
+    with NoteIndex(index_path) as index:
+        results = [(md_file, core_logic.process_md_file(md_file, None, img_dir_name, stats, index,
+                                                        dedup, move, shared_images,
+                                                        copy_strategy, dir_cache, names,
+                                                        remote_images, contents))
+                   for md_file in md_files]
+    return results, stats
+
+
+def process_batch(md_files, img_dir_name="img", workers=None, use_threads=False,
+                  progress_callback=None, cancel_event=None, index_path=None, dedup=False,
+                  move=False, shared_images=None, copy_strategy="auto", remote_images=None):
+    """并行处理多个Markdown文件
+
+    Args:
+        md_files: Markdown文件路径列表，或逐个产出路径的可迭代对象
+        img_dir_name: 图片保存目录名称，默认为"img"
+        workers: 并行数，默认为CPU核数
+        use_threads: 使用线程池代替进程池
+        progress_callback: 进度回调函数，参数为 (已完成文件数, 文件总数)；
+            输入为生成器且尚未扫描完时文件总数为 0
+        cancel_event: threading.Event，被设置后不再提交新的文件
+        index_path: 增量索引文件路径，为 None 时不使用增量模式
+        dedup: 去重模式，见 core_logic.plan_md_file
+        move/shared_images: 移动模式，见 core_logic.plan_md_file；
+            shared_images 需要覆盖可能引用这些图片的所有笔记（不只是输入文件），
+            可用 dedup.find_shared_images 扫描公共根目录得到
+        copy_strategy: 复制方式，见 file_ops.copy_file
+        remote_images: 已下载的远程图片，见 core_logic.plan_md_file；
+            可用 remote.fetch_remote_images 得到
+
+    Returns:
+        BatchResult(files, images, results, cancelled, stats)
+    """
+    try:
+        total = len(md_files)
+    except TypeError:
+        total = None
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if total is not None:
+        # 目录数少于并行数时多开的进程没有用处
+        workers = min(workers, len({directory_key(f) for f in md_files}))
+    workers = max(1, workers)
+
+    chunks = iter_chunks(md_files)
+    batch_id = uuid.uuid4().hex
+    results = []
+    stats = Counter()
+    img_count = 0
+    discovered = 0
+    exhausted = False
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def next_chunk():
+        nonlocal discovered, exhausted
+        item = next(chunks, None)
+        if item is None:
+            exhausted = True
+        else:
+            discovered += len(item[1])
+        return item
+
+    def collect(chunk_output):
+        nonlocal img_count
+        chunk_results, chunk_stats, chunk_events, _ = chunk_output
+        if chunk_events is not None:
+            events.deliver(*chunk_events)
+        results.extend(chunk_results)
+        stats.update(chunk_stats)
+        img_count += sum(images for _, images in chunk_results)
+        if progress_callback:
+            known_total = total if total is not None else (discovered if exhausted else 0)
+            progress_callback(len(results), known_total)
+
+    def finish():
+        return BatchResult(len(results), img_count, results,
+                           not exhausted or len(results) < discovered, stats)
+
+    # 只允许一个并行时，直接在当前进程处理，省去进程池开销；没有其他进程，目录列表一直有效
+    if workers <= 1:
+        while not cancelled():
+            item = next_chunk()
+            if item is None:
+                break
+            collect(_process_chunk(item[1], img_dir_name, index_path, dedup, move, shared_images,
+                                   copy_strategy, batch_id, remote_images,
+                                   previous_worker=os.getpid()))
+        return finish()
+
+    max_queued = workers * QUEUED_CHUNKS_PER_WORKER
+    executor_cls = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    # 线程共用当前接收器；工作进程收集消息随结果返回
+    event_level = None if use_threads else events.get_sink().level
+    with executor_cls(max_workers=workers) as executor:
+        pending = {}   # future -> 目录键
+        waiting = {}   # 目录键 -> 等待中的块；同一目录同时只有一块在处理，保证组内串行
+        last_worker = {}   # 目录键 -> 处理该目录上一块的进程号
+        queued = 0
+
+        def submit(key, chunk):
+            # 线程都在当前进程中，共用同一份目录列表
+            previous_worker = os.getpid() if use_threads else last_worker.get(key)
+            pending[executor.submit(_process_chunk, chunk, img_dir_name, index_path, dedup,
+                                    move, shared_images, copy_strategy, batch_id,
+                                    remote_images, event_level, previous_worker)] = key
+
+        while True:
+            # 从输入中取块，直到排队数达到上限
+            while not exhausted and not cancelled() and len(pending) + queued < max_queued:
+                item = next_chunk()
+                if item is None:
+                    break
+                key, chunk = item
+                if key in pending.values():
+                    waiting.setdefault(key, deque()).append(chunk)
+                    queued += 1
+                else:
+                    submit(key, chunk)
+
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = pending.pop(future)
+                output = future.result()
+                last_worker[key] = output[3]
+                collect(output)
+                if key in waiting and not cancelled():
+                    submit(key, waiting[key].popleft())
+                    queued -= 1
+                    if not waiting[key]:
+                        del waiting[key]
+
+    return finish()
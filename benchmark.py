@@ -0,0 +1,279 @@
+"""core_logic 性能基准
+
+用法:
+    python benchmark.py [--notes N] [--images-per-note N] [--dirs N] [--dup-alt RATIO]
+                        [--missing RATIO] [--image-size BYTES] [-j JOBS [JOBS ...]]
+                        [--output FILE] [--compare FILE] [--threshold RATIO]
+
+在临时目录中生成合成的笔记库，测量：
+    - scaling: 单个文件中图片数量递增时 process_md_file 的耗时，确认随图片数量线性增长
+    - parse:   大文件中 md_images.parse_images 与旧版正则的解析耗时，确认随文件大小线性增长
+    - batch:   整个笔记库的批量处理（首次运行），按不同并行数分别测量
+    - rerun:   使用增量索引再次运行，所有文件都未改动
+
+报告 文件/秒、链接/秒、复制字节/秒，结果可保存为JSON；用 --compare 与之前保存的结果对比，
+有场景比基准慢超过 --threshold 倍时退出码为 1，可用于发现版本间的性能回退。
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+
+import batch
+import core_logic
+import events
+import md_images
+import note_index
+import scanner
+
+# scaling 测量的图片数量
+IMAGE_COUNTS = (100, 200, 400, 800, 1600)
+# 每个图片在文档中被引用的次数
+REFS_PER_IMAGE = 2
+# parse 测量的文档段落数
+PARSE_BLOCKS = (2000, 8000, 32000)
+# 旧版本使用的图片链接正则，作为解析速度的对比基准
+LEGACY_IMAGE_PATTERN = re.compile(r'!\[([^\]]+)\]\(([^\)]+)\)')
+
+
+def make_note(root, image_count, refs_per_image=REFS_PER_IMAGE):
+    """在 root 下生成一个引用 image_count 张图片的Markdown文件"""
+    lines = []
+    for i in range(image_count):
+        img_name = f"image-{i:06d}.png"
+        with open(os.path.join(root, img_name), "wb") as f:
+            f.write(b"\x89PNG" + i.to_bytes(4, "little"))
+        for _ in range(refs_per_image):
+            lines.append(f"截图说明 {i}\n\n![图片{i}](./{img_name})\n")
+    md_path = os.path.join(root, "note.md")
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    return md_path
+
+
+def make_vault(root, notes=200, images_per_note=5, dirs=10, dup_alt=0.2, missing=0.05,
+               image_size=16 * 1024, seed=0):
+    """生成合成笔记库
+
+    Args:
+        root: 笔记库根目录
+        notes: 笔记数量
+        images_per_note: 每个笔记引用的图片数
+        dirs: 笔记分布的目录数
+        dup_alt: 图片描述与同一笔记中前一个图片重复的比例
+        missing: 引用不存在的图片的比例
+        image_size: 图片平均字节数，实际大小在其 50%~150% 之间随机
+        seed: 随机种子，相同参数生成相同的笔记库
+
+    Returns:
+        统计字典: notes, links, images, image_bytes
+    """
+    rnd = random.Random(seed)
+    counts = {"notes": 0, "links": 0, "images": 0, "image_bytes": 0}
+    for n in range(notes):
+        note_dir = os.path.join(root, f"dir{n % dirs:03d}")
+        os.makedirs(note_dir, exist_ok=True)
+        lines = [f"# 笔记 {n}", ""]
+        alt = None
+        for i in range(images_per_note):
+            img_name = f"image-{n:06d}-{i:03d}.png"
+            if rnd.random() >= missing:
+                size = max(1, int(image_size * rnd.uniform(0.5, 1.5)))
+                with open(os.path.join(note_dir, img_name), "wb") as f:
+                    f.write(rnd.randbytes(size))
+                counts["images"] += 1
+                counts["image_bytes"] += size
+            if alt is None or rnd.random() >= dup_alt:
+                alt = f"截图{n}-{i}"
+            lines.append(f"段落 {i}\n\n![{alt}]({img_name})\n")
+            counts["links"] += 1
+        with open(os.path.join(note_dir, f"note{n:06d}.md"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        counts["notes"] += 1
+    return counts
+
+
+def make_large_text(blocks):
+    """生成包含各种图片写法、代码块和行内代码的大文档"""
+    parts = []
+    for i in range(blocks):
+        kind = i % 8
+        if kind == 0:
+            parts.append(f"## 小节 {i}\n\n普通段落，包含 `行内代码 ![x](code.png)` 和一些文字。")
+        elif kind == 1:
+            parts.append(f"![截图{i}](./image-{i}.png)")
+        elif kind == 2:
+            parts.append(f'![图 {i}](<./dir with space/image-{i}.png> "标题")')
+        elif kind == 3:
+            parts.append(f"![引用{i}][ref{i}]\n\n[ref{i}]: ./ref-{i}.png")
+        elif kind == 4:
+            parts.append(f'<img src="./html-{i}.png" alt="html{i}">')
+        elif kind == 5:
+            parts.append(f"```python\nprint('![not](image.png)')\n```")
+        else:
+            parts.append("一段较长的文字，" * 8)
+    return "\n\n".join(parts)
+
+
+def bench_parse(blocks, repeat=3):
+    """返回 (解析器秒数, 旧正则秒数, 解析器找到的图片数)，各取 repeat 次中最快的一次"""
+    text = make_large_text(blocks)
+    best_parser = best_regex = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        refs = md_images.parse_images(text)
+        best_parser = min(best_parser, time.perf_counter() - start)
+        start = time.perf_counter()
+        LEGACY_IMAGE_PATTERN.findall(text)
+        best_regex = min(best_regex, time.perf_counter() - start)
+    return best_parser, best_regex, len(refs)
+
+
+def bench_process_md_file(image_count):
+    """返回处理一个包含 image_count 张图片的文件所用的秒数"""
+    root = tempfile.mkdtemp(prefix="md_bench_")
+    try:
+        md_path = make_note(root, image_count)
+        start = time.perf_counter()
+        core_logic.process_md_file(md_path)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _rates(elapsed, files, links, copied_bytes):
+    elapsed = max(elapsed, 1e-9)
+    return {
+        "seconds": round(elapsed, 4),
+        "files_per_s": round(files / elapsed, 1),
+        "links_per_s": round(links / elapsed, 1),
+        "copied_bytes_per_s": round(copied_bytes / elapsed, 1),
+    }
+
+
+def bench_vault(vault_args, workers):
+    """生成笔记库，测量首次批量处理和增量再运行，返回两条结果"""
+    root = tempfile.mkdtemp(prefix="md_bench_vault_")
+    try:
+        counts = make_vault(root, **vault_args)
+        index_path = note_index.default_index_path(root)
+        results = []
+        for scenario in ("batch", "rerun"):
+            start = time.perf_counter()
+            result = batch.process_batch(scanner.iter_md_files(root), workers=workers,
+                                         index_path=index_path)
+            elapsed = time.perf_counter() - start
+            entry = {"scenario": scenario, "workers": workers}
+            entry.update(_rates(elapsed, result.files, counts["links"],
+                                result.stats["copied_bytes"]))
+            entry["stats"] = dict(result.stats)
+            results.append(entry)
+        return counts, results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="core_logic 性能基准")
+    parser.add_argument("--notes", type=int, default=200, help="笔记数量")
+    parser.add_argument("--images-per-note", type=int, default=5, help="每个笔记引用的图片数")
+    parser.add_argument("--dirs", type=int, default=10, help="笔记分布的目录数")
+    parser.add_argument("--dup-alt", type=float, default=0.2, help="重复图片描述的比例")
+    parser.add_argument("--missing", type=float, default=0.05, help="缺失图片的比例")
+    parser.add_argument("--image-size", type=int, default=16 * 1024, help="图片平均字节数")
+    parser.add_argument("-j", "--jobs", type=int, nargs="+", default=[1, os.cpu_count() or 1],
+                        help="要测量的并行数，可指定多个")
+    parser.add_argument("--output", default=None, help="把结果保存为JSON文件")
+    parser.add_argument("--compare", default=None, help="与之前保存的JSON结果对比")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="对比时允许的最大变慢倍数，默认为 1.2")
+    return parser
+
+
+def compare_reports(baseline, report, threshold):
+    """对比两次结果中相同场景和并行数的耗时，返回变慢超过阈值的场景列表"""
+    old = {(r["scenario"], r["workers"]): r["seconds"] for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'场景':<8} {'并行':>4} {'基准(s)':>9} {'本次(s)':>9} {'倍数':>6}")
+    for r in report["results"]:
+        key = (r["scenario"], r["workers"])
+        if key not in old or old[key] <= 0:
+            continue
+        ratio = r["seconds"] / old[key]
+        print(f"{key[0]:<8} {key[1]:>4} {old[key]:>9.3f} {r['seconds']:>9.3f} {ratio:>6.2f}")
+        if ratio > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 基准测试时不输出逐图片消息
+    events.set_sink(events.NullSink())
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scaling": [],
+        "parse": [],
+        "vault": None,
+        "results": [],
+    }
+
+    print(f"{'图片数':>8} {'耗时(s)':>10} {'每图(ms)':>10}")
+    for count in IMAGE_COUNTS:
+        elapsed = bench_process_md_file(count)
+        report["scaling"].append({"images": count, "seconds": round(elapsed, 4)})
+        print(f"{count:>8} {elapsed:>10.3f} {elapsed / count * 1000:>10.3f}")
+
+    print()
+    print(f"{'段落数':>8} {'解析器(s)':>10} {'旧正则(s)':>10} {'倍数':>6} {'图片数':>8}")
+    for blocks in PARSE_BLOCKS:
+        parser_s, regex_s, refs = bench_parse(blocks)
+        report["parse"].append({"blocks": blocks, "seconds": round(parser_s, 4),
+                                "regex_seconds": round(regex_s, 4), "images": refs})
+        print(f"{blocks:>8} {parser_s:>10.4f} {regex_s:>10.4f} {parser_s / max(regex_s, 1e-9):>6.1f} "
+              f"{refs:>8}")
+
+    vault_args = {
+        "notes": args.notes,
+        "images_per_note": args.images_per_note,
+        "dirs": args.dirs,
+        "dup_alt": args.dup_alt,
+        "missing": args.missing,
+        "image_size": args.image_size,
+    }
+    print()
+    print(f"{'场景':<8} {'并行':>4} {'耗时(s)':>9} {'文件/s':>10} {'链接/s':>10} {'复制MB/s':>10}")
+    for workers in dict.fromkeys(args.jobs):
+        counts, results = bench_vault(vault_args, workers)
+        report["vault"] = dict(vault_args, **counts)
+        for r in results:
+            report["results"].append(r)
+            print(f"{r['scenario']:<8} {workers:>4} {r['seconds']:>9.3f} {r['files_per_s']:>10.1f} "
+                  f"{r['links_per_s']:>10.1f} {r['copied_bytes_per_s'] / 1e6:>10.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("vault") != report["vault"]:
+            print("注意：基准结果使用的笔记库参数不同，对比结果仅供参考")
+        if compare_reports(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
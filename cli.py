@@ -0,0 +1,345 @@
+"""命令行入口，无需图形界面即可批量处理Markdown文件
+
+用法:
+    python -m cli [-h] [--img-dir IMG_DIR] [-j JOBS] [--incremental] [--index INDEX]
+                  [--watch] [--poll] [--dedup] [--dry-run] [--plan-out FILE]
+                  [--apply-plan FILE] [--report FILE] [--move] [--sweep-orphans]
+                  [--copy-strategy {auto,reflink,copy_file_range,sendfile,hardlink,copy}]
+                  [--fetch-remote] [--remote-jobs N] [--remote-timeout SECONDS]
+                  [--optimize {png,webp}] [--quality QUALITY]
+                  [--git] [--git-base REF] [--git-staged]
+                  [PATH ...]
+
+本模块只依赖 core_logic 和 batch，绝不导入 PyQt6，适合在无界面的服务器或定时任务中运行。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import Counter
+
+import batch
+import dedup
+import file_ops
+import gitscan
+import note_index
+import optimize
+import orphans
+import remote
+import rename_plan
+import report
+import scanner
+import watcher
+
+# 退出码
+EXIT_OK = 0
+EXIT_ERROR = 1
+
+
+def find_missing(paths):
+    """返回不存在的路径列表"""
+    return [p for p in paths if not os.path.exists(p)]
+
+
+def common_root(paths):
+    """返回所有路径的公共根目录，文件取其所在目录"""
+    dirs = [os.path.abspath(p) if os.path.isdir(p) else os.path.dirname(os.path.abspath(p))
+            for p in paths]
+    return os.path.commonpath(dirs)
+
+
+def list_git_notes(paths, img_dir_name, base=None, staged=False):
+    """git 模式下各路径中需要处理的笔记，见 gitscan.list_notes"""
+    notes = {}
+    for p in paths:
+        for note in gitscan.list_notes(p, img_dir_name, base, staged):
+            notes.setdefault(note, None)
+    return list(notes)
+
+
+def git_worktree_changes(paths):
+    """各路径所在仓库中工作区有改动或未跟踪的文件，见 gitscan.worktree_changes
+
+    处理时可能写入或删除给出的路径之外的文件（例如移动模式下用 ../ 引用的图片），
+    因此检查整个仓库。
+    """
+    changed = set()
+    for root in {gitscan.repo_root(p) for p in paths}:
+        changed |= gitscan.worktree_changes(root)
+    return changed
+
+
+def is_tool_data(path):
+    """是否是本工具的增量索引或缓存文件，这些文件不应提交"""
+    parts = os.path.normpath(path).split(os.sep)
+    return (remote.STORE_DIRNAME in parts or optimize.STORE_DIRNAME in parts
+            or parts[-1].startswith(note_index.INDEX_FILENAME))
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="markdown_rename_tool",
+        description="按图片描述重命名Markdown文档中引用的图片文件",
+    )
+    parser.add_argument("paths", nargs="*", metavar="PATH",
+                        help="Markdown文件或包含Markdown文件的目录")
+    parser.add_argument("--img-dir", default="img",
+                        help='图片保存目录名称，默认为"img"')
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="并行处理的进程数，默认为CPU核数")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"增量模式：跳过上次处理后未改动的文件，索引保存在公共根目录的 "
+                             f"{note_index.INDEX_FILENAME} 中")
+    parser.add_argument("--index", default=None,
+                        help="指定增量索引文件路径（隐含 --incremental）")
+    parser.add_argument("--watch", action="store_true",
+                        help="处理完成后继续监视公共根目录，笔记保存后自动处理")
+    parser.add_argument("--poll", action="store_true",
+                        help="监视模式使用轮询（未安装 watchdog 时自动使用）")
+    parser.add_argument("--dedup", action="store_true",
+                        help="去重模式：同一图片目录中内容相同的图片只保存一份，"
+                             "并删除不再被引用的重复图片")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="只生成重命名计划（JSON），不修改任何文件")
+    parser.add_argument("--plan-out", metavar="FILE", default=None,
+                        help="--dry-run 时把计划保存到文件，默认输出到标准输出")
+    parser.add_argument("--apply-plan", metavar="FILE", default=None,
+                        help="执行之前用 --dry-run 保存的计划")
+    parser.add_argument("--report", metavar="FILE", default=None,
+                        help="把各阶段耗时和计数保存为JSON报告")
+    parser.add_argument("--move", action="store_true",
+                        help="移动模式：没有被其他笔记引用的图片直接移动到图片目录，不再保留原文件；"
+                             "需要先读取一遍所有笔记建立引用关系")
+    parser.add_argument("--sweep-orphans", action="store_true",
+                        help="处理完后删除笔记所在目录及图片目录中不再被任何笔记引用的图片")
+    parser.add_argument("--copy-strategy", default="auto",
+                        choices=("auto",) + file_ops.COPY_STRATEGIES,
+                        help="复制图片的方式，不支持时依次退回到后面的方式；"
+                             "auto 依次尝试 reflink、copy_file_range、sendfile、普通复制，"
+                             "hardlink 只有明确指定时才使用")
+    parser.add_argument("--fetch-remote", action="store_true",
+                        help=f"下载笔记中的远程图片（http/https），保存到图片目录并改写为本地链接；"
+                             f"下载结果缓存在公共根目录的 {remote.STORE_DIRNAME} 中，"
+                             f"同一地址只下载一次")
+    parser.add_argument("--remote-jobs", type=int, default=remote.DEFAULT_WORKERS, metavar="N",
+                        help=f"同时下载的远程图片数，默认为 {remote.DEFAULT_WORKERS}")
+    parser.add_argument("--remote-timeout", type=float, default=remote.DEFAULT_TIMEOUT,
+                        metavar="SECONDS",
+                        help=f"下载远程图片的超时秒数，默认为 {remote.DEFAULT_TIMEOUT}")
+    parser.add_argument("--optimize", choices=tuple(optimize.FORMATS), default=None,
+                        help=f"重命名后压缩图片目录中的图片（需要 Pillow）：png 无损重新压缩 PNG，"
+                             f"webp 转换为 WebP 并改写链接；结果按内容缓存在公共根目录的 "
+                             f"{optimize.STORE_DIRNAME} 中")
+    parser.add_argument("--quality", type=int, default=optimize.DEFAULT_QUALITY,
+                        help=f"转换为 WebP 时的质量（1-100，100 为无损），"
+                             f"默认为 {optimize.DEFAULT_QUALITY}")
+    parser.add_argument("--git", action="store_true",
+                        help="git 模式：不遍历目录，用 git ls-files 列出笔记（已跟踪和未被忽略的新文件）")
+    parser.add_argument("--git-base", metavar="REF", default=None,
+                        help="只处理与 REF 相比改动过的笔记和未跟踪的新笔记（隐含 --git）")
+    parser.add_argument("--git-staged", action="store_true",
+                        help="只处理暂存区中改动过的笔记，处理后把本次运行写入或删除的文件加入暂存区，"
+                             "适合 pre-commit 钩子（隐含 --git）；还有未暂存改动的笔记会跳过")
+    return parser
+
+
+def run_dry_run(md_files, img_dir_name, args, shared_images=None, remote_images=None):
+    plan = rename_plan.build_plan(md_files, img_dir_name, workers=args.jobs, dedup=args.dedup,
+                                  move=args.move, shared_images=shared_images,
+                                  remote_images=remote_images)
+    if args.plan_out:
+        rename_plan.save_plan(plan, args.plan_out)
+        summary = rename_plan.summarize_plan(plan)
+        print(f"计划已保存到 {args.plan_out}：{summary['notes']} 个Markdown文件，"
+              f"{summary['operations']} 个图片需要复制（其中 {summary['moves']} 个移动），"
+              f"{summary['missing']} 个图片找不到，{summary['remote']} 个远程图片未下载，"
+              f"{summary['conflicts']} 处目标冲突")
+    else:
+        json.dump(plan, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+def run_apply_plan(path, copy_strategy="auto"):
+    try:
+        plan = rename_plan.load_plan(path)
+    except (OSError, ValueError) as e:
+        print(f"无法读取计划文件: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    stats = Counter()
+    img_count = rename_plan.execute_plan(plan, stats, copy_strategy=copy_strategy)
+    print(f"已执行计划：重命名 {img_count} 个图片文件，改写 {stats['notes_written']} 个Markdown文件，"
+          f"{stats['stale']} 个文件在生成计划后被修改而跳过")
+    if stats["errors"]:
+        print(f"{stats['errors']} 个Markdown文件处理失败", file=sys.stderr)
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.apply_plan:
+        return run_apply_plan(args.apply_plan, args.copy_strategy)
+    if not args.paths:
+        parser.error("需要至少一个 PATH")
+    if args.optimize and not optimize.HAVE_PIL:
+        parser.error("--optimize 需要安装 Pillow（pip install pillow）")
+    if not 1 <= args.quality <= 100:
+        parser.error("--quality 应在 1 到 100 之间")
+
+    img_dir_name = args.img_dir.strip() or "img"
+    missing = find_missing(args.paths)
+    for p in missing:
+        print(f"路径不存在: {p}", file=sys.stderr)
+    existing = [p for p in args.paths if p not in missing]
+
+    # git 模式：候选笔记来自 git，不遍历目录
+    git_notes = None
+    if (args.git or args.git_base or args.git_staged) and existing:
+        try:
+            git_notes = list_git_notes(existing, img_dir_name, args.git_base, args.git_staged)
+        except gitscan.GitError as e:
+            print(f"git 模式出错: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        print(f"git 模式：{len(git_notes)} 个候选笔记", file=sys.stderr if args.dry_run else sys.stdout)
+
+    # pre-commit 钩子：记下处理前工作区已有的改动，之后只把本次运行写入或删除的文件加入暂存区。
+    # 部分暂存的笔记改写后无法只暂存用户选中的部分，因此不处理
+    dirty_before = {}
+    if args.git_staged and git_notes is not None:
+        try:
+            dirty_before = {p: _stat_key(p) for p in git_worktree_changes(existing)}
+        except gitscan.GitError as e:
+            print(f"git 模式出错: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        partial = [note for note in git_notes if note in dirty_before]
+        for note in partial:
+            print(f"笔记还有未暂存的改动，跳过: {note}", file=sys.stderr)
+        if partial:
+            git_notes = [note for note in git_notes if note not in dirty_before]
+
+    def note_files():
+        """本次处理的笔记；移动、压缩、去重和清理仍然需要扫描整个目录以了解所有引用"""
+        if git_notes is not None:
+            return git_notes
+        return scanner.expand_paths(existing, img_dir_name)
+
+    index_path = args.index
+    if index_path is None and args.incremental and existing:
+        index_path = note_index.default_index_path(common_root(existing))
+
+    # 移动模式需要先知道哪些图片被多个笔记引用；只给出部分笔记时，公共根目录下的其他笔记
+    # 也可能引用同一图片，因此扫描整个公共根目录
+    shared_images = None
+    if args.move and existing:
+        shared_images = dedup.find_shared_images(
+            scanner.iter_md_files(common_root(existing), img_dir_name))
+
+    # 先并发下载所有远程图片，之后按本地图片处理；预览时也要下载，计划才能执行
+    remote_images = None
+    if args.fetch_remote and existing:
+        remote_stats = Counter()
+        urls = remote.collect_remote_urls(note_files())
+        remote_images = remote.fetch_remote_images(
+            urls, remote.default_store_dir(common_root(existing)), workers=args.remote_jobs,
+            timeout=args.remote_timeout, stats=remote_stats)
+        print(f"远程图片：下载 {remote_stats['remote_fetched']} 个 "
+              f"({remote_stats['remote_bytes']} 字节)，使用缓存 {remote_stats['remote_cached']} 个，"
+              f"失败 {remote_stats['remote_failed']} 个", file=sys.stderr if args.dry_run else sys.stdout)
+
+    # 边扫描边处理
+    md_files = note_files()
+
+    if args.dry_run:
+        run_dry_run(md_files, img_dir_name, args, shared_images, remote_images)
+        return EXIT_ERROR if missing else EXIT_OK
+
+    start = time.perf_counter()
+    result = batch.process_batch(md_files, img_dir_name, workers=args.jobs, index_path=index_path,
+                                 dedup=args.dedup, move=args.move, shared_images=shared_images,
+                                 copy_strategy=args.copy_strategy, remote_images=remote_images)
+
+    if args.optimize and existing:
+        # 转换格式会删除原图片，必须改写所有引用它的笔记，git 模式下也要扫描整个目录
+        optimize.optimize_images(scanner.expand_paths(existing, img_dir_name), img_dir_name,
+                                 optimize.default_store_dir(common_root(existing)),
+                                 args.optimize, args.quality, args.jobs, result.stats)
+    elapsed = time.perf_counter() - start
+
+    print(f"共处理 {result.files} 个Markdown文件，重命名 {result.images} 个图片文件，"
+          f"改写 {result.stats['notes_written']} 个Markdown文件")
+    print(f"复制 {result.stats['copied']} 个图片 ({result.stats['copied_bytes']} 字节)，"
+          f"内容相同跳过 {result.stats['skipped']} 个 ({result.stats['skipped_bytes']} 字节)")
+    strategies = report.copy_strategies(result.stats)
+    if strategies:
+        print("复制方式：" + "，".join(f"{name} {count} 个" for name, count in strategies.items()))
+    if args.move:
+        print(f"移动 {result.stats['moved']} 个图片 ({result.stats['moved_bytes']} 字节)")
+    if index_path is not None:
+        print(f"增量模式：{result.stats['unchanged']} 个文件未改动，已跳过")
+    if result.stats["errors"]:
+        print(f"{result.stats['errors']} 个Markdown文件处理失败", file=sys.stderr)
+    if args.optimize:
+        print(f"压缩图片：{result.stats['optimized']} 个，节省 "
+              f"{result.stats['optimized_bytes_saved']} 字节，改写 {result.stats['optimize_notes_written']} 个"
+              f"Markdown文件，耗时 {result.stats['time_optimize']:.2f} 秒"
+              f"（{result.stats['optimize_cached']} 个图片使用缓存的结果）")
+    if args.report:
+        run_report = report.build_report(result, elapsed, img_dir=img_dir_name, workers=args.jobs,
+                                         incremental=index_path is not None, dedup=args.dedup,
+                                         fetch_remote=args.fetch_remote, optimize=args.optimize,
+                                         quality=args.quality)
+        report.save_report(run_report, args.report)
+        print(f"耗时 {elapsed:.2f} 秒：{report.format_stages(run_report)}")
+        print(f"报告已保存到 {args.report}")
+
+    if args.dedup:
+        # 合并已有的重复图片
+        dedup_plan = dedup.plan_dedup(scanner.expand_paths(existing, img_dir_name))
+        dedup_stats = dedup.apply_dedup(dedup_plan)
+        print(f"去重：删除 {dedup_stats['dedup_removed']} 个重复图片，"
+              f"节省 {dedup_stats['dedup_bytes']} 字节，改写 {dedup_stats['notes_written']} 个Markdown文件")
+
+    if args.sweep_orphans:
+        orphan_plan = orphans.plan_orphans(scanner.expand_paths(existing, img_dir_name), img_dir_name)
+        orphan_stats = orphans.apply_orphans(orphan_plan)
+        print(f"清理：删除 {orphan_stats['orphans_removed']} 个未被引用的图片，"
+              f"释放 {orphan_stats['orphans_bytes']} 字节")
+
+    if args.git_staged and git_notes is not None:
+        try:
+            written = sorted(p for p in git_worktree_changes(existing)
+                             if p not in dirty_before and not is_tool_data(p))
+            gitscan.stage(written)
+        except gitscan.GitError as e:
+            print(f"加入暂存区时出错: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        print(f"已把本次运行写入或删除的 {len(written)} 个文件加入暂存区")
+        # 处理前就有未暂存改动的文件被再次改动时，无法区分哪些是用户的改动，需要手动暂存
+        for p, key in dirty_before.items():
+            if _stat_key(p) != key:
+                print(f"⚠️ 文件还有未暂存的改动，没有加入暂存区: {p}", file=sys.stderr)
+
+    if args.watch and existing:
+        w = watcher.Watcher(common_root(existing), img_dir_name, use_polling=args.poll)
+        try:
+            w.run()
+        except KeyboardInterrupt:
+            pass
+    return EXIT_ERROR if missing or result.stats["errors"] else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
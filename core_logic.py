@@ -1,11 +1,14 @@
 import os
-import re
+import time
+import codecs
 import shutil
-import logging
+from collections import Counter
+from urllib.parse import urlsplit
 
-# 设置日志
-logging.basicConfig(level=logging.INFO, format='%(message)s')
-logger = logging.getLogger(__name__)
+import events
+import file_ops
+import md_images
+import naming
 
 def sanitize_filename(name):
     """净化文件名，替换非法字符"""
@@ -14,147 +17,542 @@ def sanitize_filename(name):
         name = name.replace(ch, "_")
     return name
 
-def process_md_file(md_file_path, progress_callback=None, img_dir_name="img"):
-    """处理单个Markdown文件中的图片链接
-    
+def rewrite_links(content, path_map, refs=None):
+    """一次遍历替换内容中的图片链接
+
+    Args:
+        content: Markdown文本
+        path_map: 规范化后的原路径 -> 新路径
+        refs: 已解析的 md_images.parse_images(content)，为 None 时重新解析
+
+    Returns:
+        替换后的文本
+    """
+    if not path_map:
+        return content
+    if refs is None:
+        refs = md_images.parse_images(content)
+    return md_images.replace_paths(content, refs,
+                                   lambda ref: path_map.get(os.path.normpath(ref.path)))
+
+# 按文件开头的 BOM 确定编码；UTF-16 的 BOM 作为 \ufeff 留在内容中，写回时字节序不变
+BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+)
+# 没有 BOM 时依次尝试的编码
+FALLBACK_ENCODINGS = ('utf-8', 'gbk')
+
+# 文件上次检测到的编码和换行符：(路径, 修改时间, 大小) -> (编码, 换行符)
+_ENCODING_CACHE_SIZE = 4096
+_encoding_cache = {}
+
+
+def detect_newline(text):
+    """返回文本中占多数的换行符，没有换行时为 \n"""
+    crlf = text.count('\r\n')
+    if not crlf:
+        return '\r' if '\r' in text and '\n' not in text else '\n'
+    return '\r\n' if crlf >= text.count('\n') - crlf else '\n'
+
+
+def decode_md_bytes(data, encoding=None):
+    """解码Markdown文件的原始字节，返回 (内容, 编码)
+
+    有 BOM 时按 BOM 解码；否则先试 encoding（已知时），再依次试 FALLBACK_ENCODINGS。
+    UTF-8 的检查在解码时一次完成，不需要为其他编码重新读取文件。
+    """
+    for bom, bom_encoding in BOM_ENCODINGS:
+        if data.startswith(bom):
+            return data.decode(bom_encoding), bom_encoding
+    candidates = FALLBACK_ENCODINGS
+    if encoding in candidates:
+        candidates = (encoding,) + tuple(e for e in candidates if e != encoding)
+    for candidate in candidates:
+        try:
+            return data.decode(candidate), candidate
+        except UnicodeDecodeError as e:
+            error = e
+    raise error
+
+
+def read_md_text(md_file_path, encoding=None):
+    """读取Markdown文件，返回 (内容, 编码, 换行符)
+
+    文件只读取一次。内容中的换行统一为 \n，保存时按换行符还原。
+    未改动过的文件直接使用上次检测到的编码；指定 encoding 时不检测，按它解码。
+    """
+    with open(md_file_path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        data = f.read()
+    if encoding is not None:
+        text = data.decode(encoding)
+        newline = detect_newline(text)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text, encoding, newline
+    key = (md_file_path, st.st_mtime_ns, st.st_size)
+    cached = _encoding_cache.get(key)
+    text, encoding = decode_md_bytes(data, cached[0] if cached else None)
+    if cached and cached[0] == encoding:
+        newline = cached[1]
+    else:
+        newline = detect_newline(text)
+        if len(_encoding_cache) >= _ENCODING_CACHE_SIZE:
+            _encoding_cache.clear()
+        _encoding_cache[key] = (encoding, newline)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text, encoding, newline
+
+
+def read_md_file(md_file_path):
+    """读取Markdown文件，返回 (内容, 编码)"""
+    content, encoding, _ = read_md_text(md_file_path)
+    return content, encoding
+
+def plan_md_file(md_file_path, img_dir_name="img", content=None, encoding=None, dedup=False,
+                 stats=None, move=False, shared_images=None, newline=None, dir_cache=None,
+                 names=None, remote_images=None, name_for=None, content_index=None):
+    """生成单个Markdown文件的重命名计划，只读取文件，不做任何修改
+
     Args:
         md_file_path: Markdown文件路径
-        progress_callback: 进度回调函数
         img_dir_name: 图片保存目录名称，默认为"img"
-        
+        content: 已读取的文件内容，为 None 时从文件读取
+        encoding: 读取 content 时使用的编码
+        dedup: 去重模式，图片目录中已有内容相同的文件时直接引用它而不再另存一份；
+            已经在图片目录中的图片保持原名
+        stats: 可选的 Counter，累加各阶段耗时（time_read/time_parse/time_stat，秒）和
+            bytes_read/links_found/images_missing/remote_skipped/collisions
+        move: 移动模式，没有被其他笔记引用的图片直接移动（重命名）而不是复制
+        shared_images: 被多个笔记引用的图片绝对路径集合，移动模式下这些图片仍然复制；
+            为 None 时视为没有共用的图片
+        newline: 读取 content 时检测到的换行符
+        dir_cache: 可选的 file_ops.DirCache，图片的存在检查在缓存的目录列表中完成
+        names: 图片目录的 naming.NameIndex，同一目录的笔记共用以免互相覆盖；
+            为 None 时按图片目录的现有内容新建
+        remote_images: 已下载的远程图片 URL -> 本地副本路径（见 remote.fetch_remote_images），
+            以本地副本为源文件复制到图片目录；不在其中的远程图片保持原链接
+        name_for: 由图片描述生成文件名（不含扩展名）的函数，默认为 sanitize_filename
+        content_index: 去重模式下图片目录的 file_ops.ContentIndex，同一目录的笔记共用；
+            为 None 时用到才按图片目录的现有内容新建
+
     Returns:
-        处理的图片数量
+        可序列化为JSON的字典:
+            note: Markdown文件路径
+            mtime_ns/size: 生成计划时文件的修改时间和大小，执行时用于发现过期的计划
+            img_dir: 图片保存目录名称
+            encoding/newline: 读取文件使用的编码和原来的换行符，保存时保持不变
+            operations: 需要执行的复制，每项包含 path（链接中规范化后的路径）、
+                source、target、link（新链接）、alt（最终描述）、links（引用次数），
+                去重模式下引用已有文件的复制带有 reused 标记，可以移动的图片带有 move 标记
+            missing: 找不到的图片
+            remote: 没有下载的远程图片 URL
+            collisions: 名称已被其他图片占用而改名的图片，每项包含 alt 和 renamed
+            already_named: 名称已经符合要求的图片文件名
     """
-    try:
-        base_dir = os.path.dirname(md_file_path)
-        img_folder_path = os.path.join(base_dir, img_dir_name)
+    if stats is None:
+        stats = Counter()
+    if name_for is None:
+        name_for = sanitize_filename
+    # 图片路径都是绝对路径，笔记路径也要是绝对路径，否则已在原位的图片会被当成需要移动
+    md_file_path = os.path.abspath(md_file_path)
+    st = os.stat(md_file_path)
+    if content is None:
+        t0 = time.perf_counter()
+        content, encoding, newline = read_md_text(md_file_path)
+        stats["time_read"] += time.perf_counter() - t0
 
-        # 检查img文件夹是否存在
-        if not os.path.exists(img_folder_path):
-            os.makedirs(img_folder_path, exist_ok=True)
-            logger.info(f"已创建 {img_dir_name} 文件夹: {img_folder_path}")
+    base_dir = os.path.dirname(md_file_path)
+    img_dir = os.path.join(base_dir, img_dir_name)
+    plan = {
+        "note": md_file_path,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "img_dir": img_dir_name,
+        "encoding": encoding,
+        "newline": newline,
+        "operations": [],
+        "missing": [],
+        "remote": [],
+        "collisions": [],
+        "already_named": [],
+    }
 
-        # 读取Markdown文件内容
-        try:
-            with open(md_file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # 尝试其他编码
-            with open(md_file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-
-        # 查找图片链接 - 改进正则表达式以匹配更多格式
-        pattern = r'!\[([^\]]+)\]\(([^\)]+)\)'
-        matches = re.findall(pattern, content)
-        
-        # 跟踪所有图片描述和路径的映射关系
-        desc_to_path = {}
-        path_to_desc = {}
-        desc_set = set()
-        
-        new_content = content
-        img_count = 0
-        
-        # 第一步：收集所有图片描述和路径
-        for alt_text, img_path in matches:
-            # 规范化路径，解决Windows路径问题
-            normalized_path = os.path.normpath(img_path)
-            
-            # 记录描述和路径的对应关系
-            desc_to_path[alt_text] = normalized_path
-            path_to_desc[normalized_path] = alt_text
-
-        # 第二步：处理每个图片
-        processed_paths = set()  # 跟踪已处理的路径
-        
-        for i, (alt_text, img_path) in enumerate(matches):
-            # 规范化路径
-            normalized_img_path = os.path.normpath(img_path)
-            
-            # 如果此路径已处理过，跳过
-            if normalized_img_path in processed_paths:
+    # 查找图片链接，统计每个路径被引用的次数
+    t0 = time.perf_counter()
+    matches = [(ref.alt, ref.path) for ref in md_images.parse_images(content)]
+    link_counts = Counter(os.path.normpath(img_path) for _, img_path in matches)
+    if move:
+        # 同一图片在本笔记中以不同的相对路径引用时，移动一次后其他路径就失效了
+        source_counts = Counter(os.path.abspath(os.path.join(base_dir, p)) for p in link_counts)
+        if shared_images is None:
+            shared_images = ()
+    t1 = time.perf_counter()
+    stats["time_parse"] += t1 - t0
+
+    processed_paths = set()  # 跟踪已处理的路径
+
+    for alt_text, img_path in matches:
+        # 规范化路径，解决Windows路径问题
+        normalized_img_path = os.path.normpath(img_path)
+
+        # 如果此路径已处理过，跳过
+        if normalized_img_path in processed_paths:
+            continue
+        processed_paths.add(normalized_img_path)
+
+        # 远程图片使用下载的本地副本，副本可能被多个笔记引用，不能移动
+        remote = md_images.is_remote(img_path)
+        if remote:
+            img_full_path = remote_images.get(img_path) if remote_images else None
+            if img_full_path is None:
+                plan["remote"].append(img_path)
                 continue
-                
-            processed_paths.add(normalized_img_path)
-            
+            if not alt_text:
+                alt_text = os.path.splitext(os.path.basename(urlsplit(img_path).path))[0] or "image"
+        else:
+            # 没有描述的图片沿用原文件名
+            if not alt_text:
+                alt_text = os.path.splitext(os.path.basename(normalized_img_path))[0]
+
             # 构建完整路径
             img_full_path = os.path.abspath(os.path.join(base_dir, normalized_img_path))
-            
+
             # 检查文件是否存在
-            if not os.path.exists(img_full_path):
-                logger.info(f"⚠️ 找不到图片：{img_full_path}，跳过")
+            if not file_ops.path_exists(img_full_path, dir_cache):
+                plan["missing"].append(img_full_path)
                 continue
 
-            # 处理重复描述
-            if alt_text in desc_set:
-                # 重复描述，提供唯一名称
-                base_alt = alt_text
-                count = 1
-                while alt_text in desc_set:
-                    alt_text = f"{base_alt}_{count}"
-                    count += 1
-                logger.info(f"图片描述重复: '{base_alt}' 改为 '{alt_text}'")
-            
-            desc_set.add(alt_text)
-
-            # 生成新文件名和路径
-            file_ext = os.path.splitext(img_full_path)[1]
-            safe_alt_text = sanitize_filename(alt_text)
-            new_filename = f"{safe_alt_text}{file_ext}"
-            
-            # 确保新文件保存在指定文件夹中
-            img_dir = os.path.join(base_dir, img_dir_name)
-            new_full_path = os.path.join(img_dir, new_filename)
-            # 使用用户指定的目录构建新路径
-            new_relative_path = f"./{img_dir_name}/{new_filename}".replace("\\", "/")
-
-            # 判断源路径和目标路径是否相同
-            if os.path.normcase(img_full_path) == os.path.normcase(new_full_path):
-                logger.info(f"图片名称已经符合要求: {new_filename}")
+        # 去重模式：图片目录中已有内容相同的文件时直接引用它
+        if dedup:
+            if content_index is None:
+                content_index = file_ops.ContentIndex(img_dir)
+            existing = content_index.find(img_full_path)
+            if existing is not None:
+                existing_name = os.path.basename(existing)
+                if os.path.normcase(existing) == os.path.normcase(img_full_path):
+                    plan["already_named"].append(existing_name)
+                else:
+                    plan["operations"].append({
+                        "path": normalized_img_path,
+                        "source": img_full_path,
+                        "target": existing,
+                        "link": f"./{img_dir_name}/{existing_name}".replace("\\", "/"),
+                        "alt": alt_text,
+                        "links": link_counts[normalized_img_path],
+                        "reused": True,
+                    })
                 continue
 
+        # 生成新文件名：名称已被其他图片（本笔记、同目录的其他笔记或目录中已有的文件）
+        # 占用时依次加上 _1、_2 …… 后缀，不会覆盖其他图片
+        if names is None:
+            names = naming.NameIndex(
+                img_dir, dir_cache.names(img_dir) if dir_cache is not None else None)
+        file_ext = os.path.splitext(img_full_path)[1]
+        new_filename, count = names.claim(name_for(alt_text), file_ext, img_full_path)
+
+        # 确保新文件保存在指定文件夹中
+        new_full_path = os.path.join(img_dir, new_filename)
+        # 使用用户指定的目录构建新路径
+        new_relative_path = f"./{img_dir_name}/{new_filename}".replace("\\", "/")
+
+        # 判断源路径和目标路径是否相同；上次运行已经改为带序号名称的图片不算名称冲突
+        if os.path.normcase(img_full_path) == os.path.normcase(new_full_path):
+            plan["already_named"].append(new_filename)
+            continue
+
+        if count:
+            plan["collisions"].append({"alt": alt_text, "renamed": f"{alt_text}_{count}"})
+            alt_text = f"{alt_text}_{count}"
+
+        plan["operations"].append({
+            "path": normalized_img_path,
+            "source": img_full_path,
+            "target": new_full_path,
+            "link": new_relative_path,
+            "alt": alt_text,
+            "links": link_counts[normalized_img_path],
+        })
+        if (move and not remote and source_counts[img_full_path] == 1
+                and img_full_path not in shared_images):
+            plan["operations"][-1]["move"] = True
+        if content_index is not None:
+            content_index.add(new_full_path, img_full_path)
+
+    # 检查图片是否存在、生成新名称的耗时
+    stats["time_stat"] += time.perf_counter() - t1
+    stats["bytes_read"] += st.st_size
+    stats["links_found"] += len(matches)
+    stats["images_missing"] += len(plan["missing"])
+    stats["remote_skipped"] += len(plan["remote"])
+    stats["collisions"] += len(plan["collisions"])
+    return plan
+
+def copy_note_images(plan, stats, progress_callback=None, copy_results=None, copy_strategy="auto",
+                     dir_cache=None, overwrite=True):
+    """执行计划中的图片复制
+
+    Args:
+        plan: plan_md_file 生成的计划
+        stats: Counter，累加 copied/copied_bytes/moved/moved_bytes/skipped/skipped_bytes/time_copy，
+            以及每种复制方式的使用次数 copy_<方式>
+        progress_callback: 进度回调函数
+        copy_results: 可选的 (源, 目标) -> 结果 字典，批量执行时在多个计划间共享，
+            同一复制只做一次
+        copy_strategy: 复制方式，见 file_ops.copy_file
+        dir_cache: 可选的 file_ops.DirCache，目标文件和图片目录的存在检查在缓存中完成
+        overwrite: 为 False 时目标文件已存在且内容不同的操作记为失败，不覆盖；
+            执行事先生成的计划时使用，目标文件可能在生成计划后才出现
+
+    Returns:
+        (path_map, img_count): 复制成功的 规范化原路径 -> 新链接，以及处理的图片数量
+
+    每项操作记录结果 status：copied/moved/skipped（目标内容相同）/failed，失败时另有 error。
+    只有文件读写错误（OSError）记为失败，其他异常照常抛出。
+    """
+    img_folder_path = os.path.join(os.path.dirname(plan["note"]), plan["img_dir"])
+
+    # 检查img文件夹是否存在；无法创建时所有操作都记为失败
+    if not file_ops.path_exists(img_folder_path, dir_cache):
+        try:
+            os.makedirs(img_folder_path, exist_ok=True)
+        except OSError as e:
+            events.emit(events.ERROR, "创建 {} 文件夹时出错: {}", plan["img_dir"], e)
+            for op in plan["operations"]:
+                op["status"] = "failed"
+                op["error"] = f"{type(e).__name__}: {e}"
+            return {}, 0
+        if dir_cache is not None:
+            dir_cache.add(img_folder_path)
+        events.emit(events.INFO, "已创建 {} 文件夹: {}", plan["img_dir"], img_folder_path)
+
+    for img_full_path in plan["missing"]:
+        events.emit(events.WARNING, "⚠️ 找不到图片：{}，跳过", img_full_path)
+    for url in plan.get("remote", ()):
+        events.emit(events.WARNING, "远程图片未下载，保持原链接：{}", url)
+    for collision in plan["collisions"]:
+        events.emit(events.INFO, "图片名称已被占用: '{}' 改为 '{}'", collision["alt"],
+                    collision["renamed"])
+    for new_filename in plan["already_named"]:
+        events.emit(events.INFO, "图片名称已经符合要求: {}", new_filename)
+
+    path_map = {}
+    img_count = 0
+    operations = plan["operations"]
+    for i, op in enumerate(operations):
+        key = (op["source"], op["target"])
+        new_filename = os.path.basename(op["target"])
+        if copy_results is not None and key in copy_results:
+            op["status"], error = copy_results[key]
+            if error is not None:
+                op["error"] = error
+        else:
             # 安全复制文件
+            t0 = time.perf_counter()
             try:
-                # 如果目标文件已存在，先删除
-                if os.path.exists(new_full_path):
-                    os.remove(new_full_path)
-                
-                # 复制而不是移动，避免源文件不存在的问题
-                shutil.copy2(img_full_path, new_full_path)
-                
-                # 源文件和目标文件不同才计算为成功处理
-                if os.path.normcase(img_full_path) != os.path.normcase(new_full_path):
-                    img_count += 1
-                    logger.info(f"已处理: {os.path.basename(img_full_path)} -> {new_filename}")
-                
-                # 替换文件内容中的所有此图片路径实例
-                for orig_path in matches:
-                    if os.path.normpath(orig_path[1]) == normalized_img_path:
-                        orig_text = f"![{orig_path[0]}]({orig_path[1]})"
-                        new_text = f"![{orig_path[0]}]({new_relative_path})"
-                        new_content = new_content.replace(orig_text, new_text)
-                
-            except Exception as e:
-                logger.info(f"处理图片时出错: {e}")
-                continue
+                if op.get("move"):
+                    # 没有其他笔记引用的图片直接移动，记录下来以便保存笔记失败时撤销
+                    moved, size = file_ops.move_if_changed(op["source"], op["target"],
+                                                           copy_strategy, dir_cache, overwrite)
+                    op["moved"] = moved
+                    if moved:
+                        op["status"] = "moved"
+                        stats["moved"] += 1
+                        stats["moved_bytes"] += size
+                    else:
+                        op["status"] = "skipped"
+                        stats["skipped"] += 1
+                        stats["skipped_bytes"] += size
+                        events.emit(events.INFO, "目标图片内容相同，已删除原图片: {}", new_filename)
+                else:
+                    # 复制而不是移动，避免其他笔记引用的源文件不存在；目标内容相同时跳过复制
+                    used, size = file_ops.copy_if_changed(op["source"], op["target"],
+                                                          copy_strategy, dir_cache, overwrite)
+                    if used:
+                        op["status"] = "copied"
+                        stats["copied"] += 1
+                        stats["copied_bytes"] += size
+                        stats[f"copy_{used}"] += 1
+                    else:
+                        op["status"] = "skipped"
+                        stats["skipped"] += 1
+                        stats["skipped_bytes"] += size
+                        events.emit(events.INFO, "目标图片内容相同，跳过复制: {}", new_filename)
+            except OSError as e:
+                events.emit(events.ERROR, "处理图片时出错: {}", e)
+                op["status"] = "failed"
+                op["error"] = f"{type(e).__name__}: {e}"
+            stats["time_copy"] += time.perf_counter() - t0
+            if copy_results is not None:
+                copy_results[key] = (op["status"], op.get("error"))
+
+        if op["status"] == "failed":
+            continue
+
+        img_count += 1
+        events.emit(events.INFO, "已处理: {} -> {}", os.path.basename(op["source"]), new_filename)
+        # 记录新路径，稍后统一替换此图片的所有引用
+        path_map[op["path"]] = op["link"]
 
-            # 更新进度
-            if progress_callback:
-                progress_callback(i + 1, len(matches))
+        # 更新进度
+        if progress_callback:
+            progress_callback(i + 1, len(operations))
 
-        # 保存新内容到文件
+    return path_map, img_count
+
+def undo_moves(plan):
+    """把 copy_note_images 移动过的图片恢复到原位置，保存笔记失败时使用"""
+    for op in plan["operations"]:
+        if "moved" not in op:
+            continue
         try:
-            with open(md_file_path, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-            
-            if img_count > 0:
-                logger.info(f"✅ 已完成 {img_count} 个图片的处理")
+            if op.pop("moved"):
+                shutil.move(op["target"], op["source"])
             else:
-                logger.info(f"ℹ️ 没有需要处理的图片")
-        except Exception as e:
-            logger.info(f"保存文件时出错: {e}")
+                shutil.copy2(op["target"], op["source"])
+        except OSError as e:
+            events.emit(events.ERROR, "恢复图片时出错 {}: {}", op["source"], e)
+
+def rewrite_note(plan, path_map, img_count, content=None, stats=None, index=None):
+    """按复制结果替换链接并保存Markdown文件
+
+    Args:
+        plan: plan_md_file 生成的计划
+        path_map: copy_note_images 返回的 规范化原路径 -> 新链接
+        img_count: 处理的图片数量，仅用于日志
+        content: 生成计划时读取的内容，为 None 时重新读取
+        stats: Counter，累加 notes_written/bytes_written/time_rewrite/time_write
+        index: 可选的 note_index.NoteIndex，记录处理结果；有图片处理失败时不记录
+
+    Returns:
+        是否改写了笔记
+
+    保存失败（文件读写或编码错误）时撤销移动模式下移动过的图片，笔记中的旧链接仍然有效，
+    错误信息记录在 plan["error"]；其他异常照常抛出。
+    """
+    md_file_path = plan["note"]
+    if stats is None:
+        stats = Counter()
+    if content is None:
+        content, _ = read_md_file(md_file_path)
+
+    # 一次遍历替换所有已处理图片的链接
+    t0 = time.perf_counter()
+    refs = md_images.parse_images(content)
+    new_content = rewrite_links(content, path_map, refs)
+    t1 = time.perf_counter()
+    stats["time_rewrite"] += t1 - t0
+
+    # 内容有变化时才保存，使用临时文件 + 替换保证写入的原子性，保持原来的编码和换行符
+    unchanged = saved = new_content == content
+    try:
+        if not saved:
+            written = file_ops.write_text_atomic(md_file_path, new_content,
+                                                 plan.get("encoding") or 'utf-8',
+                                                 plan.get("newline") or '\n')
+            stats["notes_written"] += 1
+            stats["bytes_written"] += written
+            stats["time_write"] += time.perf_counter() - t1
+            saved = True
+
+        # 记录到增量索引；同时记下未下载的远程图片数，启用下载后这些笔记会重新处理。
+        # 有图片处理失败时不记录（并删除旧记录），下次运行时重试
+        if index is not None and any(op.get("status") == "failed" for op in plan["operations"]):
+            index.forget(md_file_path)
+        elif index is not None:
+            base_dir = os.path.dirname(md_file_path)
+            image_paths = []
+            for ref in refs:
+                link = path_map.get(os.path.normpath(ref.path), ref.path)
+                if not md_images.is_remote(link):
+                    image_paths.append(
+                        os.path.abspath(os.path.join(base_dir, os.path.normpath(link))))
+            index.record(md_file_path, plan["img_dir"], image_paths,
+                         len(plan.get("remote", ())))
+
+        if img_count > 0:
+            events.emit(events.INFO, "✅ 已完成 {} 个图片的处理", img_count)
+        else:
+            events.emit(events.INFO, "ℹ️ 没有需要处理的图片")
+    except (OSError, UnicodeError) as e:
+        events.emit(events.ERROR, "保存文件时出错: {}", e)
+        plan["error"] = f"{type(e).__name__}: {e}"
+        if not saved:
+            undo_moves(plan)
+    return saved and not unchanged
+
+def plan_failed(plan):
+    """执行后的计划中是否有图片处理失败或笔记保存失败"""
+    return "error" in plan or any(op.get("status") == "failed" for op in plan["operations"])
+
+def execute_note_plan(plan, content=None, progress_callback=None, stats=None, index=None,
+                      copy_strategy="auto", dir_cache=None):
+    """执行单个Markdown文件的重命名计划
+
+    Returns:
+        处理的图片数量
+    """
+    if stats is None:
+        stats = Counter()
+    path_map, img_count = copy_note_images(plan, stats, progress_callback,
+                                           copy_strategy=copy_strategy, dir_cache=dir_cache)
+    rewrite_note(plan, path_map, img_count, content, stats, index)
+    return img_count
+
+def process_md_file(md_file_path, progress_callback=None, img_dir_name="img", stats=None,
+                    index=None, dedup=False, move=False, shared_images=None, copy_strategy="auto",
+                    dir_cache=None, names=None, remote_images=None, content_index=None):
+    """处理单个Markdown文件中的图片链接
+
+    相当于 plan_md_file 之后立即 execute_note_plan，文件内容只读取一次。
+    
+    Args:
+        md_file_path: Markdown文件路径
+        progress_callback: 进度回调函数
+        img_dir_name: 图片保存目录名称，默认为"img"
+        stats: 可选的 Counter，累加 copied/copied_bytes/skipped/skipped_bytes/unchanged/
+            notes_written，以及处理失败（无法读取、图片复制或保存失败）的笔记数 errors
+        index: 可选的 note_index.NoteIndex，笔记和图片都未改动时直接跳过
+        dedup: 去重模式，见 plan_md_file
+        move/shared_images: 移动模式，见 plan_md_file
+        copy_strategy: 复制方式，见 file_ops.copy_file
+        dir_cache: 可选的 file_ops.DirCache，批量处理时在多个笔记间共享
+        names: 图片目录的 naming.NameIndex，见 plan_md_file
+        remote_images: 已下载的远程图片，见 plan_md_file
+        content_index: 去重模式下图片目录的内容索引，见 plan_md_file
+        
+    Returns:
+        处理的图片数量
+    """
+    if stats is None:
+        stats = Counter()
+    md_file_path = os.path.abspath(md_file_path)
+    try:
+        # 增量模式：上次处理后没有变化的文件只需 stat 即可跳过
+        if index is not None:
+            t0 = time.perf_counter()
+            unchanged = index.is_unchanged(md_file_path, img_dir_name, remote_images is not None)
+            stats["time_index"] += time.perf_counter() - t0
+            if unchanged:
+                stats["unchanged"] += 1
+                return 0
 
+        t0 = time.perf_counter()
+        content, encoding, newline = read_md_text(md_file_path)
+        stats["time_read"] += time.perf_counter() - t0
+        plan = plan_md_file(md_file_path, img_dir_name, content, encoding, dedup, stats,
+                            move, shared_images, newline, dir_cache, names, remote_images,
+                            content_index=content_index)
+        img_count = execute_note_plan(plan, content, progress_callback, stats, index,
+                                      copy_strategy, dir_cache)
+        if plan_failed(plan):
+            stats["errors"] += 1
         return img_count
     except Exception as e:
-        logger.info(f"处理文件时出现未知错误: {e}")
+        events.emit(events.ERROR, "处理文件时出现未知错误: {}", e)
+        stats["errors"] += 1
         return 0
@@ -0,0 +1,180 @@
+"""笔记库级别的图片去重
+
+同一目录（同一个图片目录）中内容相同的图片只保留一份，所有笔记中对重复文件的引用
+都改为指向保留的那一份，然后删除不再被引用的重复文件。
+
+只在同一目录内去重：每个目录的笔记都把图片放在自己的图片目录中，跨目录共用一份图片
+会在下一次重命名时又被复制回来。处理时配合 process_md_file(dedup=True) 使用，
+之后的运行不会重新产生重复文件。
+"""
+import os
+from collections import Counter, defaultdict
+
+import core_logic
+import events
+import file_ops
+import md_images
+
+
+def _resolve(note_dir, link_path):
+    return os.path.abspath(os.path.join(note_dir, os.path.normpath(link_path)))
+
+
+def _relative_link(note_dir, image_path):
+    rel = os.path.relpath(image_path, note_dir).replace("\\", "/")
+    return rel if rel.startswith("../") else f"./{rel}"
+
+
+def build_reverse_index(md_files, unreadable=None):
+    """建立 图片 -> 引用它的笔记 的反向索引
+
+    Args:
+        md_files: Markdown文件路径的可迭代对象
+        unreadable: 可选的集合，加入无法读取的笔记
+
+    Returns:
+        {图片绝对路径: {笔记路径, ...}}，只包含存在的本地图片
+    """
+    reverse = defaultdict(set)
+    for md_file in md_files:
+        try:
+            content, _ = core_logic.read_md_file(md_file)
+        except (OSError, UnicodeDecodeError):
+            if unreadable is not None:
+                unreadable.add(md_file)
+            continue
+        note_dir = os.path.dirname(md_file)
+        for ref in md_images.parse_images(content):
+            image_path = _resolve(note_dir, ref.path)
+            if os.path.isfile(image_path):
+                reverse[image_path].add(md_file)
+    return reverse
+
+
+def find_shared_images(md_files):
+    """返回被不止一个笔记引用的图片绝对路径集合，移动模式下这些图片只能复制"""
+    return frozenset(p for p, notes in build_reverse_index(md_files).items() if len(notes) > 1)
+
+
+def sibling_notes(md_files):
+    """给出的笔记所在目录中的所有笔记
+
+    同一目录的笔记共用图片目录，只给出其中一部分笔记时，其他笔记也可能引用同一图片。
+    """
+    dirs = {os.path.dirname(os.path.abspath(md_file)) for md_file in md_files}
+    notes = []
+    for dir_path in sorted(dirs):
+        try:
+            with os.scandir(dir_path) as it:
+                notes.extend(entry.path for entry in it
+                             if entry.name.endswith(".md") and entry.is_file())
+        except OSError:
+            continue
+    return notes
+
+
+def plan_dedup(md_files):
+    """生成去重计划，只读取文件
+
+    引用关系来自给出的笔记所在目录中的所有笔记（见 sibling_notes），而不只是给出的笔记，
+    删除的重复文件不会再被这些笔记引用；其他目录的笔记通过相对路径引用的图片不在考虑之内。
+    目录中有笔记无法读取时，不知道它引用了哪些图片，该目录及其子目录（图片目录）中的图片不去重。
+
+    先按 (所在目录, 大小) 分组，只有大小相同的图片才计算哈希。
+    每组内容相同的图片保留被引用最多的一份（相同时取文件名最短的）。
+
+    Returns:
+        可序列化为JSON的字典:
+            groups: [{"keep": 保留的文件, "duplicates": [重复文件, ...], "bytes": 可节省的字节数}]
+            notes: {笔记路径: {重复文件: 保留的文件}}
+    """
+    unreadable = set()
+    reverse = build_reverse_index(sibling_notes(md_files), unreadable)
+    unknown_dirs = {os.path.normcase(os.path.dirname(md_file)) for md_file in unreadable}
+
+    by_dir_size = defaultdict(list)
+    for image_path in reverse:
+        image_dir = os.path.dirname(image_path)
+        if (os.path.normcase(image_dir) in unknown_dirs
+                or os.path.normcase(os.path.dirname(image_dir)) in unknown_dirs):
+            continue
+        try:
+            size = os.path.getsize(image_path)
+        except OSError:
+            continue
+        by_dir_size[(os.path.normcase(os.path.dirname(image_path)), size)].append(image_path)
+
+    groups = []
+    note_rewrites = defaultdict(dict)
+    for (_, size), images in by_dir_size.items():
+        if len(images) < 2:
+            continue
+        by_hash = defaultdict(list)
+        for image_path in images:
+            by_hash[file_ops.cached_file_hash(image_path)].append(image_path)
+
+        for same in by_hash.values():
+            if len(same) < 2:
+                continue
+            same.sort(key=lambda p: (-len(reverse[p]), len(os.path.basename(p)), p))
+            keep, duplicates = same[0], same[1:]
+            groups.append({"keep": keep, "duplicates": duplicates, "bytes": size * len(duplicates)})
+            for dup in duplicates:
+                for md_file in reverse[dup]:
+                    note_rewrites[md_file][dup] = keep
+
+    return {"groups": groups, "notes": dict(note_rewrites)}
+
+
+def apply_dedup(plan, delete=True, stats=None):
+    """执行去重计划
+
+    Args:
+        plan: plan_dedup 生成的计划
+        delete: 改写引用后删除重复文件
+        stats: 可选的 Counter，累加 notes_written/dedup_removed/dedup_bytes
+
+    Returns:
+        stats
+    """
+    if stats is None:
+        stats = Counter()
+
+    failed_notes = set()
+    for md_file, mapping in plan["notes"].items():
+        note_dir = os.path.dirname(md_file)
+
+        def _new_path(ref):
+            keep = mapping.get(_resolve(note_dir, ref.path))
+            return None if keep is None else _relative_link(note_dir, keep)
+
+        try:
+            content, encoding, newline = core_logic.read_md_text(md_file)
+            new_content = md_images.replace_paths(content, md_images.parse_images(content),
+                                                  _new_path)
+            if new_content != content:
+                file_ops.write_text_atomic(md_file, new_content, encoding, newline)
+                stats["notes_written"] += 1
+        except Exception as e:
+            events.emit(events.ERROR, "改写引用时出错 {}: {}", md_file, e)
+            failed_notes.add(md_file)
+
+    if not delete:
+        return stats
+
+    for group in plan["groups"]:
+        for dup in group["duplicates"]:
+            # 有笔记改写失败时，它引用的重复文件不能删除
+            if any(dup in plan["notes"].get(n, ()) for n in failed_notes):
+                continue
+            try:
+                size = os.path.getsize(dup)
+                os.remove(dup)
+            except OSError as e:
+                events.emit(events.ERROR, "删除重复图片时出错 {}: {}", dup, e)
+                continue
+            stats["dedup_removed"] += 1
+            stats["dedup_bytes"] += size
+            events.emit(events.INFO, "已删除重复图片: {} -> 保留 {}", os.path.basename(dup),
+                        os.path.basename(group["keep"]))
+    return stats
@@ -0,0 +1,147 @@
+"""可复用的重命名引擎，供其他程序作为库调用
+
+process_md_file 面向图形界面和命令行：返回处理的图片数，其余信息只写入日志，出错时记录日志后
+返回 0。RenameEngine 使用同样的计划和执行步骤，但配置显式给出，每个文件返回结构化的结果；
+文件读写错误记录在结果中，其他异常（程序错误）照常抛出。
+
+引擎在多次调用之间保留目录列表缓存和各图片目录的文件名索引（去重模式下还有内容索引），
+处理同一目录的多个笔记时不会重复列目录。其他程序修改了这些目录后应调用 refresh()。
+引擎不是线程安全的，每个线程使用各自的引擎。
+
+用法:
+    engine = RenameEngine(EngineConfig(img_dir="assets", copy_strategy="reflink"))
+    for result in engine.process_files(paths):
+        if result.errors:
+            ...
+"""
+import os
+from collections import Counter, namedtuple
+
+import core_logic
+import dedup
+import file_ops
+import naming
+import scanner
+
+# 引擎配置
+# img_dir: 图片目录名称；naming: 由图片描述生成文件名（不含扩展名）的函数，
+# 为 None 时使用 core_logic.sanitize_filename；copy_strategy: 见 file_ops.copy_file；
+# encoding: 读取笔记的编码，为 None 时自动检测，保存时沿用读取的编码；
+# dedup/move: 去重模式和移动模式，见 core_logic.plan_md_file
+EngineConfig = namedtuple(
+    "EngineConfig", ["img_dir", "naming", "copy_strategy", "encoding", "dedup", "move"],
+    defaults=("img", None, "auto", None, False, False))
+
+
+class FileResult(namedtuple("FileResult", ["note", "renamed", "skipped", "missing", "remote",
+                                           "errors", "written"])):
+    """单个笔记的处理结果
+
+    renamed: [(源文件, 目标文件)]，本次复制或移动的图片
+    skipped: [目标文件]，名称已经符合要求或目标内容相同而无需复制的图片
+    missing: [图片路径]，找不到的图片
+    remote: [URL]，没有下载的远程图片
+    errors: [错误信息]，读取、复制或保存失败
+    written: 是否改写了笔记
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+class RenameEngine:
+    """按配置处理Markdown文件，返回 FileResult"""
+
+    def __init__(self, config=None, **options):
+        """
+        Args:
+            config: EngineConfig，为 None 时由 options 构造
+            options: EngineConfig 的字段
+        """
+        self.config = config if config is not None else EngineConfig(**options)
+        # 所有调用累加的计数，键同 core_logic.plan_md_file 等函数的 stats
+        self.stats = Counter()
+        self._dir_cache = file_ops.DirCache()
+        self._names = {}    # 规范化的图片目录 -> naming.NameIndex
+        self._contents = {}     # 去重模式下 规范化的图片目录 -> file_ops.ContentIndex
+
+    def refresh(self):
+        """丢弃缓存的目录列表和文件名索引，目录被其他程序修改后调用"""
+        self._dir_cache = file_ops.DirCache()
+        self._names.clear()
+        self._contents.clear()
+
+    def _names_for(self, md_file):
+        img_dir = os.path.join(os.path.dirname(md_file), self.config.img_dir)
+        key = os.path.normcase(img_dir)
+        names = self._names.get(key)
+        if names is None:
+            names = self._names[key] = naming.NameIndex(img_dir, self._dir_cache.names(img_dir))
+        return names
+
+    def _contents_for(self, md_file):
+        if not self.config.dedup:
+            return None
+        img_dir = os.path.join(os.path.dirname(md_file), self.config.img_dir)
+        key = os.path.normcase(img_dir)
+        contents = self._contents.get(key)
+        if contents is None:
+            contents = self._contents[key] = file_ops.ContentIndex(img_dir)
+        return contents
+
+    def process_file(self, md_file, shared_images=None, remote_images=None):
+        """处理单个笔记
+
+        Args:
+            md_file: Markdown文件路径
+            shared_images: 移动模式下被多个笔记引用的图片，见 core_logic.plan_md_file
+            remote_images: 已下载的远程图片，见 core_logic.plan_md_file
+
+        Returns:
+            FileResult
+        """
+        config = self.config
+        md_file = os.path.abspath(md_file)
+        try:
+            content, encoding, newline = core_logic.read_md_text(md_file, config.encoding)
+            plan = core_logic.plan_md_file(
+                md_file, config.img_dir, content, encoding, config.dedup, self.stats,
+                config.move, shared_images, newline, self._dir_cache, self._names_for(md_file),
+                remote_images, config.naming, self._contents_for(md_file))
+        except (OSError, UnicodeError) as e:
+            return FileResult(md_file, [], [], [], [], [f"{type(e).__name__}: {e}"], False)
+
+        path_map, img_count = core_logic.copy_note_images(
+            plan, self.stats, copy_strategy=config.copy_strategy, dir_cache=self._dir_cache)
+        written = core_logic.rewrite_note(plan, path_map, img_count, content, self.stats)
+
+        img_dir = os.path.join(os.path.dirname(md_file), config.img_dir)
+        renamed = []
+        skipped = [os.path.join(img_dir, name) for name in plan["already_named"]]
+        errors = []
+        for op in plan["operations"]:
+            if op["status"] == "failed":
+                errors.append(f"{op['source']}: {op['error']}")
+            elif op["status"] == "skipped":
+                skipped.append(op["target"])
+            else:
+                renamed.append((op["source"], op["target"]))
+        if "error" in plan:
+            errors.append(plan["error"])
+        return FileResult(md_file, renamed, skipped, plan["missing"], plan["remote"], errors,
+                          written)
+
+    def process_files(self, md_files, remote_images=None):
+        """依次处理多个笔记，返回 FileResult 列表
+
+        移动模式下先读取这些笔记所在公共目录下的所有笔记，找出被多个笔记引用而只能复制的图片。
+        """
+        md_files = [os.path.abspath(md_file) for md_file in md_files]
+        shared_images = None
+        if self.config.move and md_files:
+            root = os.path.commonpath([os.path.dirname(md_file) for md_file in md_files])
+            shared_images = dedup.find_shared_images(
+                scanner.iter_md_files(root, self.config.img_dir))
+        return [self.process_file(md_file, shared_images, remote_images) for md_file in md_files]
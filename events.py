@@ -0,0 +1,130 @@
+"""处理过程中的消息（事件）
+
+各模块不直接写日志，而是用 emit 把事件交给当前的接收器（sink）：
+    - 事件只保存模板和参数，真正显示时才格式化
+    - emit 先按级别过滤，接收器不需要的事件不会被创建
+    - 默认的 LoggingSink 转交给 logging，日志的格式和级别由使用者（如命令行入口）配置
+    - RingBufferSink 把事件保存在有界的环形缓冲区中，界面定时批量取出显示
+
+多进程处理时，工作进程中的事件先收集在缓冲区中，随处理结果一起返回，由主进程用 deliver
+交给它的接收器。
+
+接收器需要提供 level 属性（接收的最低级别）、enabled(level) 和 emit(event)，
+可能被多个线程同时调用。
+"""
+import logging
+import threading
+from collections import deque, namedtuple
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+# 默认转交的 logger 名称
+LOGGER_NAME = "markdown_rename_tool"
+# 环形缓冲区默认保存的事件数
+DEFAULT_CAPACITY = 2000
+
+
+class Event(namedtuple("Event", ["level", "template", "args"])):
+    """一条消息；template 用 str.format 的 {} 占位，args 为参数"""
+    __slots__ = ()
+
+    @property
+    def message(self):
+        return self.template.format(*self.args) if self.args else self.template
+
+
+class LoggingSink:
+    """把事件交给 logging；logger 没有启用该级别时不格式化"""
+
+    def __init__(self, logger=None):
+        self.logger = logger if logger is not None else logging.getLogger(LOGGER_NAME)
+
+    @property
+    def level(self):
+        return self.logger.getEffectiveLevel()
+
+    def enabled(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def emit(self, event):
+        self.logger.log(event.level, event.message)
+
+
+class NullSink:
+    """丢弃所有事件"""
+    level = logging.CRITICAL + 1
+
+    def enabled(self, level):
+        return False
+
+    def emit(self, event):
+        pass
+
+
+class RingBufferSink:
+    """把事件保存在有界的环形缓冲区中，由 drain 批量取出
+
+    缓冲区满时丢弃最早的事件并计数，处理速度再快也不会无限占用内存。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, level=INFO):
+        self.level = level
+        self._events = deque(maxlen=capacity)
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, event):
+        with self._lock:
+            if len(self._events) == self._events.maxlen:
+                self._dropped += 1
+            self._events.append(event)
+
+    def drain(self):
+        """取出缓冲区中的所有事件
+
+        Returns:
+            (事件列表, 上次取出后因缓冲区已满而丢弃的事件数)
+        """
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            dropped, self._dropped = self._dropped, 0
+        return events, dropped
+
+
+_sink = LoggingSink()
+
+
+def get_sink():
+    return _sink
+
+
+def set_sink(sink):
+    """设置当前进程的接收器，返回原来的接收器；为 None 时恢复为 LoggingSink"""
+    global _sink
+    previous = _sink
+    _sink = sink if sink is not None else LoggingSink()
+    return previous
+
+
+def emit(level, template, *args):
+    """发出一条消息，接收器不需要该级别时直接返回"""
+    sink = _sink
+    if sink.enabled(level):
+        sink.emit(Event(level, template, args))
+
+
+def deliver(events, dropped=0):
+    """把其他进程收集的事件交给当前的接收器"""
+    sink = _sink
+    for event in events:
+        if sink.enabled(event.level):
+            sink.emit(event)
+    if dropped and sink.enabled(WARNING):
+        sink.emit(Event(WARNING, "另有 {} 条消息因缓冲区已满而省略", (dropped,)))
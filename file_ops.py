@@ -0,0 +1,450 @@
+"""文件操作：图片内容比较与按需复制/移动，Markdown文件的原子写入"""
+import os
+import stat
+import errno
+import shutil
+import hashlib
+import tempfile
+import threading
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# 流式计算哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Linux 的 FICLONE ioctl：在 Btrfs、XFS 等文件系统上让目标文件共用源文件的数据块
+FICLONE = 0x40049409
+
+# 复制方式，按优先顺序排列；指定某一方式时从它开始依次尝试，不支持时退回到后面的方式
+COPY_STRATEGIES = ("reflink", "copy_file_range", "sendfile", "hardlink", "copy")
+
+# 这些错误表示平台或文件系统不支持该复制方式
+_UNSUPPORTED_ERRNOS = frozenset(
+    getattr(errno, name) for name in ("ENOTSUP", "EOPNOTSUPP", "EXDEV", "EINVAL", "ENOSYS",
+                                      "ENOTTY", "EPERM", "EMLINK")
+    if hasattr(errno, name)
+)
+
+# 已确认不支持的 (复制方式, 源文件所在设备)，之后直接跳过
+_unsupported = set()
+
+
+def file_hash(path):
+    """流式计算文件内容的哈希值（blake2b 十六进制字符串）"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bytes_hash(data):
+    """内存中内容的哈希值，与 file_hash 的结果一致"""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+@lru_cache(maxsize=4096)
+def _cached_hash(path, mtime_ns, size):
+    return file_hash(path)
+
+
+def cached_file_hash(path, st=None):
+    """带缓存的 file_hash，文件的修改时间或大小变化后缓存自动失效"""
+    if st is None:
+        st = os.stat(path)
+    return _cached_hash(path, st.st_mtime_ns, st.st_size)
+
+
+class ContentIndex:
+    """目录中文件内容的索引，用于查找内容相同的文件
+
+    按文件大小分桶，只有大小相同时才计算（并缓存）哈希。
+    """
+
+    def __init__(self, folder):
+        # 大小 -> [(文件路径, 读取内容用的路径, stat)]
+        self.by_size = {}
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file():
+                        st = entry.stat()
+                        self.by_size.setdefault(st.st_size, []).append((entry.path, entry.path, st))
+        except OSError:
+            pass
+
+    def add(self, path, content_path):
+        """登记一个将要出现在目录中的文件，其内容与 content_path 相同"""
+        st = os.stat(content_path)
+        self.by_size.setdefault(st.st_size, []).append((path, content_path, st))
+
+    def find(self, path):
+        """返回目录中与 path 内容相同的文件，path 本身在目录中时返回它自己，没有时返回 None"""
+        st = os.stat(path)
+        candidates = self.by_size.get(st.st_size, ())
+        norm = os.path.normcase(os.path.abspath(path))
+        for cand, _, _ in candidates:
+            if os.path.normcase(os.path.abspath(cand)) == norm:
+                return cand
+        digest = None
+        for cand, content_path, cst in candidates:
+            try:
+                cand_digest = cached_file_hash(content_path, cst)
+            except OSError:
+                # 登记时的源文件已被移走（移动模式），改用目录中的文件
+                try:
+                    cand_digest = cached_file_hash(cand)
+                except OSError:
+                    continue
+            if digest is None:
+                digest = cached_file_hash(path, st)
+            if cand_digest == digest:
+                return cand
+        return None
+
+
+class DirCache:
+    """目录列表缓存：每个目录只 scandir 一次，之后的存在检查都是内存查找
+
+    网络共享上每次 stat 都是一次往返，批量处理时在多个笔记间共享一个缓存。
+    自己创建或删除文件后用 add/discard 更新。其他进程的修改不会反映出来，
+    因此缓存中没有的文件要确认不存在时应再实际检查一次，见 path_exists。
+    """
+
+    def __init__(self):
+        # 规范化的目录路径 -> 规范化的文件名集合，目录不存在时为空集合
+        self._dirs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _split(path):
+        dir_path, name = os.path.split(os.path.abspath(path))
+        return dir_path, os.path.normcase(dir_path), os.path.normcase(name)
+
+    def _names(self, dir_path, dir_key):
+        names = self._dirs.get(dir_key)
+        if names is None:
+            try:
+                with os.scandir(dir_path) as it:
+                    names = {os.path.normcase(entry.name) for entry in it}
+            except OSError:
+                names = set()
+            with self._lock:
+                names = self._dirs.setdefault(dir_key, names)
+        return names
+
+    def names(self, dir_path):
+        """目录中的文件名（规范化后的），目录不存在时为空"""
+        dir_path = os.path.abspath(dir_path)
+        return set(self._names(dir_path, os.path.normcase(dir_path)))
+
+    def forget(self, dir_path):
+        """丢弃目录的缓存，下次用到时重新读取；其他进程可能刚写入过该目录时使用"""
+        with self._lock:
+            self._dirs.pop(os.path.normcase(os.path.abspath(dir_path)), None)
+
+    def exists(self, path):
+        """路径在缓存的目录列表中时返回 True"""
+        dir_path, dir_key, name = self._split(path)
+        return name in self._names(dir_path, dir_key)
+
+    def add(self, path):
+        """记录自己创建的文件或目录"""
+        _, dir_key, name = self._split(path)
+        with self._lock:
+            names = self._dirs.get(dir_key)
+            if names is not None:
+                names.add(name)
+
+    def discard(self, path):
+        """记录自己删除或移走的文件"""
+        _, dir_key, name = self._split(path)
+        with self._lock:
+            names = self._dirs.get(dir_key)
+            if names is not None:
+                names.discard(name)
+
+
+def path_exists(path, dir_cache=None):
+    """判断路径是否存在，缓存中有时直接返回 True，否则实际检查一次"""
+    if dir_cache is None:
+        return os.path.exists(path)
+    if dir_cache.exists(path):
+        return True
+    if os.path.exists(path):
+        # 其他进程在缓存之后创建的
+        dir_cache.add(path)
+        return True
+    return False
+
+
+def files_identical(src, dst, src_stat=None, dir_cache=None):
+    """判断两个文件内容是否相同
+
+    先比较大小和修改时间（copy_file 会保留修改时间），都相同则认为一致；
+    大小相同但修改时间不同时，再流式计算哈希比较。
+
+    Args:
+        src: 源文件路径
+        dst: 目标文件路径
+        src_stat: 源文件的 os.stat 结果，已有时可传入避免重复 stat
+        dir_cache: 可选的 DirCache，缓存中没有目标文件时不再 stat
+
+    Returns:
+        目标文件存在且内容与源文件相同时返回 True
+    """
+    if dir_cache is not None and not dir_cache.exists(dst):
+        return False
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+    if src_stat is None:
+        src_stat = os.stat(src)
+
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+        return True
+    return cached_file_hash(src, src_stat) == cached_file_hash(dst, dst_stat)
+
+
+def _remove_existing(path, dir_cache=None):
+    # 目标文件是硬链接时直接写入会改动共用的内容，因此先删除
+    if dir_cache is None or dir_cache.exists(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _target_conflict(dst):
+    return FileExistsError(errno.EEXIST, "目标文件已存在且内容不同", dst)
+
+
+def copy_if_changed(src, dst, strategy="auto", dir_cache=None, overwrite=True):
+    """目标文件内容不同时才复制
+
+    Args:
+        src: 源文件路径
+        dst: 目标文件路径
+        strategy: 复制方式，见 copy_file
+        dir_cache: 可选的 DirCache，用于目标文件的存在检查，复制后会更新
+        overwrite: 为 False 时目标文件已存在且内容不同则抛出 FileExistsError，不覆盖
+
+    Returns:
+        (used, size): 实际使用的复制方式，跳过复制时为 None，以及文件字节数
+    """
+    src_stat = os.stat(src)
+    if files_identical(src, dst, src_stat, dir_cache):
+        return None, src_stat.st_size
+    if not overwrite and os.path.lexists(dst):
+        raise _target_conflict(dst)
+
+    # 如果目标文件已存在，先删除
+    _remove_existing(dst, dir_cache)
+    used = copy_file(src, dst, strategy, src_stat)
+    if dir_cache is not None:
+        dir_cache.add(dst)
+    return used, src_stat.st_size
+
+
+def _same_file(src, dst, src_stat):
+    """src 和 dst 是否是同一个目录项（路径相同、经符号链接或大小写不敏感的文件系统指向同一处）
+
+    互为硬链接的两个文件不算，删除其中一个不会丢失内容。
+    """
+    if os.path.normcase(os.path.realpath(src)) == os.path.normcase(os.path.realpath(dst)):
+        return True
+    if src_stat.st_nlink != 1:
+        return False
+    try:
+        return os.path.samestat(src_stat, os.stat(dst))
+    except OSError:
+        return False
+
+
+def move_if_changed(src, dst, strategy="auto", dir_cache=None, overwrite=True):
+    """把源文件移动到目标位置，完成后源文件不再存在
+
+    同一文件系统上用 os.replace 直接重命名，跨文件系统时退回到按 strategy 复制后删除。
+    目标文件内容已经相同时只删除源文件。dir_cache 和 overwrite 同 copy_if_changed。
+
+    Returns:
+        (moved, size): 是否实际移动（False 表示目标已相同，只删除了源文件），以及文件字节数
+    """
+    src_stat = os.stat(src)
+    if _same_file(src, dst, src_stat):
+        # 源文件已经在目标位置，不能删除
+        return False, src_stat.st_size
+    moved = not files_identical(src, dst, src_stat, dir_cache)
+    if moved and not overwrite and os.path.lexists(dst):
+        raise _target_conflict(dst)
+    if not moved:
+        os.remove(src)
+    else:
+        try:
+            os.replace(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            _remove_existing(dst, dir_cache)
+            copy_file(src, dst, strategy, src_stat)
+            os.remove(src)
+    if dir_cache is not None:
+        dir_cache.discard(src)
+        dir_cache.add(dst)
+    return moved, src_stat.st_size
+
+
+def _unsupported_error(name):
+    return OSError(errno.ENOTSUP, f"当前平台不支持 {name}")
+
+
+def _copy_reflink(src, dst, size):
+    if fcntl is None:
+        raise _unsupported_error("reflink")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def _copy_file_range(src, dst, size):
+    if not hasattr(os, "copy_file_range"):
+        raise _unsupported_error("copy_file_range")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        copied = 0
+        while copied < size:
+            n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+            if n == 0:
+                break
+            copied += n
+
+
+def _copy_sendfile(src, dst, size):
+    if not hasattr(os, "sendfile"):
+        raise _unsupported_error("sendfile")
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        copied = 0
+        while copied < size:
+            n = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)
+            if n == 0:
+                break
+            copied += n
+
+
+def _copy_hardlink(src, dst, size):
+    os.link(src, dst)
+
+
+def _copy_plain(src, dst, size):
+    shutil.copyfile(src, dst)
+
+
+_COPY_FUNCS = {
+    "reflink": _copy_reflink,
+    "copy_file_range": _copy_file_range,
+    "sendfile": _copy_sendfile,
+    "hardlink": _copy_hardlink,
+    "copy": _copy_plain,
+}
+
+
+def strategy_chain(strategy="auto"):
+    """返回按顺序尝试的复制方式
+
+    auto 从 reflink 开始。硬链接与源文件共用同一份内容，修改任何一个都会影响另一个，
+    因此只有明确指定 hardlink 时才使用。
+    """
+    if strategy == "auto":
+        strategy = COPY_STRATEGIES[0]
+    if strategy not in COPY_STRATEGIES:
+        raise ValueError(f"未知的复制方式: {strategy}")
+    chain = COPY_STRATEGIES[COPY_STRATEGIES.index(strategy):]
+    return tuple(name for name in chain if name != "hardlink" or strategy == "hardlink")
+
+
+def copy_file(src, dst, strategy="auto", src_stat=None):
+    """按复制方式复制文件，保留修改时间等元数据，目标文件不能已经存在
+
+    不支持的方式会自动退回到下一种，最后的普通复制出错时抛出异常。
+
+    Returns:
+        实际使用的复制方式名称
+    """
+    if src_stat is None:
+        src_stat = os.stat(src)
+    for name in strategy_chain(strategy):
+        key = (name, src_stat.st_dev)
+        if name != "copy" and key in _unsupported:
+            continue
+        try:
+            _COPY_FUNCS[name](src, dst, src_stat.st_size)
+        except OSError as e:
+            if name == "copy":
+                raise
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            if e.errno in _UNSUPPORTED_ERRNOS:
+                _unsupported.add(key)
+            continue
+        if name != "hardlink":
+            # 用已有的 stat 结果复制权限和时间，不再 stat 源文件
+            os.chmod(dst, stat.S_IMODE(src_stat.st_mode))
+            os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        return name
+
+
+def write_bytes_atomic(path, data):
+    """原子地写入文件
+
+    先写入同目录下的临时文件并同步到磁盘，再用 os.replace 替换原文件，
+    中途出错或崩溃时原文件保持不变。原文件的权限位会保留。
+    path 是符号链接时写入链接指向的文件，链接本身保持不变。
+
+    Returns:
+        写入的字节数
+    """
+    path = os.path.realpath(path)
+    dir_name, base_name = os.path.split(path)
+    # 临时文件以 . 开头、.tmp 结尾，不会被扫描器和监视模式当作笔记
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{base_name}.", suffix=".tmp", dir=dir_name)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return len(data)
+
+
+def write_text_atomic(path, text, encoding='utf-8', newline='\n'):
+    """原子地写入文本文件，见 write_bytes_atomic
+
+    text 中的 \n 按 newline 写出，与平台无关。
+
+    Returns:
+        写入的字节数
+    """
+    if newline != '\n':
+        text = text.replace('\n', newline)
+    # 先编码，无法用原编码表示的内容在创建临时文件之前就报错
+    return write_bytes_atomic(path, text.encode(encoding))
@@ -0,0 +1,130 @@
+"""从 git 索引列出需要处理的笔记
+
+文档仓库中每次提交只改动少数笔记。git 模式不遍历目录，而是向 git 询问候选笔记：
+    - 默认：git ls-files 列出已跟踪的笔记和未被忽略的新笔记
+    - base：与基准提交相比改动过的笔记（git diff --name-only <base>），加上未跟踪的新笔记
+    - staged：暂存区中改动过的笔记（git diff --cached），适合在 pre-commit 钩子中使用
+只保留仍然存在的 .md 文件，并与扫描器一样跳过隐藏目录、依赖目录和图片目录；
+.gitignore 中的规则由 git 处理。
+"""
+import os
+import subprocess
+
+from scanner import DEFAULT_IGNORED_DIRS
+
+
+class GitError(Exception):
+    """git 命令执行失败，或路径不在 git 仓库中"""
+
+
+def _git(cwd, *args):
+    """运行 git 命令，返回以 NUL 分隔的输出中的各项"""
+    try:
+        proc = subprocess.run(["git", *args], cwd=cwd, capture_output=True, check=True)
+    except FileNotFoundError:
+        raise GitError("找不到 git 命令")
+    except subprocess.CalledProcessError as e:
+        raise GitError(e.stderr.decode(errors="replace").strip() or str(e))
+    return [os.fsdecode(item) for item in proc.stdout.split(b"\0") if item]
+
+
+def repo_root(path):
+    """返回 path 所在 git 仓库的根目录"""
+    cwd = path if os.path.isdir(path) else os.path.dirname(os.path.abspath(path))
+    root = _git(cwd, "rev-parse", "--show-toplevel")
+    if not root:
+        raise GitError(f"不在 git 仓库中: {path}")
+    return os.path.normpath(root[0].rstrip("\n"))
+
+
+def _wanted(rel_path, img_dir_name):
+    parts = rel_path.split("/")
+    if not parts[-1].endswith(".md"):
+        return False
+    return not any(part.startswith(".") or part == img_dir_name or part in DEFAULT_IGNORED_DIRS
+                   for part in parts[:-1])
+
+
+def list_notes(path, img_dir_name="img", base=None, staged=False):
+    """列出 path（文件或目录）下需要处理的笔记
+
+    Args:
+        path: 仓库中的文件或目录
+        img_dir_name: 图片保存目录名称，其中的文件不是笔记
+        base: 基准提交（如 origin/main、HEAD~1），只列出与它相比改动过的笔记和未跟踪的新笔记
+        staged: 只列出暂存区中改动过的笔记，优先于 base
+
+    Returns:
+        笔记绝对路径的列表（不重复，按 git 输出的顺序）
+    """
+    root = repo_root(path)
+    spec = os.path.relpath(os.path.abspath(path), root)
+    if staged:
+        names = _git(root, "diff", "--cached", "--name-only", "--diff-filter=ACMR", "-z",
+                     "--", spec)
+    elif base is not None:
+        names = _git(root, "diff", "--name-only", "--diff-filter=ACMR", "-z", base, "--", spec)
+        names += _git(root, "ls-files", "--others", "--exclude-standard", "-z", "--", spec)
+    else:
+        names = _git(root, "ls-files", "--cached", "--others", "--exclude-standard", "-z",
+                     "--", spec)
+
+    notes = {}
+    for name in names:
+        if not _wanted(name, img_dir_name):
+            continue
+        note = os.path.normpath(os.path.join(root, name))
+        if note not in notes and os.path.isfile(note):
+            notes[note] = None
+    return list(notes)
+
+
+def worktree_changes(path):
+    """列出 path 下工作区中相对暂存区有改动的文件（修改、删除）和未跟踪的文件
+
+    pre-commit 钩子在处理前后各调用一次：处理前就有改动的文件含有用户没有暂存的修改，
+    不能整个加入暂存区；处理后才出现的是本次运行写入或删除的文件。
+
+    Returns:
+        文件绝对路径的集合
+    """
+    root = repo_root(path)
+    spec = os.path.relpath(os.path.abspath(path), root)
+    entries = _git(root, "status", "--porcelain", "--untracked-files=all", "-z", "--", spec)
+    changed = set()
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        status, name = entry[:2], entry[3:]
+        # 暂存区中的重命名和复制后面跟着原路径
+        if status[0] in "RC":
+            i += 1
+        i += 1
+        if status == "??" or status[1] != " ":
+            changed.add(os.path.normpath(os.path.join(root, name)))
+    return changed
+
+
+def _existing_dir(path):
+    """path 所在的最近一个存在的目录（文件被删除后，所在目录也可能已被删除）"""
+    parent = os.path.dirname(path)
+    while not os.path.isdir(parent) and os.path.dirname(parent) != parent:
+        parent = os.path.dirname(parent)
+    return parent
+
+
+def stage(paths):
+    """把处理时写入或删除的文件加入暂存区，pre-commit 钩子改写笔记后使用
+
+    按所在仓库分别执行 git add；已删除的已跟踪文件会作为删除加入暂存区。
+    """
+    roots = {}      # 所在目录 -> 仓库根目录
+    by_root = {}
+    for p in paths:
+        p = os.path.abspath(p)
+        parent = _existing_dir(p)
+        if parent not in roots:
+            roots[parent] = repo_root(parent)
+        by_root.setdefault(roots[parent], []).append(p)
+    for root, repo_paths in by_root.items():
+        _git(root, "add", "--", *repo_paths)
@@ -1,6 +1,7 @@
 import sys
 import os
 import ctypes
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
 from ui_main import MainWindow
@@ -27,6 +28,9 @@ def resource_path(relative_path):
     return os.path.join(base_path, relative_path)
 
 if __name__ == "__main__":
+    # 打包后的程序使用进程池时需要
+    multiprocessing.freeze_support()
+
     # 尝试刷新图标缓存
     refresh_icon_cache()
     
@@ -0,0 +1,228 @@
+"""Markdown图片引用解析
+
+一次线性扫描找出文档中的图片引用：
+    - 行内图片 ![描述](路径 "标题")，路径可以用 <> 包围（可含空格），描述可以为空
+    - 引用式图片 ![描述][标签]、![描述][]、![描述]，路径来自 [标签]: 路径 定义，定义可以在后面
+    - HTML 标签 <img src="路径" alt="描述">
+跳过围栏代码块（``` 或 ~~~）和行内代码中的内容，以及反斜杠转义的字符。
+缩进代码块与列表项中的缩进内容难以区分，不做特殊处理。
+
+为兼容旧版本写出的链接，行内图片的路径不符合 CommonMark 时（例如含有未转义的空格），
+退回到括号内的全部内容。
+"""
+import re
+from functools import lru_cache
+from collections import namedtuple
+
+# 一处图片引用
+# alt: 描述；path: 路径（不含 <>）；start/end: 路径在文本中的位置，改写时只替换这一段；
+# kind: inline / reference / html；bracketed: 路径是否被 <> 包围
+# 引用式图片的位置是定义中路径的位置，共用同一定义的图片位置相同
+ImageRef = namedtuple("ImageRef", ["alt", "path", "start", "end", "kind", "bracketed"])
+
+# 需要逐个处理的字符，其余文本用正则一次跳过；只有可能是围栏或定义的行首才需要处理
+_SPECIAL = re.compile(r'!\[|<(?i:img)\b|[`\\]|\n(?= {0,3}[`~\[])')
+_FENCE_OPEN = re.compile(r' {0,3}(`{3,}|~{3,})([^\n]*)')
+_DEFINITION = re.compile(
+    r' {0,3}\[((?:[^\]\\\n]|\\.)+)\]:[ \t]*(?:<([^>\n]*)>|(\S+))'
+    r'(?:[ \t]+(?:"[^"\n]*"|\'[^\'\n]*\'|\([^)\n]*\)))?[ \t]*(?=\n|$)')
+_ALT = re.compile(r'!\[((?:[^\]\\\n]|\\.)*)\]')
+_INLINE_DEST = re.compile(
+    r'\([ \t]*(?:<([^>\n]*)>|((?:[^()\s\\]|\\.|\((?:[^()\s\\]|\\.)*\))+))'
+    r'(?:[ \t]+(?:"[^"\n]*"|\'[^\'\n]*\'|\([^)\n]*\)))?[ \t]*\)')
+_LENIENT_DEST = re.compile(r'\(([^)\n]+)\)')
+_LENIENT_TITLE = re.compile(r'[ \t]+(?:"[^"\n]*"|\'[^\'\n]*\')[ \t]*$')
+_LABEL = re.compile(r'\[((?:[^\]\\\n]|\\.)*)\]')
+_IMG_TAG = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_ATTR = re.compile(r'([A-Za-z_:][-\w:.]*)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`]+))')
+_BACKTICKS = re.compile(r'`+')
+_BLANK_LINE = re.compile(r'\n[ \t]*\n')
+_NEEDS_BRACKETS = re.compile(r'[\s<>]')
+
+
+@lru_cache(maxsize=32)
+def _fence_close(char, length):
+    return re.compile(rf'^ {{0,3}}{re.escape(char)}{{{length},}}[ \t]*$', re.M)
+
+
+def _normalize_label(label):
+    return " ".join(label.split()).casefold()
+
+
+def parse_images(text):
+    """按出现顺序返回文本中的图片引用（ImageRef 列表）
+
+    找不到定义的引用式图片忽略。
+    """
+    n = len(text)
+    refs = []
+    pending = []        # (在 refs 中的位置, 描述, 标签)，文档结束后再查找定义
+    definitions = {}    # 规范化的标签 -> (路径, start, end, bracketed)，先出现的定义有效
+    no_alt_until = -1   # 在此位置之前（本行剩余部分）没有能闭合描述的 ]
+    para_end = -1       # 当前段落的结束位置，行内代码不跨段落
+    no_closer = {}      # 反引号数 -> 该段落中此后没有同样长度的反引号串的段落结束位置
+    pos = 0
+    line_start = True
+
+    while pos < n:
+        if line_start:
+            line_start = False
+            m = _FENCE_OPEN.match(text, pos)
+            if m and not (m.group(1)[0] == '`' and '`' in m.group(2)):
+                fence = m.group(1)
+                close = _fence_close(fence[0], len(fence)).search(text, m.end())
+                pos = n if close is None else close.end()
+                continue
+            m = _DEFINITION.match(text, pos)
+            if m:
+                label = _normalize_label(m.group(1))
+                group = 2 if m.group(2) is not None else 3
+                if label not in definitions:
+                    definitions[label] = (m.group(group), m.start(group), m.end(group),
+                                          group == 2)
+                pos = m.end()
+                continue
+
+        m = _SPECIAL.search(text, pos)
+        if m is None:
+            break
+        pos = m.start()
+        ch = text[pos]
+
+        if ch == '\n':
+            pos += 1
+            line_start = True
+        elif ch == '\\':
+            # 转义的字符按普通文本处理；行尾的反斜杠是硬换行
+            pos += 1 if text.startswith('\n', pos + 1) else 2
+        elif ch == '`':
+            run = _BACKTICKS.match(text, pos)
+            length = len(run.group())
+            pos = run.end()
+            if pos > para_end:
+                blank = _BLANK_LINE.search(text, pos)
+                para_end = n if blank is None else blank.start()
+            if no_closer.get(length) == para_end:
+                continue
+            for closer in _BACKTICKS.finditer(text, pos, para_end):
+                if len(closer.group()) == length:
+                    # 跳过行内代码，中间的换行不是行首
+                    pos = closer.end()
+                    break
+            else:
+                no_closer[length] = para_end
+        elif ch == '<':
+            m = _IMG_TAG.match(text, pos)
+            if m is None:
+                pos += 1
+                continue
+            attrs = {}
+            for attr in _ATTR.finditer(text, m.start() + 4, m.end() - 1):
+                group = next(g for g in (2, 3, 4) if attr.group(g) is not None)
+                attrs.setdefault(attr.group(1).lower(), (attr.group(group), attr.span(group)))
+            if "src" in attrs:
+                src, (start, end) = attrs["src"]
+                alt = attrs.get("alt", ("",))[0]
+                refs.append(ImageRef(alt, src, start, end, "html", False))
+            pos = m.end()
+        else:  # '!['
+            if pos < no_alt_until:
+                pos += 2
+                continue
+            m = _ALT.match(text, pos)
+            if m is None:
+                # 本行剩余部分没有闭合的 ]，之后的 ![ 也不必再试
+                line_end = text.find('\n', pos)
+                no_alt_until = n if line_end < 0 else line_end
+                pos += 2
+                continue
+            alt = m.group(1)
+            pos = m.end()
+            if text.startswith('(', pos):
+                ref, end = _inline_image(text, pos, alt)
+                if ref is not None:
+                    refs.append(ref)
+                    pos = end
+            else:
+                # ![描述][标签]；标签为空或省略时用描述作为标签
+                label = _LABEL.match(text, pos)
+                if label is not None:
+                    pos = label.end()
+                label = label.group(1) if label is not None and label.group(1) else alt
+                pending.append((len(refs), alt, label))
+                refs.append(None)
+
+    for i, alt, label in pending:
+        definition = definitions.get(_normalize_label(label))
+        if definition is not None:
+            path, start, end, bracketed = definition
+            refs[i] = ImageRef(alt, path, start, end, "reference", bracketed)
+    return [ref for ref in refs if ref is not None]
+
+
+def _inline_image(text, pos, alt):
+    """解析 pos 处 ( 开始的行内路径，返回 (ImageRef, 结束位置)，不是路径时返回 (None, pos)"""
+    m = _INLINE_DEST.match(text, pos)
+    if m is not None:
+        group = 1 if m.group(1) is not None else 2
+        return (ImageRef(alt, m.group(group), m.start(group), m.end(group), "inline", group == 1),
+                m.end())
+
+    # 兼容旧版本写出的含空格路径：括号内的全部内容，去掉末尾的标题
+    m = _LENIENT_DEST.match(text, pos)
+    if m is None:
+        return None, pos
+    inner = m.group(1)
+    title = _LENIENT_TITLE.search(inner)
+    if title is not None:
+        inner = inner[:title.start()]
+    path = inner.strip()
+    if not path:
+        return None, pos
+    start = m.start(1) + len(inner) - len(inner.lstrip())
+    return ImageRef(alt, path, start, start + len(path), "inline", False), m.end()
+
+
+def is_remote(path):
+    """图片路径是否是 http/https 地址"""
+    return path.startswith(("http://", "https://"))
+
+
+def _needs_brackets(path):
+    return _NEEDS_BRACKETS.search(path) is not None or path.count('(') != path.count(')')
+
+
+def replace_paths(text, refs, new_path_for):
+    """改写图片路径
+
+    Args:
+        text: parse_images 解析的文本
+        refs: parse_images(text) 的结果
+        new_path_for: 函数，参数为 ImageRef，返回新路径，返回 None 时保持不变
+
+    Returns:
+        改写后的文本。引用式图片改写的是定义中的路径，同一定义只改写一次；
+        Markdown 中含空格或不成对括号的新路径用 <> 包围。
+    """
+    edits = {}
+    for ref in refs:
+        if ref.start in edits:
+            continue
+        new_path = new_path_for(ref)
+        if new_path is None or new_path == ref.path:
+            continue
+        if ref.kind != "html" and not ref.bracketed and _needs_brackets(new_path):
+            new_path = f"<{new_path}>"
+        edits[ref.start] = (ref.end, new_path)
+    if not edits:
+        return text
+
+    parts = []
+    last = 0
+    for start in sorted(edits):
+        end, new_path = edits[start]
+        parts.append(text[last:start])
+        parts.append(new_path)
+        last = end
+    parts.append(text[last:])
+    return "".join(parts)
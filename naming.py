@@ -0,0 +1,112 @@
+"""图片目录的文件名分配
+
+同一目录下的笔记共用一个图片目录。按描述生成的文件名已经被占用时，不能覆盖
+其他笔记的图片，只能换一个名称（名称_1、名称_2 ……）。
+"""
+import os
+import threading
+
+import file_ops
+
+# 名称尚未被占用
+_FREE = object()
+
+
+class NameIndex:
+    """一个图片目录的文件名索引，为图片分配不重复的文件名
+
+    用目录中已有的文件初始化：已有文件的名称只会分配给内容相同的图片，
+    本次分配过的名称只会再分配给同一个源文件。每个名称记录下一个要尝试的序号，
+    同一描述重复很多次时每次分配仍是 O(1)。多个线程可以共用同一个索引。
+    """
+
+    def __init__(self, folder, existing=None):
+        """
+        Args:
+            folder: 图片目录
+            existing: 目录中已有的文件名，为 None 时读取目录
+        """
+        self.folder = folder
+        # 规范化的文件名 -> 本次分配给的源文件，目录中已有的文件为 None
+        self._owners = {}
+        # 规范化的首选文件名 -> 下一个尝试的序号
+        self._next = {}
+        # (规范化的首选文件名, 规范化的源文件) -> 已分配的 (文件名, 序号)
+        self._claimed = {}
+        self._lock = threading.Lock()
+        if existing is None:
+            try:
+                with os.scandir(folder) as it:
+                    existing = [entry.name for entry in it]
+            except OSError:
+                existing = []
+        for name in existing:
+            self._owners[os.path.normcase(name)] = None
+
+    def _take(self, name, source):
+        key = os.path.normcase(name)
+        owner = self._owners.get(key, _FREE)
+        path = os.path.join(self.folder, name)
+        # 源文件本身就在这个位置（例如索引被再次使用时，上次复制的结果已被笔记引用）
+        if os.path.normcase(os.path.abspath(path)) == os.path.normcase(source):
+            self._owners[key] = source
+            return True
+        if owner is _FREE:
+            self._owners[key] = source
+            return True
+        if owner is not None:
+            return os.path.normcase(owner) == os.path.normcase(source)
+        # 目录中已有的文件：内容相同时可以直接使用
+        if file_ops.files_identical(source, path):
+            self._owners[key] = source
+            return True
+        return False
+
+    def _own_count(self, base, ext, source):
+        """源文件在本目录中且名称为 base_序号 + ext 时返回序号，否则返回 None"""
+        folder, name = os.path.split(source)
+        if os.path.normcase(folder) != os.path.normcase(os.path.abspath(self.folder)):
+            return None
+        prefix, suffix = os.path.normcase(f"{base}_"), os.path.normcase(ext)
+        name = os.path.normcase(name)
+        if not (name.startswith(prefix) and name.endswith(suffix)):
+            return None
+        count = name[len(prefix):len(name) - len(suffix)]
+        if not (count.isdigit() and count[0] != "0"):
+            return None
+        return int(count)
+
+    def claim(self, base, ext, source):
+        """为源文件分配文件名
+
+        Args:
+            base: 首选的文件名（不含扩展名）
+            ext: 扩展名
+            source: 源文件的绝对路径
+
+        Returns:
+            (文件名, 序号)：首选名称可用时序号为 0，否则文件名为 base_序号 + ext
+        """
+        with self._lock:
+            name = f"{base}{ext}"
+            key = os.path.normcase(name)
+            claimed_key = (key, os.path.normcase(source))
+            if claimed_key in self._claimed:
+                return self._claimed[claimed_key]
+            if self._take(name, source):
+                result = (name, 0)
+            else:
+                own = self._own_count(base, ext, source)
+                if own is not None:
+                    # 源文件已经在图片目录中，名称是带序号的首选名称，保持不变
+                    own_name = os.path.basename(source)
+                    self._owners[os.path.normcase(own_name)] = source
+                    result = (own_name, own)
+                else:
+                    count = self._next.get(key, 1)
+                    while not self._take(f"{base}_{count}{ext}", source):
+                        count += 1
+                    self._next[key] = count + 1
+                    result = (f"{base}_{count}{ext}", count)
+            self._claimed[claimed_key] = result
+            return result
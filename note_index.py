@@ -0,0 +1,150 @@
+"""增量索引：记录已处理的Markdown文件，再次运行时跳过未改动的文件
+
+索引保存在笔记库根目录下的 SQLite 文件中，按文件路径记录：
+    - 笔记的修改时间、大小和内容哈希
+    - 笔记引用的每个图片的修改时间和大小
+    - 没有下载的远程图片数：这样的笔记在启用下载远程图片后需要重新处理
+
+笔记和它引用的图片都没有变化时，只需若干次 stat 即可判定跳过。
+图片只按 stat 比较，不计算哈希，避免首次运行时把所有图片再读一遍。
+"""
+import os
+import sqlite3
+
+import file_ops
+
+# 索引文件名，保存在笔记库根目录
+INDEX_FILENAME = ".md_rename_index.sqlite"
+
+# 图片不存在时记录的 (修改时间, 大小)
+MISSING = (-1, -1)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    hash     TEXT NOT NULL,
+    img_dir  TEXT NOT NULL,
+    remote   INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS note_images (
+    note_path  TEXT NOT NULL,
+    image_path TEXT NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    size       INTEGER NOT NULL,
+    PRIMARY KEY (note_path, image_path)
+);
+"""
+
+
+def default_index_path(root):
+    """返回笔记库根目录下的索引文件路径"""
+    return os.path.join(root, INDEX_FILENAME)
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return MISSING
+    return st.st_mtime_ns, st.st_size
+
+
+class NoteIndex:
+    """笔记增量索引
+
+    用法:
+        with NoteIndex(path) as index:
+            if not index.is_unchanged(md_path, "img"):
+                ...
+                index.record(md_path, "img", image_paths)
+
+    退出 with 块时提交事务。多个进程可以同时打开同一个索引文件。
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        # 旧版本的索引没有 remote 列
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(notes)")}
+        if "remote" not in columns:
+            self.conn.execute("ALTER TABLE notes ADD COLUMN remote INTEGER NOT NULL DEFAULT 0")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def is_unchanged(self, md_path, img_dir_name, fetch_remote=False):
+        """判断笔记及其引用的图片自上次记录后是否都没有变化
+
+        修改时间变了但大小相同的笔记（例如只是被 touch），再比较内容哈希。
+        启用下载远程图片（fetch_remote）时，上次留有未下载远程图片的笔记视为有变化。
+        """
+        key = _key(md_path)
+        row = self.conn.execute(
+            "SELECT mtime_ns, size, hash, img_dir, remote FROM notes WHERE path = ?", (key,)
+        ).fetchone()
+        if row is None or row[3] != img_dir_name or (fetch_remote and row[4]):
+            return False
+
+        mtime_ns, size = _stat_key(md_path)
+        if (mtime_ns, size) != (row[0], row[1]):
+            if size != row[1] or file_ops.file_hash(md_path) != row[2]:
+                return False
+            self.conn.execute(
+                "UPDATE notes SET mtime_ns = ? WHERE path = ?", (mtime_ns, key)
+            )
+
+        for image_path, img_mtime_ns, img_size in self.conn.execute(
+            "SELECT image_path, mtime_ns, size FROM note_images WHERE note_path = ?", (key,)
+        ):
+            if _stat_key(image_path) != (img_mtime_ns, img_size):
+                return False
+        return True
+
+    def record(self, md_path, img_dir_name, image_paths, remote=0):
+        """记录处理后的笔记及其引用的图片
+
+        Args:
+            md_path: Markdown文件路径
+            img_dir_name: 本次使用的图片目录名称
+            image_paths: 笔记中引用的本地图片绝对路径（可包含不存在的图片）
+            remote: 没有下载的远程图片数
+        """
+        key = _key(md_path)
+        mtime_ns, size = _stat_key(md_path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO notes (path, mtime_ns, size, hash, img_dir, remote) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, mtime_ns, size, file_ops.file_hash(md_path), img_dir_name, remote),
+        )
+        self.conn.execute("DELETE FROM note_images WHERE note_path = ?", (key,))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO note_images (note_path, image_path, mtime_ns, size) "
+            "VALUES (?, ?, ?, ?)",
+            [(key, p) + _stat_key(p) for p in set(image_paths)],
+        )
+
+    def forget(self, md_path):
+        """删除笔记的记录，下次运行时重新处理"""
+        key = _key(md_path)
+        self.conn.execute("DELETE FROM notes WHERE path = ?", (key,))
+        self.conn.execute("DELETE FROM note_images WHERE note_path = ?", (key,))
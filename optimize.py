@@ -0,0 +1,316 @@
+"""重命名之后压缩或转换图片目录中的图片
+
+笔记库中的截图大多是未经压缩的 PNG，重命名时原样复制。本阶段在重命名之后处理图片目录
+中被笔记引用的图片：
+    - png:  无损重新压缩 PNG，扩展名不变
+    - webp: 转换为 WebP（quality 为 100 时无损），改写笔记中的链接并删除原文件
+
+编码在进程池中并行进行。结果按源文件内容的哈希缓存在笔记库根目录的 .md_rename_optimize 中，
+同样内容的图片只编码一次，再次运行时无需重新编码；压缩后没有变小的图片保持不变。
+改写链接的范围是给出的笔记，其他笔记中对原文件的引用不会更新，因此转换格式时应该对整个
+笔记库运行。
+
+依赖 Pillow（pip install pillow），未安装时 HAVE_PIL 为 False。
+"""
+import io
+import os
+import importlib.util
+import time
+import sqlite3
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import core_logic
+import dedup
+import events
+import file_ops
+import md_images
+
+# 只检查是否安装，真正用到时才导入，命令行启动时不加载 Pillow
+HAVE_PIL = importlib.util.find_spec("PIL") is not None
+
+# 缓存目录名，保存在笔记库根目录；以 . 开头，扫描器不会进入
+STORE_DIRNAME = ".md_rename_optimize"
+# 缓存数据库文件名，保存在缓存目录中
+CACHE_FILENAME = "cache.sqlite"
+
+# 输出格式 -> (输出扩展名, 处理的源图片扩展名)
+FORMATS = {
+    "png": (".png", frozenset({".png"})),
+    "webp": (".webp", frozenset({".png", ".jpg", ".jpeg", ".bmp"})),
+}
+# WebP 的默认质量
+DEFAULT_QUALITY = 80
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS optimized (
+    hash    TEXT NOT NULL,
+    params  TEXT NOT NULL,
+    result  TEXT,
+    PRIMARY KEY (hash, params)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path      TEXT PRIMARY KEY,
+    mtime_ns  INTEGER NOT NULL,
+    size      INTEGER NOT NULL,
+    hash      TEXT NOT NULL
+);
+"""
+
+
+def default_store_dir(root):
+    """返回笔记库根目录下的缓存目录"""
+    return os.path.join(root, STORE_DIRNAME)
+
+
+def _encode(path, fmt, quality):
+    """按格式重新编码图片，返回编码后的内容
+
+    需要定义在模块顶层，以便进程池序列化。
+    """
+    from PIL import Image
+    with Image.open(path) as img:
+        buf = io.BytesIO()
+        if fmt == "png":
+            img.save(buf, "PNG", optimize=True)
+        else:
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode
+                                  else "RGB")
+            img.save(buf, "WEBP", quality=quality, lossless=quality >= 100, method=6)
+    return buf.getvalue()
+
+
+class OptimizeCache:
+    """编码结果缓存：(源内容哈希, 参数) -> 结果内容哈希，结果按 哈希+扩展名 保存在缓存目录中
+
+    结果为 NULL 表示编码后没有变小或无法解码，保持原图片；编码结果本身也记录为无需再处理。
+    另外记录 (图片路径, 修改时间, 大小) -> 内容哈希，再次运行时未改动的图片不需要重新读取。
+    只在创建它的线程中使用。
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(store_dir, CACHE_FILENAME), timeout=30)
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def path(self, digest, ext):
+        return os.path.join(self.store_dir, f"{digest}{ext}")
+
+    def file_hash(self, path):
+        """图片的内容哈希，修改时间和大小与记录相同时直接使用记录的值"""
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT hash FROM file_hashes WHERE path = ? AND mtime_ns = ? AND size = ?",
+            (path, st.st_mtime_ns, st.st_size)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        digest = file_ops.cached_file_hash(path, st)
+        self.remember(path, digest, st)
+        return digest
+
+    def remember(self, path, digest, st=None):
+        """记录图片的内容哈希，写入图片后调用"""
+        if st is None:
+            st = os.stat(path)
+        self.conn.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                          (path, st.st_mtime_ns, st.st_size, digest))
+
+    def get(self, digest, params):
+        """返回 (是否有记录, 结果哈希)"""
+        row = self.conn.execute(
+            "SELECT result FROM optimized WHERE hash = ? AND params = ?", (digest, params)
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, row[0]
+
+    def put(self, digest, params, data=None, ext=None):
+        """记录编码结果，data 为 None 表示没有变小；返回结果哈希"""
+        result = None
+        if data is not None:
+            result = file_ops.bytes_hash(data)
+            path = self.path(result, ext)
+            if not os.path.isfile(path):
+                file_ops.write_bytes_atomic(path, data)
+            self.conn.execute("INSERT OR REPLACE INTO optimized VALUES (?, ?, NULL)",
+                              (result, params))
+        self.conn.execute("INSERT OR REPLACE INTO optimized VALUES (?, ?, ?)",
+                          (digest, params, result))
+        return result
+
+
+def find_images(md_files, img_dir_name="img", fmt="png"):
+    """找出图片目录中被笔记引用、可以处理的图片
+
+    Returns:
+        {图片绝对路径: {引用它的笔记路径, ...}}
+    """
+    sources = FORMATS[fmt][1]
+    return {
+        image_path: notes
+        for image_path, notes in dedup.build_reverse_index(md_files).items()
+        if os.path.basename(os.path.dirname(image_path)) == img_dir_name
+        and os.path.splitext(image_path)[1].lower() in sources
+    }
+
+
+def _rewrite_extension(md_file, renamed):
+    """把笔记中指向 renamed 中图片的链接改为新扩展名，返回是否改写"""
+    note_dir = os.path.dirname(md_file)
+
+    def _new_path(ref):
+        new_ext = renamed.get(os.path.abspath(os.path.join(note_dir, os.path.normpath(ref.path))))
+        if new_ext is None:
+            return None
+        return os.path.splitext(ref.path)[0] + new_ext
+
+    content, encoding, newline = core_logic.read_md_text(md_file)
+    new_content = md_images.replace_paths(content, md_images.parse_images(content), _new_path)
+    if new_content == content:
+        return False
+    file_ops.write_text_atomic(md_file, new_content, encoding, newline)
+    return True
+
+
+def optimize_images(md_files, img_dir_name="img", store_dir=None, fmt="png",
+                    quality=DEFAULT_QUALITY, workers=None, stats=None):
+    """压缩或转换笔记引用的图片
+
+    Args:
+        md_files: Markdown文件路径的可迭代对象
+        img_dir_name: 图片保存目录名称，只处理图片目录中的图片
+        store_dir: 缓存目录，见 default_store_dir
+        fmt: 输出格式，FORMATS 中的键
+        quality: WebP 的质量（1-100），100 为无损
+        workers: 并行编码的进程数，默认为CPU核数；为 1 时在当前进程中编码
+        stats: 可选的 Counter，累加 optimized/optimize_cached/optimize_failed/
+            optimize_conflicts/optimized_bytes_saved/optimize_notes_written/time_optimize
+
+    Returns:
+        stats
+    """
+    if stats is None:
+        stats = Counter()
+    if not HAVE_PIL:
+        raise RuntimeError("压缩图片需要安装 Pillow")
+    t0 = time.perf_counter()
+    out_ext = FORMATS[fmt][0]
+    params = f"{fmt}:{quality}" if fmt == "webp" else fmt
+    images = find_images(md_files, img_dir_name, fmt)
+
+    with OptimizeCache(store_dir) as cache:
+        # 按内容分组，同样内容的图片只编码一次
+        by_hash = {}
+        for image_path in images:
+            try:
+                digest = cache.file_hash(image_path)
+            except OSError:
+                continue
+            by_hash.setdefault(digest, []).append(image_path)
+
+        results = {}
+        todo = []
+        for digest, paths in by_hash.items():
+            found, result = cache.get(digest, params)
+            if found and (result is None or os.path.isfile(cache.path(result, out_ext))):
+                results[digest] = result
+                stats["optimize_cached"] += len(paths)
+            else:
+                todo.append(digest)
+
+        if todo:
+            sources = [by_hash[digest][0] for digest in todo]
+            if workers == 1:
+                encoded = map(_try_encode, sources, [fmt] * len(todo), [quality] * len(todo))
+                _store_results(cache, params, out_ext, todo, by_hash, encoded, results, stats)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    encoded = executor.map(_try_encode, sources, [fmt] * len(todo),
+                                           [quality] * len(todo))
+                    _store_results(cache, params, out_ext, todo, by_hash, encoded, results,
+                                   stats)
+
+        # 用编码结果替换图片，扩展名变化的记下来改写链接
+        renamed = {}
+        for digest, result in results.items():
+            if result is None:
+                continue
+            result_path = cache.path(result, out_ext)
+            for image_path in by_hash[digest]:
+                target = os.path.splitext(image_path)[0] + out_ext
+                if (target != image_path and os.path.exists(target)
+                        and not file_ops.files_identical(result_path, target)):
+                    events.emit(events.WARNING, "⚠️ 目标图片已存在且内容不同，跳过: {}", target)
+                    stats["optimize_conflicts"] += 1
+                    continue
+                try:
+                    old_size = os.path.getsize(image_path)
+                    with open(result_path, "rb") as f:
+                        new_size = file_ops.write_bytes_atomic(target, f.read())
+                    cache.remember(target, result)
+                except OSError as e:
+                    events.emit(events.ERROR, "保存压缩后的图片时出错 {}: {}", target, e)
+                    stats["optimize_failed"] += 1
+                    continue
+                stats["optimized"] += 1
+                stats["optimized_bytes_saved"] += old_size - new_size
+                events.emit(events.INFO, "已压缩: {} -> {} ({} -> {} 字节)",
+                            os.path.basename(image_path), os.path.basename(target),
+                            old_size, new_size)
+                if target != image_path:
+                    renamed[image_path] = out_ext
+
+    # 改写链接，引用原文件的笔记都改写成功后才删除原文件
+    failed_notes = set()
+    for md_file in {n for image_path in renamed for n in images[image_path]}:
+        try:
+            if _rewrite_extension(md_file, renamed):
+                stats["optimize_notes_written"] += 1
+        except Exception as e:
+            events.emit(events.ERROR, "改写引用时出错 {}: {}", md_file, e)
+            failed_notes.add(md_file)
+    for image_path in renamed:
+        if images[image_path] & failed_notes:
+            continue
+        try:
+            os.remove(image_path)
+        except OSError as e:
+            events.emit(events.ERROR, "删除原图片时出错 {}: {}", image_path, e)
+
+    stats["time_optimize"] += time.perf_counter() - t0
+    return stats
+
+
+def _try_encode(path, fmt, quality):
+    """_encode 出错时返回异常而不是抛出，一个图片损坏不影响其他图片"""
+    try:
+        return _encode(path, fmt, quality)
+    except Exception as e:
+        return e
+
+
+def _store_results(cache, params, out_ext, todo, by_hash, encoded, results, stats):
+    for digest, data in zip(todo, encoded):
+        source = by_hash[digest][0]
+        if isinstance(data, Exception):
+            # 无法解码的图片同样记入缓存，下次不再尝试
+            events.emit(events.ERROR, "压缩图片时出错 {}: {}", source, data)
+            stats["optimize_failed"] += len(by_hash[digest])
+            data = None
+        elif len(data) >= os.path.getsize(source):
+            # 没有变小时保持原图片
+            data = None
+        results[digest] = cache.put(digest, params, data, out_ext)
@@ -0,0 +1,95 @@
+"""清理不再被任何笔记引用的图片
+
+复制模式下原图片一直保留在笔记旁边，图片目录中也会留下改名前的旧文件。
+清理范围是给出的笔记所在的目录及其图片目录，引用关系来自这些目录中的所有笔记，
+其他目录的笔记通过相对路径引用的图片不在考虑之内，因此应该对整个笔记库运行。
+"""
+import os
+from collections import Counter
+from urllib.parse import unquote
+
+import core_logic
+import events
+import md_images
+
+# 视为图片的扩展名
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".svg"})
+
+
+def _list_dir(dir_path):
+    try:
+        with os.scandir(dir_path) as it:
+            return [entry for entry in it if entry.is_file()]
+    except OSError:
+        return []
+
+
+def plan_orphans(md_files, img_dir_name="img"):
+    """找出不被任何笔记引用的图片，只读取文件
+
+    同一目录中有笔记无法读取时，不知道它引用了哪些图片，该目录整个跳过。
+
+    Returns:
+        可序列化为JSON的字典:
+            orphans: [{"path": 图片路径, "bytes": 字节数}]
+            skipped_dirs: 因笔记无法读取而跳过的目录
+    """
+    dirs = {os.path.dirname(os.path.abspath(md_file)) for md_file in md_files}
+
+    referenced = set()
+    unreadable = set()
+    for dir_path in dirs:
+        for entry in _list_dir(dir_path):
+            if not entry.name.endswith(".md"):
+                continue
+            try:
+                content, _ = core_logic.read_md_file(entry.path)
+            except (OSError, UnicodeDecodeError):
+                unreadable.add(dir_path)
+                continue
+            for ref in md_images.parse_images(content):
+                # 原样和URL解码后的路径都算作引用，宁可少删
+                for p in {ref.path, unquote(ref.path)}:
+                    referenced.add(os.path.normcase(os.path.abspath(
+                        os.path.join(dir_path, os.path.normpath(p)))))
+
+    orphans = []
+    for dir_path in sorted(dirs - unreadable):
+        for folder in (dir_path, os.path.join(dir_path, img_dir_name)):
+            for entry in _list_dir(folder):
+                if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                if os.path.normcase(os.path.abspath(entry.path)) in referenced:
+                    continue
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                orphans.append({"path": entry.path, "bytes": size})
+    return {"orphans": orphans, "skipped_dirs": sorted(unreadable)}
+
+
+def apply_orphans(plan, stats=None):
+    """删除 plan_orphans 找到的图片
+
+    Args:
+        plan: plan_orphans 生成的计划
+        stats: 可选的 Counter，累加 orphans_removed/orphans_bytes
+
+    Returns:
+        stats
+    """
+    if stats is None:
+        stats = Counter()
+    for dir_path in plan["skipped_dirs"]:
+        events.emit(events.WARNING, "目录中有无法读取的笔记，跳过清理: {}", dir_path)
+    for orphan in plan["orphans"]:
+        try:
+            os.remove(orphan["path"])
+        except OSError as e:
+            events.emit(events.ERROR, "删除未引用图片时出错 {}: {}", orphan["path"], e)
+            continue
+        stats["orphans_removed"] += 1
+        stats["orphans_bytes"] += orphan["bytes"]
+        events.emit(events.INFO, "已删除未引用的图片: {}", orphan["path"])
+    return stats
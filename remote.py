@@ -0,0 +1,275 @@
+"""下载笔记中引用的远程图片（http/https）
+
+下载的图片按内容哈希保存在笔记库根目录的 .md_rename_remote 目录中，
+URL -> 内容哈希 记录在同一目录的 SQLite 缓存里，同一 URL 在整个笔记库中只下载一次。
+下载完成后，远程图片以本地副本作为源文件，走正常的重命名流程复制到各笔记的图片目录。
+
+只使用标准库：按主机复用 http.client 连接，线程池限制并发数，带超时和重试。
+"""
+import os
+import time
+import sqlite3
+import mimetypes
+import threading
+import http.client
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+import core_logic
+import events
+import file_ops
+import md_images
+
+# 远程图片目录名，保存在笔记库根目录；以 . 开头，扫描器不会进入
+STORE_DIRNAME = ".md_rename_remote"
+# URL 缓存文件名，保存在远程图片目录中
+CACHE_FILENAME = "cache.sqlite"
+
+# 默认并发下载数
+DEFAULT_WORKERS = 8
+# 连接和读取的超时（秒）
+DEFAULT_TIMEOUT = 15
+# 失败后的重试次数
+DEFAULT_RETRIES = 2
+# 单个图片的最大字节数，超过时放弃
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+# 最多跟随的重定向次数
+MAX_REDIRECTS = 5
+
+# 这些状态码表示暂时性错误，可以重试
+_RETRY_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+_REDIRECT_STATUS = frozenset({301, 302, 303, 307, 308})
+# URL 中可以直接作为扩展名的图片后缀
+_IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".svg"})
+# mimetypes 给出的扩展名不理想时的替代
+_CONTENT_TYPE_EXTENSIONS = {"image/jpeg": ".jpg", "image/svg+xml": ".svg"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS remote_images (
+    url   TEXT PRIMARY KEY,
+    hash  TEXT NOT NULL,
+    ext   TEXT NOT NULL,
+    size  INTEGER NOT NULL
+);
+"""
+
+
+class FetchError(Exception):
+    """下载失败"""
+
+
+def default_store_dir(root):
+    """返回笔记库根目录下的远程图片目录"""
+    return os.path.join(root, STORE_DIRNAME)
+
+
+def collect_remote_urls(md_files):
+    """返回笔记中引用的远程图片地址，保持首次出现的顺序且不重复"""
+    urls = {}
+    for md_file in md_files:
+        try:
+            content, _ = core_logic.read_md_file(md_file)
+        except (OSError, UnicodeDecodeError):
+            continue
+        for ref in md_images.parse_images(content):
+            if md_images.is_remote(ref.path):
+                urls.setdefault(ref.path, None)
+    return list(urls)
+
+
+class HTTPPool:
+    """按 (协议, 主机) 复用的 HTTP 连接池，多个线程可以共用"""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self._idle = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle[(scheme, netloc)]
+            if idle:
+                return idle.pop()
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(netloc, timeout=self.timeout)
+
+    def _release(self, scheme, netloc, conn):
+        with self._lock:
+            self._idle[(scheme, netloc)].append(conn)
+
+    def get(self, url):
+        """GET 请求，跟随重定向
+
+        Returns:
+            (状态码, Content-Type, 响应内容)
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https"):
+                raise FetchError(f"不支持的地址: {url}")
+            target = parts.path or "/"
+            if parts.query:
+                target += "?" + parts.query
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request("GET", target, headers={
+                    "User-Agent": "markdown-rename-tool",
+                    "Accept": "image/*,*/*;q=0.8",
+                })
+                resp = conn.getresponse()
+                length = resp.getheader("Content-Length")
+                if length is not None and length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+                    raise FetchError(f"图片过大: {length} 字节")
+                body = resp.read(MAX_IMAGE_BYTES + 1)
+                if len(body) > MAX_IMAGE_BYTES:
+                    raise FetchError(f"图片过大: 超过 {MAX_IMAGE_BYTES} 字节")
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close or not resp.isclosed():
+                conn.close()
+            else:
+                self._release(parts.scheme, parts.netloc, conn)
+
+            if resp.status in _REDIRECT_STATUS and resp.getheader("Location"):
+                url = urljoin(url, resp.getheader("Location"))
+                continue
+            return resp.status, resp.getheader("Content-Type", ""), body
+        raise FetchError(f"重定向次数过多: {url}")
+
+    def close(self):
+        with self._lock:
+            for conns in self._idle.values():
+                for conn in conns:
+                    conn.close()
+            self._idle.clear()
+
+
+def _extension(url, content_type):
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    if ext in _IMAGE_EXTENSIONS:
+        return ext
+    content_type = content_type.split(";")[0].strip().lower()
+    return (_CONTENT_TYPE_EXTENSIONS.get(content_type)
+            or mimetypes.guess_extension(content_type) or ".img")
+
+
+def fetch(pool, url, retries=DEFAULT_RETRIES, backoff=0.5):
+    """下载一个图片，暂时性错误时重试
+
+    Returns:
+        (内容, 扩展名)
+    """
+    for attempt in range(retries + 1):
+        try:
+            status, content_type, body = pool.get(url)
+        except (OSError, http.client.HTTPException) as e:
+            error = FetchError(f"{type(e).__name__}: {e}")
+        else:
+            if status == 200:
+                return body, _extension(url, content_type)
+            error = FetchError(f"HTTP {status}")
+            if status not in _RETRY_STATUS:
+                break
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt)
+    raise error
+
+
+class RemoteCache:
+    """远程图片缓存：URL -> 内容哈希，图片按 哈希+扩展名 保存在缓存目录中
+
+    只在创建它的线程中使用；下载在线程池中进行，结果回到调用线程再写入。
+    """
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(store_dir, CACHE_FILENAME), timeout=30)
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def _path(self, digest, ext):
+        return os.path.join(self.store_dir, f"{digest}{ext}")
+
+    def get(self, url):
+        """返回已下载的本地路径，没有下载过或文件已被删除时返回 None"""
+        row = self.conn.execute(
+            "SELECT hash, ext FROM remote_images WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        path = self._path(*row)
+        return path if os.path.isfile(path) else None
+
+    def put(self, url, data, ext):
+        """保存下载的内容，内容相同的图片只保存一份，返回本地路径"""
+        digest = file_ops.bytes_hash(data)
+        path = self._path(digest, ext)
+        if not os.path.isfile(path):
+            file_ops.write_bytes_atomic(path, data)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO remote_images (url, hash, ext, size) VALUES (?, ?, ?, ?)",
+            (url, digest, ext, len(data)),
+        )
+        return path
+
+
+def fetch_remote_images(urls, store_dir, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT,
+                        retries=DEFAULT_RETRIES, stats=None):
+    """下载远程图片，已缓存的直接使用
+
+    Args:
+        urls: 远程图片地址
+        store_dir: 远程图片目录，见 default_store_dir
+        workers: 最大并发下载数
+        timeout: 连接和读取的超时（秒）
+        retries: 失败后的重试次数
+        stats: 可选的 Counter，累加 remote_cached/remote_fetched/remote_failed/remote_bytes
+
+    Returns:
+        {URL: 本地副本路径}，只包含成功的
+    """
+    if stats is None:
+        stats = Counter()
+    local = {}
+    with RemoteCache(store_dir) as cache:
+        todo = []
+        for url in urls:
+            path = cache.get(url)
+            if path is None:
+                todo.append(url)
+            else:
+                local[url] = path
+                stats["remote_cached"] += 1
+        if not todo:
+            return local
+
+        pool = HTTPPool(timeout)
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                futures = {executor.submit(fetch, pool, url, retries): url for url in todo}
+                for future, url in futures.items():
+                    try:
+                        data, ext = future.result()
+                    except (FetchError, OSError, http.client.HTTPException) as e:
+                        events.emit(events.WARNING, "⚠️ 下载远程图片失败：{}：{}", url, e)
+                        stats["remote_failed"] += 1
+                        continue
+                    local[url] = cache.put(url, data, ext)
+                    stats["remote_fetched"] += 1
+                    stats["remote_bytes"] += len(data)
+                    events.emit(events.INFO, "已下载: {}", url)
+        finally:
+            pool.close()
+    return local
@@ -0,0 +1,193 @@
+"""重命名计划：先生成可审阅的计划，再批量执行
+
+生成计划只读取文件，可以多进程并行；计划保存为JSON，可以在CI中审阅后再执行。
+执行时先统一创建图片目录、对所有笔记的复制去重后一次完成，再逐个改写笔记。
+"""
+import os
+import json
+from itertools import repeat
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import batch
+import core_logic
+import events
+import file_ops
+import naming
+
+# 计划文件格式版本
+PLAN_VERSION = 1
+
+
+def _plan_chunk(md_files, img_dir_name, dedup=False, move=False, shared_images=None,
+                remote_images=None):
+    """为一块文件生成计划，读取失败的文件记录错误信息
+
+    需要定义在模块顶层，以便进程池序列化。
+    块内的笔记属于同一目录，共用一个图片目录的文件名索引，去重模式下还共用内容索引。
+    """
+    plans = []
+    dir_cache = file_ops.DirCache()
+    img_dir = os.path.join(os.path.dirname(os.path.abspath(md_files[0])), img_dir_name)
+    names = naming.NameIndex(img_dir, dir_cache.names(img_dir))
+    contents = file_ops.ContentIndex(img_dir) if dedup else None
+    for md_file in md_files:
+        try:
+            plans.append(core_logic.plan_md_file(md_file, img_dir_name, dedup=dedup, move=move,
+                                                 shared_images=shared_images,
+                                                 dir_cache=dir_cache, names=names,
+                                                 remote_images=remote_images,
+                                                 content_index=contents))
+        except Exception as e:
+            plans.append({"note": md_file, "error": str(e)})
+    return plans
+
+
+def find_conflicts(note_plans):
+    """找出多个笔记中指向同一目标文件、但来源不同的复制
+
+    Returns:
+        [{"target": 目标文件, "sources": [源文件, ...]}, ...]
+    """
+    sources = defaultdict(set)
+    for note_plan in note_plans:
+        for op in note_plan.get("operations", ()):
+            sources[os.path.normcase(op["target"])].add(op["source"])
+    return [{"target": target, "sources": sorted(srcs)}
+            for target, srcs in sources.items() if len(srcs) > 1]
+
+
+def build_plan(md_files, img_dir_name="img", workers=None, dedup=False, move=False,
+               shared_images=None, remote_images=None):
+    """为多个Markdown文件生成重命名计划
+
+    Args:
+        md_files: Markdown文件路径的可迭代对象
+        img_dir_name: 图片保存目录名称，默认为"img"
+        workers: 并行进程数，默认为CPU核数；为 1 时在当前进程中生成
+        dedup: 去重模式，见 core_logic.plan_md_file
+        move/shared_images: 移动模式，见 core_logic.plan_md_file
+        remote_images: 已下载的远程图片，见 core_logic.plan_md_file
+
+    Returns:
+        可序列化为JSON的计划字典:
+            version: 计划格式版本
+            img_dir: 图片保存目录名称
+            notes: 每个笔记的计划，见 core_logic.plan_md_file
+            conflicts: 见 find_conflicts
+    """
+    # 每个目录一块：同一目录的笔记要共用文件名索引，分配的名称才不会互相冲突
+    chunks = (chunk for _, chunk in batch.iter_chunks(md_files, None))
+    if workers == 1:
+        results = map(_plan_chunk, chunks, repeat(img_dir_name), repeat(dedup), repeat(move),
+                      repeat(shared_images), repeat(remote_images))
+        note_plans = [p for plans in results for p in plans]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_plan_chunk, chunks, repeat(img_dir_name), repeat(dedup),
+                                   repeat(move), repeat(shared_images), repeat(remote_images))
+            note_plans = [p for plans in results for p in plans]
+
+    return {
+        "version": PLAN_VERSION,
+        "img_dir": img_dir_name,
+        "notes": note_plans,
+        "conflicts": find_conflicts(note_plans),
+    }
+
+
+def summarize_plan(plan):
+    """统计计划中的笔记数、复制数、缺失图片数等"""
+    summary = Counter()
+    for note_plan in plan["notes"]:
+        summary["notes"] += 1
+        if "error" in note_plan:
+            summary["errors"] += 1
+            continue
+        summary["operations"] += len(note_plan["operations"])
+        summary["moves"] += sum(1 for op in note_plan["operations"] if op.get("move"))
+        summary["missing"] += len(note_plan["missing"])
+        summary["remote"] += len(note_plan.get("remote", ()))
+        summary["collisions"] += len(note_plan["collisions"])
+    summary["conflicts"] = len(plan["conflicts"])
+    return summary
+
+
+def save_plan(plan, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+
+
+def load_plan(path):
+    with open(path, "r", encoding="utf-8") as f:
+        plan = json.load(f)
+    if plan.get("version") != PLAN_VERSION:
+        raise ValueError(f"不支持的计划文件版本: {plan.get('version')}")
+    return plan
+
+
+def _is_stale(note_plan):
+    try:
+        st = os.stat(note_plan["note"])
+    except OSError:
+        return True
+    return (st.st_mtime_ns, st.st_size) != (note_plan["mtime_ns"], note_plan["size"])
+
+
+def execute_plan(plan, stats=None, progress_callback=None, copy_strategy="auto"):
+    """批量执行重命名计划
+
+    生成计划之后又被修改过的笔记会跳过（计入 stats["stale"]），需要重新生成计划。
+    目标图片在生成计划后出现且内容不同时不覆盖，该图片记为失败，笔记中的链接保持不变。
+
+    Args:
+        plan: build_plan 或 load_plan 得到的计划
+        stats: 可选的 Counter，累加复制、跳过、改写等计数，处理失败的笔记数计入 errors
+        progress_callback: 进度回调函数，参数为 (已完成笔记数, 笔记总数)
+        copy_strategy: 复制方式，见 file_ops.copy_file
+
+    Returns:
+        处理的图片数量
+    """
+    if stats is None:
+        stats = Counter()
+
+    note_plans = []
+    for note_plan in plan["notes"]:
+        if "error" in note_plan:
+            events.emit(events.WARNING, "生成计划时出错，跳过 {}: {}", note_plan["note"],
+                        note_plan["error"])
+        elif _is_stale(note_plan):
+            events.emit(events.WARNING, "生成计划后文件已被修改，跳过: {}", note_plan["note"])
+            stats["stale"] += 1
+        else:
+            note_plans.append(note_plan)
+
+    # 第一步：一次性创建所有需要的图片目录
+    img_dirs = {os.path.join(os.path.dirname(p["note"]), p["img_dir"]) for p in note_plans}
+    for img_dir in img_dirs:
+        try:
+            os.makedirs(img_dir, exist_ok=True)
+        except OSError:
+            # 复制时会再试一次，失败的图片记录在各自的操作中
+            pass
+
+    # 第二步：复制图片，多个笔记共用的复制只做一次，存在检查共用一个目录列表缓存
+    copy_results = {}
+    copied = []
+    dir_cache = file_ops.DirCache()
+    for note_plan in note_plans:
+        copied.append(core_logic.copy_note_images(note_plan, stats, copy_results=copy_results,
+                                                  copy_strategy=copy_strategy,
+                                                  dir_cache=dir_cache, overwrite=False))
+
+    # 第三步：改写笔记
+    img_count = 0
+    for i, (note_plan, (path_map, note_img_count)) in enumerate(zip(note_plans, copied)):
+        core_logic.rewrite_note(note_plan, path_map, note_img_count, stats=stats)
+        if core_logic.plan_failed(note_plan):
+            stats["errors"] += 1
+        img_count += note_img_count
+        if progress_callback:
+            progress_callback(i + 1, len(note_plans))
+    return img_count
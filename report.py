@@ -0,0 +1,82 @@
+"""处理报告：各阶段耗时和计数
+
+core_logic 把各阶段耗时（秒）和计数累加到 stats 中，batch 在合并各进程的结果时一并合并。
+多进程处理时各阶段耗时是所有进程的累加值，可能大于总耗时；比较各阶段的占比即可找出瓶颈。
+"""
+import json
+import time
+
+import file_ops
+
+# 处理阶段: (stats 中的键, 中文名称, 英文名称)
+STAGES = (
+    ("time_index", "索引检查", "index"),
+    ("time_read", "读取", "read"),
+    ("time_parse", "解析", "parse"),
+    ("time_stat", "检查图片", "stat"),
+    ("time_copy", "复制", "copy"),
+    ("time_rewrite", "改写链接", "rewrite"),
+    ("time_write", "写入", "write"),
+    ("time_optimize", "压缩图片", "optimize"),
+)
+
+# 报告中列出的计数
+COUNTERS = (
+    "links_found", "images_missing", "remote_skipped", "collisions",
+    "copied", "copied_bytes", "moved", "moved_bytes", "skipped", "skipped_bytes",
+    "notes_written", "bytes_read", "bytes_written", "unchanged",
+    "optimized", "optimize_cached", "optimized_bytes_saved", "optimize_notes_written",
+)
+
+
+def build_report(result, elapsed, **config):
+    """由 batch.BatchResult 生成可序列化为JSON的报告
+
+    Args:
+        result: batch.process_batch 的返回值
+        elapsed: 总耗时（秒）
+        config: 记录在报告中的运行参数，如 img_dir、workers
+
+    Returns:
+        字典: timestamp, config, elapsed, files, images, cancelled, stages, counters,
+            copy_strategies（每种复制方式的使用次数）
+    """
+    stats = result.stats
+    stage_total = sum(stats[key] for key, _, _ in STAGES)
+    stages = {}
+    for key, _, name in STAGES:
+        seconds = stats[key]
+        stages[name] = {
+            "seconds": round(seconds, 6),
+            "share": round(seconds / stage_total, 4) if stage_total else 0.0,
+        }
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "elapsed": round(elapsed, 6),
+        "files": result.files,
+        "images": result.images,
+        "cancelled": result.cancelled,
+        "stages": stages,
+        "counters": {key: stats[key] for key in COUNTERS},
+        "copy_strategies": copy_strategies(stats),
+    }
+
+
+def copy_strategies(stats):
+    """stats 中各复制方式的使用次数，省略没有用到的方式"""
+    return {name: stats[f"copy_{name}"] for name in file_ops.COPY_STRATEGIES
+            if stats[f"copy_{name}"]}
+
+
+def format_stages(report, lang="zh"):
+    """一行文字的各阶段耗时摘要，按耗时从多到少排列，省略耗时为 0 的阶段"""
+    names = {name: (zh if lang == "zh" else name) for _, zh, name in STAGES}
+    items = sorted(report["stages"].items(), key=lambda kv: -kv[1]["seconds"])
+    return "  ".join(f"{names[name]} {s['seconds']:.2f}s ({s['share']:.0%})"
+                     for name, s in items if s["seconds"] > 0)
+
+
+def save_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
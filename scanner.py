@@ -0,0 +1,121 @@
+"""流式目录扫描
+
+基于 os.scandir 的生成器，边扫描边产出Markdown文件，不预先收集整个目录树。
+扫描时剪掉不需要进入的目录：
+    - 内置默认规则：版本库、依赖目录以及以 . 开头的隐藏目录
+    - 图片保存目录（img_dir_name），其中只有生成的图片
+    - 各级目录中 .gitignore / .mdrenameignore 文件里的规则（gitignore 风格）
+"""
+import os
+import fnmatch
+
+# 默认不进入的目录
+DEFAULT_IGNORED_DIRS = frozenset({"node_modules", "__pycache__", "venv"})
+
+# 各级目录中读取忽略规则的文件名
+IGNORE_FILES = (".gitignore", ".mdrenameignore")
+
+
+class IgnoreRule:
+    """gitignore 风格的一条规则
+
+    支持 # 注释、! 取反、末尾 / 只匹配目录、开头 / 或中间含 / 时相对规则文件所在目录匹配，
+    否则只匹配文件名。
+    """
+
+    def __init__(self, pattern, base_dir):
+        self.base_dir = base_dir
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        self.anchored = "/" in pattern
+        self.pattern = pattern.lstrip("/")
+
+    def matches(self, path, name, is_dir):
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            rel = os.path.relpath(path, self.base_dir).replace(os.sep, "/")
+            return fnmatch.fnmatchcase(rel, self.pattern)
+        return fnmatch.fnmatchcase(name, self.pattern)
+
+
+def load_ignore_rules(dir_path, filenames=IGNORE_FILES):
+    """读取目录中的忽略规则文件，返回规则列表"""
+    rules = []
+    for filename in filenames:
+        try:
+            with open(os.path.join(dir_path, filename), encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for line in lines:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                rules.append(IgnoreRule(line, dir_path))
+    return rules
+
+
+def is_ignored(path, name, is_dir, rules):
+    """按规则判断路径是否被忽略，后出现的规则优先"""
+    ignored = False
+    for rule in rules:
+        if rule.matches(path, name, is_dir):
+            ignored = not rule.negate
+    return ignored
+
+
+def iter_md_files(root, img_dir_name="img"):
+    """递归扫描目录，逐个产出 .md 文件路径
+
+    同一目录下的文件连续产出，便于按目录分组处理。
+    内存占用只与目录深度和单个目录的大小有关，与整个目录树的大小无关。
+    """
+    stack = [(root, [])]
+    while stack:
+        dir_path, rules = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        # 只有目录中确实存在规则文件时才去读取
+        present = [e.name for e in entries if e.name in IGNORE_FILES]
+        if present:
+            rules = rules + load_ignore_rules(dir_path, present)
+
+        subdirs = []
+        for entry in entries:
+            name = entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                if (name.startswith(".") or name == img_dir_name
+                        or name in DEFAULT_IGNORED_DIRS
+                        or is_ignored(entry.path, name, True, rules)):
+                    continue
+                subdirs.append(entry.path)
+            elif name.endswith(".md") and not is_ignored(entry.path, name, False, rules):
+                yield entry.path
+
+        # 倒序入栈，按目录项顺序深度优先访问
+        for sub in reversed(subdirs):
+            stack.append((sub, rules))
+
+
+def expand_paths(paths, img_dir_name="img"):
+    """把文件和目录混合的路径列表展开为Markdown文件
+
+    目录递归扫描，直接给出的 .md 文件原样产出；其他文件和不存在的路径忽略。
+    作为生成器，连判断路径类型在内的所有文件系统操作都推迟到开始迭代时才执行。
+    """
+    for p in paths:
+        if os.path.isdir(p):
+            yield from iter_md_files(p, img_dir_name)
+        elif p.endswith(".md") and os.path.isfile(p):
+            yield p
@@ -0,0 +1,65 @@
+"""batch 批量处理的测试：同一目录的笔记分成多块处理时共用文件名索引，不会互相覆盖"""
+import os
+
+import pytest
+
+import batch
+import file_ops
+import scanner
+
+
+def _flat_vault(root, count):
+    """一个目录中 count 个笔记，每个引用一张描述相同、内容不同的图片"""
+    for i in range(count):
+        (root / f"s{i}.png").write_bytes(b"image %d" % i)
+        (root / f"n{i}.md").write_text(f"![pic](s{i}.png)\n", encoding="utf-8")
+
+
+def _check(root, count):
+    targets = {}
+    for i in range(count):
+        text = (root / f"n{i}.md").read_text(encoding="utf-8")
+        link = text[text.index("(") + 1:text.index(")")]
+        assert link.startswith("./img/pic")
+        targets[link] = i
+        assert (root / link).read_bytes() == b"image %d" % i
+    assert len(targets) == count
+
+
+@pytest.mark.parametrize("workers, use_threads", [(1, False), (3, True), (3, False)])
+def test_chunks_of_one_directory_do_not_collide(tmp_path, workers, use_threads):
+    count = batch.CHUNK_SIZE * 4 + 3
+    _flat_vault(tmp_path, count)
+    result = batch.process_batch(scanner.iter_md_files(str(tmp_path)), workers=workers,
+                                 use_threads=use_threads)
+    assert (result.files, result.images) == (count, count)
+    _check(tmp_path, count)
+
+
+def test_rerun_keeps_names(tmp_path):
+    count = batch.CHUNK_SIZE * 2 + 1
+    _flat_vault(tmp_path, count)
+    batch.process_batch(scanner.iter_md_files(str(tmp_path)), workers=1)
+    before = sorted(os.listdir(tmp_path / "img"))
+    result = batch.process_batch(scanner.iter_md_files(str(tmp_path)), workers=1)
+    assert result.stats["collisions"] == 0
+    assert sorted(os.listdir(tmp_path / "img")) == before
+    _check(tmp_path, count)
+
+
+def test_directory_listed_once_in_process(tmp_path, monkeypatch):
+    count = batch.CHUNK_SIZE * 5
+    _flat_vault(tmp_path, count)
+    md_files = sorted(str(p) for p in tmp_path.glob("*.md"))
+    listed = []
+    scandir = os.scandir
+
+    def counting_scandir(path="."):
+        listed.append(os.path.normcase(os.path.abspath(path)))
+        return scandir(path)
+    monkeypatch.setattr(file_ops.os, "scandir", counting_scandir)
+
+    batch.process_batch(md_files, workers=1)
+
+    assert listed.count(os.path.normcase(str(tmp_path))) == 1
+    assert listed.count(os.path.normcase(str(tmp_path / "img"))) == 1
@@ -0,0 +1,25 @@
+"""命令行的测试：退出码反映路径缺失和笔记处理失败"""
+import cli
+
+
+def test_exit_ok(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"a")
+    (tmp_path / "n.md").write_text("![猫](a.png)\n", encoding="utf-8")
+
+    assert cli.main([str(tmp_path / "n.md"), "-j", "1"]) == cli.EXIT_OK
+    assert (tmp_path / "img" / "猫.png").exists()
+
+
+def test_exit_error_when_note_fails(tmp_path, capsys):
+    (tmp_path / "a.png").write_bytes(b"a")
+    (tmp_path / "good.md").write_text("![猫](a.png)\n", encoding="utf-8")
+    (tmp_path / "bad.md").write_bytes(b"\xff\xff\xff")
+
+    assert cli.main([str(tmp_path), "-j", "1"]) == cli.EXIT_ERROR
+    assert "1 个Markdown文件处理失败" in capsys.readouterr().err
+    # 其他笔记照常处理
+    assert (tmp_path / "img" / "猫.png").exists()
+
+
+def test_exit_error_when_path_missing(tmp_path):
+    assert cli.main([str(tmp_path / "missing.md")]) == cli.EXIT_ERROR
@@ -0,0 +1,128 @@
+"""dedup 去重计划和执行的测试：重复图片只有在所有引用都改写后才删除"""
+import os
+
+import dedup
+import file_ops
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+    return str(path)
+
+
+def _run(md_files):
+    plan = dedup.plan_dedup(md_files)
+    return plan, dedup.apply_dedup(plan)
+
+
+def test_duplicates_merged_and_links_rewritten(tmp_path):
+    _write(tmp_path / "img" / "a.png", b"same")
+    _write(tmp_path / "img" / "bb.png", b"same")
+    n1 = _write(tmp_path / "n1.md", "![a](./img/a.png)\n![b](./img/bb.png)\n")
+    n2 = _write(tmp_path / "n2.md", "![b](./img/bb.png)\n")
+
+    _, stats = _run([n1, n2])
+
+    assert stats["dedup_removed"] == 1
+    # bb.png 被两个笔记引用，保留它
+    assert os.listdir(tmp_path / "img") == ["bb.png"]
+    assert open(n1, encoding="utf-8").read() == "![a](./img/bb.png)\n![b](./img/bb.png)\n"
+    assert open(n2, encoding="utf-8").read() == "![b](./img/bb.png)\n"
+
+
+def test_notes_not_given_are_rewritten_too(tmp_path):
+    """只给出 n1.md 时，同一目录中引用重复文件的 n2.md 也要改写，不能留下失效的链接"""
+    _write(tmp_path / "img" / "a.png", b"same")
+    _write(tmp_path / "img" / "bb.png", b"same")
+    n1 = _write(tmp_path / "n1.md", "![a](./img/a.png)\n![b](./img/bb.png)\n")
+    n2 = _write(tmp_path / "n2.md", "![b](./img/bb.png)\n")
+
+    _run([n1])
+
+    for note in (n1, n2):
+        text = open(note, encoding="utf-8").read()
+        for line in text.splitlines():
+            path = line[line.index("(") + 1:-1]
+            assert os.path.isfile(os.path.join(tmp_path, path)), (note, line)
+
+
+def test_most_referenced_copy_is_kept(tmp_path):
+    _write(tmp_path / "img" / "a.png", b"same")
+    _write(tmp_path / "img" / "long_name.png", b"same")
+    _write(tmp_path / "n1.md", "![x](./img/long_name.png)\n")
+    _write(tmp_path / "n2.md", "![x](./img/long_name.png)\n![y](./img/a.png)\n")
+
+    plan, _ = _run([str(tmp_path / "n1.md")])
+
+    assert [os.path.basename(g["keep"]) for g in plan["groups"]] == ["long_name.png"]
+    assert os.listdir(tmp_path / "img") == ["long_name.png"]
+
+
+def test_different_content_is_kept(tmp_path):
+    _write(tmp_path / "img" / "a.png", b"one")
+    _write(tmp_path / "img" / "b.png", b"two")
+    note = _write(tmp_path / "n.md", "![a](./img/a.png)\n![b](./img/b.png)\n")
+
+    plan, stats = _run([note])
+
+    assert plan["groups"] == [] and stats["dedup_removed"] == 0
+    assert sorted(os.listdir(tmp_path / "img")) == ["a.png", "b.png"]
+
+
+def test_directory_with_unreadable_note_is_skipped(tmp_path):
+    _write(tmp_path / "img" / "a.png", b"same")
+    _write(tmp_path / "img" / "bb.png", b"same")
+    note = _write(tmp_path / "n1.md", "![a](./img/a.png)\n![b](./img/bb.png)\n")
+    _write(tmp_path / "bad.md", b"\xff\xff\xff")
+
+    plan, stats = _run([note])
+
+    assert plan["groups"] == [] and stats["dedup_removed"] == 0
+    assert sorted(os.listdir(tmp_path / "img")) == ["a.png", "bb.png"]
+
+
+def test_duplicate_kept_when_rewrite_fails(tmp_path, monkeypatch):
+    _write(tmp_path / "img" / "a.png", b"same")
+    _write(tmp_path / "img" / "bb.png", b"same")
+    note = _write(tmp_path / "n.md", "![a](./img/a.png)\n![b](./img/bb.png)\n")
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(dedup.file_ops, "write_text_atomic", fail)
+
+    _, stats = _run([note])
+
+    assert stats["dedup_removed"] == 0
+    assert sorted(os.listdir(tmp_path / "img")) == ["a.png", "bb.png"]
+
+
+def test_dedup_mode_shares_content_index_across_chunks(tmp_path, monkeypatch):
+    """去重模式的批量处理：同一目录只建立一次内容索引，内容相同的图片只保存一份"""
+    import batch
+
+    count = batch.CHUNK_SIZE * 3
+    for i in range(count):
+        _write(tmp_path / f"s{i}.png", b"content %d" % (i % 3))
+        _write(tmp_path / f"n{i}.md", f"![pic{i}](s{i}.png)\n")
+    md_files = sorted(str(p) for p in tmp_path.glob("*.md"))
+
+    built = []
+    content_index = file_ops.ContentIndex
+
+    def counting_index(folder):
+        built.append(folder)
+        return content_index(folder)
+    monkeypatch.setattr(file_ops, "ContentIndex", counting_index)
+
+    result = batch.process_batch(md_files, workers=1, dedup=True)
+
+    assert result.images == count
+    assert len(built) == 1
+    assert len(os.listdir(tmp_path / "img")) == 3
+    for md_file in md_files:
+        text = open(md_file, encoding="utf-8").read()
+        link = text[text.index("(") + 1:text.index(")")]
+        assert os.path.isfile(os.path.join(tmp_path, link))
@@ -0,0 +1,74 @@
+"""笔记编码和换行符的测试：改写后的文件保持原来的编码、BOM 和换行符"""
+import codecs
+from collections import Counter
+
+import pytest
+
+import core_logic
+
+# (文件开头的字节, 编码)
+ENCODINGS = [
+    (b"", "utf-8"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (b"", "gbk"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+
+
+def _encode(text, bom, encoding, newline):
+    return bom + text.replace("\n", newline).encode(encoding)
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("bom,encoding", ENCODINGS)
+def test_round_trip(tmp_path, bom, encoding, newline):
+    (tmp_path / "a.png").write_bytes(b"a")
+    note = tmp_path / "n.md"
+    note.write_bytes(_encode("# 标题\n\n![猫](a.png)\n正文\n", bom, encoding, newline))
+
+    assert core_logic.process_md_file(str(note)) == 1
+
+    assert note.read_bytes() == _encode("# 标题\n\n![猫](./img/猫.png)\n正文\n", bom, encoding,
+                                        newline)
+    assert (tmp_path / "img" / "猫.png").exists()
+
+
+@pytest.mark.parametrize("bom,encoding", ENCODINGS)
+def test_read_md_text(tmp_path, bom, encoding):
+    note = tmp_path / "n.md"
+    note.write_bytes(_encode("第一行\n第二行\n", bom, encoding, "\r\n"))
+
+    content, detected, newline = core_logic.read_md_text(str(note))
+
+    assert content.lstrip("\ufeff") == "第一行\n第二行\n"
+    assert newline == "\r\n"
+    if bom == codecs.BOM_UTF8:
+        assert detected == "utf-8-sig"
+    else:
+        assert detected == encoding
+
+
+def test_unchanged_note_is_not_rewritten(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "猫.png").write_bytes(b"a")
+    note = tmp_path / "n.md"
+    data = _encode("![猫](./img/猫.png)\n", b"", "gbk", "\r\n")
+    note.write_bytes(data)
+    before = note.stat().st_mtime_ns
+
+    stats = Counter()
+    core_logic.process_md_file(str(note), stats=stats)
+
+    assert note.read_bytes() == data
+    assert note.stat().st_mtime_ns == before
+    assert stats["notes_written"] == 0
+
+
+def test_undecodable_note_is_left_alone(tmp_path):
+    note = tmp_path / "n.md"
+    note.write_bytes(b"\x80\xff![a](a.png)")
+    (tmp_path / "a.png").write_bytes(b"a")
+
+    assert core_logic.process_md_file(str(note)) == 0
+    assert note.read_bytes() == b"\x80\xff![a](a.png)"
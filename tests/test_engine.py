@@ -0,0 +1,80 @@
+"""RenameEngine 的测试：文件读写错误记录在结果中，不中断其他笔记"""
+import os
+import stat
+
+import pytest
+
+import engine
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_process_files(tmp_path):
+    _write(tmp_path / "a.png", b"a")
+    note = _write(tmp_path / "n.md", "![猫](a.png)\n![缺](missing.png)\n")
+
+    [result] = engine.RenameEngine().process_files([note])
+
+    assert result.ok and result.written
+    assert result.renamed == [(str(tmp_path / "a.png"), str(tmp_path / "img" / "猫.png"))]
+    assert result.missing == [str(tmp_path / "missing.png")]
+    # 再次处理时名称已经符合要求
+    [again] = engine.RenameEngine().process_files([note])
+    assert again.ok and not again.written and again.skipped == [str(tmp_path / "img" / "猫.png")]
+
+
+def test_unreadable_note_is_reported(tmp_path):
+    note = _write(tmp_path / "bad.md", b"\xff\xff\xff")
+    [result] = engine.RenameEngine().process_files([note])
+    assert not result.ok and "UnicodeDecodeError" in result.errors[0]
+
+
+@pytest.mark.skipif(os.name == "nt" or os.geteuid() == 0,
+                    reason="需要非 root 用户的目录权限")
+def test_image_folder_error_does_not_abort_other_notes(tmp_path):
+    locked = tmp_path / "locked"
+    _write(locked / "a.png", b"a")
+    first = _write(locked / "n.md", "![猫](a.png)\n")
+    _write(tmp_path / "ok" / "b.png", b"b")
+    second = _write(tmp_path / "ok" / "n.md", "![狗](b.png)\n")
+    os.chmod(locked, stat.S_IRUSR | stat.S_IXUSR)
+    try:
+        results = engine.RenameEngine().process_files([first, second])
+    finally:
+        os.chmod(locked, stat.S_IRWXU)
+
+    assert not results[0].ok and not results[0].written
+    assert results[1].ok and results[1].written
+
+
+def test_image_folder_error_is_reported(tmp_path, monkeypatch):
+    _write(tmp_path / "a.png", b"a")
+    note = _write(tmp_path / "n.md", "![猫](a.png)\n")
+
+    def denied(*args, **kwargs):
+        raise PermissionError(13, "Permission denied")
+    monkeypatch.setattr(engine.core_logic.os, "makedirs", denied)
+
+    [result] = engine.RenameEngine().process_files([note])
+
+    assert not result.ok and "PermissionError" in result.errors[0]
+    assert not result.written
+    assert open(note, encoding="utf-8").read() == "![猫](a.png)\n"
+
+
+def test_programming_errors_propagate(tmp_path, monkeypatch):
+    _write(tmp_path / "a.png", b"a")
+    note = _write(tmp_path / "n.md", "![猫](a.png)\n")
+
+    def bug(*args, **kwargs):
+        raise ZeroDivisionError
+    monkeypatch.setattr(engine.core_logic.file_ops, "copy_if_changed", bug)
+
+    with pytest.raises(ZeroDivisionError):
+        engine.RenameEngine().process_files([note])
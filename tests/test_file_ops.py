@@ -0,0 +1,62 @@
+"""原子写入的测试：出错时原文件不变，保留权限和符号链接"""
+import os
+import stat
+
+import pytest
+
+import file_ops
+
+
+def test_write_bytes_atomic(tmp_path):
+    path = tmp_path / "n.md"
+    path.write_bytes(b"old")
+    os.chmod(path, 0o640)
+
+    assert file_ops.write_bytes_atomic(str(path), b"new") == 3
+    assert path.read_bytes() == b"new"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    assert os.listdir(tmp_path) == ["n.md"]
+
+
+def test_write_bytes_atomic_keeps_original_on_error(tmp_path, monkeypatch):
+    path = tmp_path / "n.md"
+    path.write_bytes(b"old")
+
+    def fail(src, dst):
+        raise OSError("磁盘已满")
+
+    monkeypatch.setattr(file_ops.os, "replace", fail)
+    with pytest.raises(OSError):
+        file_ops.write_bytes_atomic(str(path), b"new")
+    assert path.read_bytes() == b"old"
+    # 临时文件已清理
+    assert os.listdir(tmp_path) == ["n.md"]
+
+
+def test_write_bytes_atomic_through_symlink(tmp_path):
+    target = tmp_path / "notes" / "n.md"
+    target.parent.mkdir()
+    target.write_bytes(b"old")
+    link = tmp_path / "link.md"
+    link.symlink_to(target)
+
+    file_ops.write_bytes_atomic(str(link), b"new")
+
+    assert link.is_symlink()
+    assert target.read_bytes() == b"new"
+    # 临时文件建在目标文件所在的目录
+    assert sorted(os.listdir(tmp_path)) == ["link.md", "notes"]
+    assert os.listdir(target.parent) == ["n.md"]
+
+
+def test_write_text_atomic_newline_and_encoding(tmp_path):
+    path = tmp_path / "n.md"
+
+    file_ops.write_text_atomic(str(path), "第一行\n第二行\n", encoding="gbk", newline="\r\n")
+    assert path.read_bytes() == "第一行\r\n第二行\r\n".encode("gbk")
+
+    # 无法用原编码表示时不创建任何文件
+    with pytest.raises(UnicodeEncodeError):
+        file_ops.write_text_atomic(str(path), "😀\n", encoding="gbk")
+    assert path.read_bytes() == "第一行\r\n第二行\r\n".encode("gbk")
+    assert os.listdir(tmp_path) == ["n.md"]
@@ -0,0 +1,109 @@
+"""git 模式的测试：在临时目录中建立 git 仓库"""
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import cli
+import gitscan
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="需要 git 命令")
+
+
+def _git(repo, *args):
+    subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   cwd=repo, check=True, capture_output=True)
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+    return str(path)
+
+
+def _staged(repo):
+    out = subprocess.run(["git", "diff", "--cached", "--name-only", "-z"], cwd=repo, check=True,
+                         capture_output=True).stdout
+    return sorted(os.fsdecode(name) for name in out.split(b"\0") if name)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    _git(tmp_path, "init", "-q")
+    _write(tmp_path / "a.md", "a\n")
+    _write(tmp_path / "sub" / "b.md", "b\n")
+    _write(tmp_path / ".gitignore", "ignored.md\n")
+    _git(tmp_path, "add", "-A")
+    _git(tmp_path, "commit", "-q", "-m", "init")
+    return tmp_path
+
+
+def _rel(repo, notes):
+    return sorted(os.path.relpath(n, repo).replace(os.sep, "/") for n in notes)
+
+
+def test_list_notes(repo):
+    _write(repo / "new.md", "new\n")
+    _write(repo / "ignored.md", "x\n")
+    _write(repo / "img" / "c.md", "c\n")
+    _write(repo / ".hidden" / "d.md", "d\n")
+
+    assert _rel(repo, gitscan.list_notes(str(repo))) == ["a.md", "new.md", "sub/b.md"]
+    assert _rel(repo, gitscan.list_notes(str(repo / "sub"))) == ["sub/b.md"]
+
+
+def test_list_notes_since_base(repo):
+    _write(repo / "a.md", "changed\n")
+    _write(repo / "new.md", "new\n")
+
+    assert _rel(repo, gitscan.list_notes(str(repo), base="HEAD")) == ["a.md", "new.md"]
+
+
+def test_list_staged_notes(repo):
+    _write(repo / "a.md", "changed\n")
+    _write(repo / "sub" / "b.md", "changed\n")
+    _git(repo, "add", "a.md")
+
+    assert _rel(repo, gitscan.list_notes(str(repo), staged=True)) == ["a.md"]
+
+
+def test_worktree_changes(repo):
+    _write(repo / "a.md", "changed\n")
+    _write(repo / "new.md", "new\n")
+    os.remove(repo / "sub" / "b.md")
+
+    assert _rel(repo, gitscan.worktree_changes(str(repo))) == ["a.md", "new.md", "sub/b.md"]
+
+
+def test_not_a_repo(tmp_path):
+    with pytest.raises(gitscan.GitError):
+        gitscan.list_notes(str(tmp_path))
+
+
+def test_staged_mode_stages_only_written_files(repo):
+    _write(repo / "pic.png", b"png")
+    _write(repo / "a.md", "![猫](pic.png)\n")
+    _git(repo, "add", "a.md", "pic.png")
+    # 工作区中与本次运行无关的改动不能被加入暂存区
+    _write(repo / "unrelated.txt", "x\n")
+
+    assert cli.main([str(repo), "--git-staged", "-j", "1"]) == cli.EXIT_OK
+
+    assert (repo / "a.md").read_text(encoding="utf-8") == "![猫](./img/猫.png)\n"
+    assert _staged(repo) == ["a.md", "img/猫.png", "pic.png"]
+
+
+def test_staged_mode_skips_partially_staged_note(repo):
+    _write(repo / "pic.png", b"png")
+    _write(repo / "a.md", "![猫](pic.png)\n")
+    _git(repo, "add", "a.md", "pic.png")
+    _write(repo / "a.md", "![猫](pic.png)\n未暂存的改动\n")
+
+    assert cli.main([str(repo), "--git-staged", "-j", "1"]) == cli.EXIT_OK
+
+    assert (repo / "a.md").read_text(encoding="utf-8") == "![猫](pic.png)\n未暂存的改动\n"
+    assert not (repo / "img").exists()
+    assert _staged(repo) == ["a.md", "pic.png"]
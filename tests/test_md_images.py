@@ -0,0 +1,93 @@
+"""md_images 解析和改写的表驱动测试"""
+import pytest
+
+import md_images
+
+
+PARSE_CASES = [
+    # (说明, 文本, [(描述, 路径, 类型)])
+    ("行内图片", "![猫](img/cat.png)", [("猫", "img/cat.png", "inline")]),
+    ("空描述", "![](a.png)", [("", "a.png", "inline")]),
+    ("带标题", '![猫](cat.png "标题")', [("猫", "cat.png", "inline")]),
+    ("单引号标题", "![猫](cat.png 'title')", [("猫", "cat.png", "inline")]),
+    ("尖括号路径可含空格", "![猫](<my cat.png>)", [("猫", "my cat.png", "inline")]),
+    ("旧版本写出的含空格路径", "![猫](my cat.png)", [("猫", "my cat.png", "inline")]),
+    ("含空格路径带标题", '![猫](my cat.png "t")', [("猫", "my cat.png", "inline")]),
+    ("Windows 反斜杠路径", r"![图](images\sub\a.png)", [("图", r"images\sub\a.png", "inline")]),
+    ("路径中成对的括号", "![a](a(1).png)", [("a", "a(1).png", "inline")]),
+    ("描述中的转义", r"![a\]b](x.png)", [(r"a\]b", "x.png", "inline")]),
+    ("转义的感叹号不是图片", r"\![a](x.png)", []),
+    ("普通链接不是图片", "[a](x.png)", []),
+    ("同一行多个图片", "![a](1.png) ![b](2.png)",
+     [("a", "1.png", "inline"), ("b", "2.png", "inline")]),
+    ("远程图片", "![r](https://e.com/x.png)", [("r", "https://e.com/x.png", "inline")]),
+    ("行内代码中的图片忽略", "`![a](x.png)` ![b](y.png)", [("b", "y.png", "inline")]),
+    ("双反引号行内代码", "``a ` ![a](x.png)`` ![b](y.png)", [("b", "y.png", "inline")]),
+    ("没有闭合的反引号按普通文本", "` ![a](x.png)", [("a", "x.png", "inline")]),
+    ("行内代码不跨段落", "`a\n\n![a](x.png) `", [("a", "x.png", "inline")]),
+    ("围栏代码块忽略", "```\n![a](x.png)\n```\n![b](y.png)", [("b", "y.png", "inline")]),
+    ("波浪线围栏", "~~~md\n![a](x.png)\n~~~\n", []),
+    ("围栏需要同样长度的闭合", "````\n```\n![a](x.png)\n````\n![b](y.png)",
+     [("b", "y.png", "inline")]),
+    ("没有闭合的围栏到文档结束", "```\n![a](x.png)\n", []),
+    ("信息串含反引号的不是围栏", "``` a`b\n![a](x.png)", [("a", "x.png", "inline")]),
+    ("引用式图片", "![猫][c]\n\n[c]: img/cat.png", [("猫", "img/cat.png", "reference")]),
+    ("定义在前", "[c]: cat.png\n![猫][c]", [("猫", "cat.png", "reference")]),
+    ("空标签用描述", "![Cat][]\n\n[cat]: cat.png", [("Cat", "cat.png", "reference")]),
+    ("省略标签用描述", "![Cat]\n\n[CAT]: cat.png", [("Cat", "cat.png", "reference")]),
+    ("标签大小写和空白规范化", "![a][My  Label]\n\n[my label]: x.png",
+     [("a", "x.png", "reference")]),
+    ("先出现的定义有效", "![a][x]\n\n[x]: 1.png\n[x]: 2.png", [("a", "1.png", "reference")]),
+    ("尖括号定义", "![a][x]\n\n[x]: <my x.png> \"t\"", [("a", "my x.png", "reference")]),
+    ("找不到定义时忽略", "![a][nope]", []),
+    ("代码块中的定义无效", "![a][x]\n```\n[x]: x.png\n```", []),
+    ("HTML 图片", '<img src="a.png" alt="猫">', [("猫", "a.png", "html")]),
+    ("HTML 单引号和大写", "<IMG ALT='猫' SRC='a.png'>", [("猫", "a.png", "html")]),
+    ("HTML 无引号属性", "<img src=a.png>", [("", "a.png", "html")]),
+    ("HTML 没有 src", '<img alt="x">', []),
+]
+
+
+@pytest.mark.parametrize("text, expected", [case[1:] for case in PARSE_CASES],
+                         ids=[case[0] for case in PARSE_CASES])
+def test_parse_images(text, expected):
+    refs = md_images.parse_images(text)
+    assert [(r.alt, r.path, r.kind) for r in refs] == expected
+    for ref in refs:
+        assert text[ref.start:ref.end] == ref.path
+
+
+REPLACE_CASES = [
+    # (说明, 文本, 旧路径 -> 新路径, 结果)
+    ("行内", "![a](x.png)", {"x.png": "./img/a.png"}, "![a](./img/a.png)"),
+    ("保留标题", '![a](x.png "t")', {"x.png": "y.png"}, '![a](y.png "t")'),
+    ("新路径含空格时加 <>", "![a](x.png)", {"x.png": "./img/a b.png"}, "![a](<./img/a b.png>)"),
+    ("已有 <> 时不重复", "![a](<x y.png>)", {"x y.png": "./img/a b.png"},
+     "![a](<./img/a b.png>)"),
+    ("不成对括号时加 <>", "![a](x.png)", {"x.png": "a(.png"}, "![a](<a(.png>)"),
+    ("引用式改写定义，同一定义只改一次", "![a][x] ![b][x]\n\n[x]: x.png",
+     {"x.png": "y.png"}, "![a][x] ![b][x]\n\n[x]: y.png"),
+    ("HTML 不加 <>", '<img src="x.png">', {"x.png": "a b.png"}, '<img src="a b.png">'),
+    ("不在映射中的保持不变", "![a](x.png) ![b](z.png)", {"x.png": "y.png"},
+     "![a](y.png) ![b](z.png)"),
+    ("代码中的不改写", "`![a](x.png)` ![a](x.png)", {"x.png": "y.png"},
+     "`![a](x.png)` ![a](y.png)"),
+    ("没有改动时原样返回", "![a](x.png)", {}, "![a](x.png)"),
+]
+
+
+@pytest.mark.parametrize("text, mapping, expected", [case[1:] for case in REPLACE_CASES],
+                         ids=[case[0] for case in REPLACE_CASES])
+def test_replace_paths(text, mapping, expected):
+    refs = md_images.parse_images(text)
+    assert md_images.replace_paths(text, refs, lambda ref: mapping.get(ref.path)) == expected
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("http://e.com/a.png", True),
+    ("https://e.com/a.png", True),
+    ("./img/a.png", False),
+    ("ftp://e.com/a.png", False),
+])
+def test_is_remote(path, expected):
+    assert md_images.is_remote(path) is expected
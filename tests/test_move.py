@@ -0,0 +1,107 @@
+"""移动模式和清理未引用图片的测试：被其他笔记引用的图片不能删除"""
+import os
+
+import core_logic
+import dedup
+import orphans
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+    return str(path)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_move_unshared_image(tmp_path):
+    _write(tmp_path / "a.png", b"a")
+    note = _write(tmp_path / "n.md", "![猫](a.png)\n")
+
+    core_logic.process_md_file(note, move=True)
+
+    assert not (tmp_path / "a.png").exists()
+    assert (tmp_path / "img" / "猫.png").read_bytes() == b"a"
+    assert _read(note) == "![猫](./img/猫.png)\n"
+
+
+def test_move_keeps_image_shared_through_relative_path(tmp_path):
+    """另一个目录的笔记通过 ../ 引用同一图片时只复制不移动"""
+    _write(tmp_path / "shared" / "a.png", b"a")
+    n1 = _write(tmp_path / "one" / "n.md", "![猫](../shared/a.png)\n")
+    n2 = _write(tmp_path / "two" / "n.md", "![狗](../shared/a.png)\n")
+    shared = dedup.find_shared_images([n1, n2])
+
+    core_logic.process_md_file(n1, move=True, shared_images=shared)
+
+    assert (tmp_path / "shared" / "a.png").exists()
+    assert (tmp_path / "one" / "img" / "猫.png").read_bytes() == b"a"
+    assert _read(n2) == "![狗](../shared/a.png)\n"
+
+
+def test_move_image_linked_twice_in_one_note(tmp_path):
+    """同一笔记多次引用的图片移动一次，所有链接都改写，不留下失效的链接"""
+    _write(tmp_path / "a.png", b"a")
+    note = _write(tmp_path / "n.md", "![猫](a.png)\n![狗](./a.png)\n")
+
+    core_logic.process_md_file(note, move=True)
+
+    assert not (tmp_path / "a.png").exists()
+    assert os.listdir(tmp_path / "img") == ["猫.png"]
+    assert _read(note) == "![猫](./img/猫.png)\n![狗](./img/猫.png)\n"
+
+
+def test_move_image_already_at_target(tmp_path):
+    _write(tmp_path / "img" / "猫.png", b"a")
+    note = _write(tmp_path / "n.md", "![猫](./img/猫.png)\n")
+
+    core_logic.process_md_file(note, move=True)
+
+    assert (tmp_path / "img" / "猫.png").read_bytes() == b"a"
+    assert _read(note) == "![猫](./img/猫.png)\n"
+
+
+def test_sweep_orphans(tmp_path):
+    _write(tmp_path / "img" / "猫.png", b"a")
+    _write(tmp_path / "img" / "old.png", b"b")
+    _write(tmp_path / "a b.png", b"c")
+    _write(tmp_path / "notes.txt", b"d")
+    note = _write(tmp_path / "n.md", "![猫](./img/猫.png)\n![空格](a%20b.png)\n")
+
+    plan = orphans.plan_orphans([note])
+    stats = orphans.apply_orphans(plan)
+
+    assert stats["orphans_removed"] == 1 and stats["orphans_bytes"] == 1
+    assert sorted(os.listdir(tmp_path / "img")) == ["猫.png"]
+    # URL 编码的引用和非图片文件都保留
+    assert (tmp_path / "a b.png").exists()
+    assert (tmp_path / "notes.txt").exists()
+
+
+def test_sweep_orphans_counts_notes_not_given(tmp_path):
+    """只给出 n1.md 时，同一目录中 n2.md 引用的图片不能删除"""
+    _write(tmp_path / "img" / "a.png", b"a")
+    _write(tmp_path / "img" / "b.png", b"b")
+    n1 = _write(tmp_path / "n1.md", "![a](./img/a.png)\n")
+    _write(tmp_path / "n2.md", "![b](./img/b.png)\n")
+
+    orphans.apply_orphans(orphans.plan_orphans([n1]))
+
+    assert sorted(os.listdir(tmp_path / "img")) == ["a.png", "b.png"]
+
+
+def test_sweep_orphans_skips_dir_with_unreadable_note(tmp_path):
+    _write(tmp_path / "img" / "a.png", b"a")
+    note = _write(tmp_path / "n.md", "没有图片\n")
+    _write(tmp_path / "bad.md", b"\xff\xff\xff")
+
+    plan = orphans.plan_orphans([note])
+    orphans.apply_orphans(plan)
+
+    assert plan["skipped_dirs"] == [str(tmp_path)]
+    assert (tmp_path / "img" / "a.png").exists()
@@ -0,0 +1,122 @@
+"""naming.NameIndex 文件名分配的测试"""
+import os
+
+import pytest
+
+import core_logic
+import naming
+
+
+def _write(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+@pytest.fixture
+def vault(tmp_path):
+    """笔记目录：img 图片目录和几个内容不同的源图片"""
+    (tmp_path / "img").mkdir()
+    sources = {name: _write(tmp_path / f"{name}.png", name.encode()) for name in ("a", "b", "c")}
+    return tmp_path, sources
+
+
+def test_free_name(vault):
+    root, src = vault
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", src["a"]) == ("猫.png", 0)
+
+
+def test_same_source_gets_same_name(vault):
+    root, src = vault
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", src["a"]) == ("猫.png", 0)
+    assert names.claim("猫", ".png", src["a"]) == ("猫.png", 0)
+
+
+def test_collisions_are_numbered(vault):
+    root, src = vault
+    names = naming.NameIndex(str(root / "img"))
+    claimed = [names.claim("猫", ".png", src[k]) for k in ("a", "b", "c")]
+    assert claimed == [("猫.png", 0), ("猫_1.png", 1), ("猫_2.png", 2)]
+
+
+def test_existing_file_with_other_content_is_not_overwritten(vault):
+    root, src = vault
+    _write(root / "img" / "猫.png", b"other")
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", src["a"]) == ("猫_1.png", 1)
+
+
+def test_existing_file_with_same_content_is_reused(vault):
+    root, src = vault
+    _write(root / "img" / "猫.png", b"a")
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", src["a"]) == ("猫.png", 0)
+
+
+def test_existing_list_skips_directory_read(vault):
+    root, src = vault
+    names = naming.NameIndex(str(root / "img"), existing=["猫.png"])
+    # 列表中的文件实际不存在，内容比较失败，视为被占用
+    assert names.claim("猫", ".png", src["a"]) == ("猫_1.png", 1)
+
+
+def test_source_already_at_target(vault):
+    root, src = vault
+    target = _write(root / "img" / "猫.png", b"a")
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", target) == ("猫.png", 0)
+
+
+def test_source_keeps_its_numbered_name(vault):
+    """上次运行改为 猫_2.png 的图片再次运行时名称不变，也不占用 猫_1.png"""
+    root, src = vault
+    _write(root / "img" / "猫.png", b"x")
+    kept = _write(root / "img" / "猫_2.png", b"y")
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", kept) == ("猫_2.png", 2)
+    assert names.claim("猫", ".png", src["a"]) == ("猫_1.png", 1)
+
+
+@pytest.mark.parametrize("name", ["猫_0.png", "猫_01.png", "猫_x.png", "狗_1.png"])
+def test_other_names_are_not_kept(vault, name):
+    root, src = vault
+    _write(root / "img" / "猫.png", b"x")
+    source = _write(root / "img" / name, b"y")
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", source) == ("猫_1.png", 1)
+
+
+def test_extensions_are_separate(vault):
+    root, src = vault
+    jpg = _write(root / "a.jpg", b"jpg")
+    names = naming.NameIndex(str(root / "img"))
+    assert names.claim("猫", ".png", src["a"]) == ("猫.png", 0)
+    assert names.claim("猫", ".jpg", jpg) == ("猫.jpg", 0)
+
+
+def test_many_duplicates(vault):
+    root, _ = vault
+    names = naming.NameIndex(str(root / "img"))
+    sources = [_write(root / f"s{i}.png", str(i).encode()) for i in range(50)]
+    claimed = [names.claim("图", ".png", s)[0] for s in sources]
+    assert len(set(claimed)) == 50
+    assert claimed[-1] == "图_49.png"
+    assert all(os.path.splitext(n)[1] == ".png" for n in claimed)
+
+
+def test_plan_counts_only_real_collisions(tmp_path):
+    """同一笔记中两个不同的图片描述相同时第二个改名；再次生成计划时保持原名，不算冲突"""
+    _write(tmp_path / "a.png", b"a")
+    _write(tmp_path / "b.png", b"b")
+    note = tmp_path / "n.md"
+    note.write_text("![猫](a.png)\n![猫](b.png)\n", encoding="utf-8")
+
+    plan = core_logic.plan_md_file(str(note))
+    assert [os.path.basename(op["target"]) for op in plan["operations"]] == ["猫.png", "猫_1.png"]
+    assert plan["collisions"] == [{"alt": "猫", "renamed": "猫_1"}]
+
+    core_logic.execute_note_plan(plan)
+    again = core_logic.plan_md_file(str(note))
+    assert again["collisions"] == []
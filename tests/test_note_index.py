@@ -0,0 +1,105 @@
+"""增量索引的测试：未改动的笔记跳过，任何相关变化或失败都会重新处理"""
+import os
+import errno
+import sqlite3
+from collections import Counter
+
+import pytest
+
+import core_logic
+import file_ops
+import note_index
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    with note_index.NoteIndex(str(tmp_path / note_index.INDEX_FILENAME)) as idx:
+        yield idx
+
+
+def _process(note, index, **kwargs):
+    stats = Counter()
+    core_logic.process_md_file(note, stats=stats, index=index, **kwargs)
+    return stats
+
+
+def test_second_run_skips_unchanged_note(tmp_path, index):
+    _write(tmp_path / "shot.png", b"shot")
+    note = _write(tmp_path / "n.md", "![cat](shot.png)\n")
+    assert _process(note, index)["unchanged"] == 0
+    assert _process(note, index)["unchanged"] == 1
+
+
+def test_edited_note_is_processed(tmp_path, index):
+    note = _write(tmp_path / "n.md", "text\n")
+    _process(note, index)
+    _write(tmp_path / "n.md", "more text\n")
+    assert _process(note, index)["unchanged"] == 0
+
+
+def test_touched_note_with_same_content_is_skipped(tmp_path, index):
+    note = _write(tmp_path / "n.md", "text\n")
+    _process(note, index)
+    st = os.stat(note)
+    os.utime(note, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert _process(note, index)["unchanged"] == 1
+
+
+def test_changed_image_is_processed(tmp_path, index):
+    _write(tmp_path / "shot.png", b"shot")
+    note = _write(tmp_path / "n.md", "![cat](shot.png)\n")
+    _process(note, index)
+    _write(tmp_path / "img" / "cat.png", b"changed image")
+    assert _process(note, index)["unchanged"] == 0
+
+
+def test_other_img_dir_is_processed(tmp_path, index):
+    note = _write(tmp_path / "n.md", "text\n")
+    _process(note, index)
+    assert _process(note, index, img_dir_name="assets")["unchanged"] == 0
+
+
+def test_failed_copy_is_retried(tmp_path, index, monkeypatch):
+    _write(tmp_path / "shot.png", b"shot")
+    note = _write(tmp_path / "n.md", "![cat](shot.png)\n")
+
+    def no_space(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    with monkeypatch.context() as m:
+        m.setattr(file_ops, "copy_file", no_space)
+        _process(note, index)
+    assert open(note, encoding="utf-8").read() == "![cat](shot.png)\n"
+
+    stats = _process(note, index)
+    assert stats["unchanged"] == 0
+    assert open(note, encoding="utf-8").read() == "![cat](./img/cat.png)\n"
+    assert (tmp_path / "img" / "cat.png").read_bytes() == b"shot"
+
+
+def test_pending_remote_links(tmp_path, index):
+    note = _write(tmp_path / "n.md", "![r](http://127.0.0.1:9/r.png)\n")
+    _process(note, index)
+    # 没有启用下载时跳过，启用后重新处理
+    assert _process(note, index)["unchanged"] == 1
+    assert _process(note, index, remote_images={})["unchanged"] == 0
+
+
+def test_old_index_without_remote_column(tmp_path):
+    db = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE notes (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, "
+                 "size INTEGER NOT NULL, hash TEXT NOT NULL, img_dir TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    note = _write(tmp_path / "n.md", "text\n")
+    with note_index.NoteIndex(db) as idx:
+        idx.record(note, "img", [])
+        assert idx.is_unchanged(note, "img")
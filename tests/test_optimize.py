@@ -0,0 +1,47 @@
+"""optimize 图片压缩和格式转换的测试，需要 Pillow"""
+import io
+from collections import Counter
+
+import pytest
+
+import optimize
+
+pytestmark = pytest.mark.skipif(not optimize.HAVE_PIL, reason="需要 Pillow")
+
+
+def _png(path):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 30, 30)).save(buf, "PNG")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(buf.getvalue())
+
+
+def test_convert_rewrites_links(tmp_path):
+    _png(tmp_path / "img" / "猫.png")
+    note = tmp_path / "n.md"
+    note.write_text("![猫](./img/猫.png)\n", encoding="utf-8")
+
+    stats = optimize.optimize_images([str(note)], store_dir=str(tmp_path / "cache"), fmt="webp",
+                                     workers=1, stats=Counter())
+
+    assert note.read_text(encoding="utf-8") == "![猫](./img/猫.webp)\n"
+    assert (tmp_path / "img" / "猫.webp").exists()
+    assert not (tmp_path / "img" / "猫.png").exists()
+    assert stats["optimized"] == 1
+    # 改写的笔记单独计数，不混入重命名阶段的 notes_written
+    assert stats["optimize_notes_written"] == 1
+    assert stats["notes_written"] == 0
+
+
+def test_second_run_uses_cache(tmp_path):
+    store = str(tmp_path / "cache")
+    for name in ("one", "two"):
+        _png(tmp_path / name / "img" / "猫.png")
+        (tmp_path / name / "n.md").write_text("![猫](./img/猫.png)\n", encoding="utf-8")
+
+    optimize.optimize_images([str(tmp_path / "one" / "n.md")], store_dir=store, workers=1)
+    stats = optimize.optimize_images([str(tmp_path / "two" / "n.md")], store_dir=store, workers=1,
+                                     stats=Counter())
+
+    assert stats["optimize_cached"] == 1
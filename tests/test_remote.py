@@ -0,0 +1,122 @@
+"""远程图片下载的测试：在线程中运行本地 HTTP 服务器"""
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import remote
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests[self.path] += 1
+        responses = server.routes.get(self.path, [(404, b"")])
+        # 按请求次数依次返回，最后一个响应重复使用
+        status, body = responses[min(server.requests[self.path], len(responses)) - 1]
+        self.send_response(status)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.routes = {}
+    httpd.requests = Counter()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(remote.time, "sleep", lambda seconds: None)
+
+
+def test_fetch_and_cache(server, tmp_path):
+    server.routes["/a.png"] = [(200, b"png-a")]
+    url = server.url + "/a.png"
+    store = str(tmp_path / remote.STORE_DIRNAME)
+
+    stats = Counter()
+    local = remote.fetch_remote_images([url], store, stats=stats)
+    with open(local[url], "rb") as f:
+        assert f.read() == b"png-a"
+    assert local[url].endswith(".png")
+    assert stats["remote_fetched"] == 1 and stats["remote_bytes"] == 5
+
+    # 第二次运行直接使用缓存，不再请求
+    stats = Counter()
+    assert remote.fetch_remote_images([url], store, stats=stats) == local
+    assert stats["remote_cached"] == 1 and stats["remote_fetched"] == 0
+    assert server.requests["/a.png"] == 1
+
+
+def test_same_content_stored_once(server, tmp_path):
+    server.routes["/a.png"] = [(200, b"same")]
+    server.routes["/b.png"] = [(200, b"same")]
+    store = str(tmp_path / remote.STORE_DIRNAME)
+
+    local = remote.fetch_remote_images([server.url + "/a.png", server.url + "/b.png"], store)
+
+    assert local[server.url + "/a.png"] == local[server.url + "/b.png"]
+
+
+def test_not_found_is_not_retried(server, tmp_path):
+    stats = Counter()
+    local = remote.fetch_remote_images([server.url + "/missing.png"],
+                                       str(tmp_path / remote.STORE_DIRNAME), stats=stats)
+
+    assert local == {}
+    assert stats["remote_failed"] == 1
+    assert server.requests["/missing.png"] == 1
+
+
+def test_temporary_error_is_retried(server, tmp_path):
+    server.routes["/flaky.png"] = [(503, b""), (503, b""), (200, b"png")]
+    url = server.url + "/flaky.png"
+
+    local = remote.fetch_remote_images([url], str(tmp_path / remote.STORE_DIRNAME), retries=2)
+
+    assert url in local
+    assert server.requests["/flaky.png"] == 3
+
+
+def test_gives_up_after_retries(server, tmp_path):
+    server.routes["/down.png"] = [(503, b"")]
+    stats = Counter()
+
+    local = remote.fetch_remote_images([server.url + "/down.png"],
+                                       str(tmp_path / remote.STORE_DIRNAME), retries=2, stats=stats)
+
+    assert local == {}
+    assert stats["remote_failed"] == 1
+    assert server.requests["/down.png"] == 3
+
+
+def test_size_limit(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(remote, "MAX_IMAGE_BYTES", 10)
+    server.routes["/big.png"] = [(200, b"x" * 11)]
+    server.routes["/ok.png"] = [(200, b"x" * 10)]
+    stats = Counter()
+
+    local = remote.fetch_remote_images([server.url + "/big.png", server.url + "/ok.png"],
+                                       str(tmp_path / remote.STORE_DIRNAME), stats=stats)
+
+    assert list(local) == [server.url + "/ok.png"]
+    assert stats["remote_failed"] == 1
+    # 过大的图片不重试
+    assert server.requests["/big.png"] == 1
@@ -0,0 +1,77 @@
+"""rename_plan 生成和执行计划的测试"""
+import os
+from collections import Counter
+
+import rename_plan
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    path.write_bytes(data)
+    return str(path)
+
+
+def _vault(tmp_path):
+    _write(tmp_path / "shot.png", b"shot")
+    return _write(tmp_path / "n.md", "![cat](shot.png)\n")
+
+
+def test_plan_only_reads(tmp_path):
+    note = _vault(tmp_path)
+    plan = rename_plan.build_plan([note], workers=1)
+    assert not (tmp_path / "img").exists()
+    assert open(note, encoding="utf-8").read() == "![cat](shot.png)\n"
+    [op] = plan["notes"][0]["operations"]
+    assert os.path.basename(op["target"]) == "cat.png"
+
+
+def test_apply_plan(tmp_path):
+    note = _vault(tmp_path)
+    plan = rename_plan.build_plan([note], workers=1)
+    assert rename_plan.execute_plan(plan) == 1
+    assert (tmp_path / "img" / "cat.png").read_bytes() == b"shot"
+    assert open(note, encoding="utf-8").read() == "![cat](./img/cat.png)\n"
+
+
+def test_stale_note_is_skipped(tmp_path):
+    note = _vault(tmp_path)
+    plan = rename_plan.build_plan([note], workers=1)
+    _write(tmp_path / "n.md", "![cat](shot.png)\nedited\n")
+    stats = Counter()
+    assert rename_plan.execute_plan(plan, stats) == 0
+    assert stats["stale"] == 1
+    assert not (tmp_path / "img" / "cat.png").exists()
+
+
+def test_target_created_after_planning_is_not_overwritten(tmp_path):
+    note = _vault(tmp_path)
+    plan = rename_plan.build_plan([note], workers=1)
+    _write(tmp_path / "img" / "cat.png", b"someone else")
+
+    assert rename_plan.execute_plan(plan) == 0
+
+    assert (tmp_path / "img" / "cat.png").read_bytes() == b"someone else"
+    assert open(note, encoding="utf-8").read() == "![cat](shot.png)\n"
+
+
+def test_moved_target_created_after_planning_is_not_overwritten(tmp_path):
+    note = _vault(tmp_path)
+    plan = rename_plan.build_plan([note], workers=1, move=True)
+    _write(tmp_path / "img" / "cat.png", b"someone else")
+
+    rename_plan.execute_plan(plan)
+
+    assert (tmp_path / "img" / "cat.png").read_bytes() == b"someone else"
+    assert (tmp_path / "shot.png").read_bytes() == b"shot"
+    assert open(note, encoding="utf-8").read() == "![cat](shot.png)\n"
+
+
+def test_identical_target_created_after_planning_is_used(tmp_path):
+    note = _vault(tmp_path)
+    plan = rename_plan.build_plan([note], workers=1)
+    _write(tmp_path / "img" / "cat.png", b"shot")
+
+    assert rename_plan.execute_plan(plan) == 1
+    assert open(note, encoding="utf-8").read() == "![cat](./img/cat.png)\n"
@@ -0,0 +1,96 @@
+"""scanner 流式扫描和忽略规则的测试"""
+import os
+
+import pytest
+
+import scanner
+
+
+def _touch(path, data=b""):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def _scan(root, img_dir_name="img"):
+    return sorted(os.path.relpath(p, root).replace(os.sep, "/")
+                  for p in scanner.iter_md_files(str(root), img_dir_name))
+
+
+def test_default_pruning(tmp_path):
+    for rel in ("a.md", "b.txt", "sub/c.md", ".git/d.md", ".obsidian/e.md",
+                "node_modules/f.md", "venv/g.md", "img/h.md", "sub/img/i.md"):
+        _touch(tmp_path / rel)
+
+    assert _scan(tmp_path) == ["a.md", "sub/c.md"]
+    # 图片目录名可以指定
+    assert "img/h.md" in _scan(tmp_path, "assets")
+
+
+def test_same_directory_is_consecutive(tmp_path):
+    for rel in ("a.md", "sub/x.md", "b.md", "sub/deep/y.md", "sub/z.md"):
+        _touch(tmp_path / rel)
+
+    dirs = [os.path.dirname(p) for p in scanner.iter_md_files(str(tmp_path))]
+
+    # 每个目录的文件连续产出
+    assert len(dirs) == 5
+    assert sum(1 for i, d in enumerate(dirs) if i == 0 or d != dirs[i - 1]) == 3
+
+
+@pytest.mark.parametrize("rules,expected", [
+    # 只匹配文件名的规则在各级目录生效
+    ("draft*.md\n", ["a.md", "sub/a.md"]),
+    # 末尾 / 只匹配目录
+    ("sub/\n", ["a.md", "draft1.md"]),
+    ("a.md/\n", ["a.md", "draft1.md", "sub/a.md", "sub/draft2.md"]),
+    # 含 / 的规则相对规则文件所在目录匹配
+    ("/a.md\n", ["draft1.md", "sub/a.md", "sub/draft2.md"]),
+    ("sub/a.md\n", ["a.md", "draft1.md", "sub/draft2.md"]),
+    # 后出现的 ! 规则取反
+    ("draft*.md\n!draft2.md\n", ["a.md", "sub/a.md", "sub/draft2.md"]),
+    # 注释和空行
+    ("# draft*.md\n\n", ["a.md", "draft1.md", "sub/a.md", "sub/draft2.md"]),
+])
+def test_ignore_rules(tmp_path, rules, expected):
+    for rel in ("a.md", "draft1.md", "sub/a.md", "sub/draft2.md"):
+        _touch(tmp_path / rel)
+    _touch(tmp_path / ".gitignore", rules.encode("utf-8"))
+
+    assert _scan(tmp_path) == expected
+
+
+def test_rules_apply_below_their_directory_only(tmp_path):
+    for rel in ("a.md", "one/a.md", "two/a.md"):
+        _touch(tmp_path / rel)
+    _touch(tmp_path / "one" / ".mdrenameignore", b"a.md\n")
+
+    assert _scan(tmp_path) == ["a.md", "two/a.md"]
+
+
+def test_nested_rule_overrides_parent(tmp_path):
+    for rel in ("a.md", "sub/a.md"):
+        _touch(tmp_path / rel)
+    _touch(tmp_path / ".gitignore", b"a.md\n")
+    _touch(tmp_path / "sub" / ".mdrenameignore", b"!a.md\n")
+
+    assert _scan(tmp_path) == ["sub/a.md"]
+
+
+def test_expand_paths(tmp_path):
+    for rel in ("a.md", "sub/b.md", "c.txt"):
+        _touch(tmp_path / rel)
+
+    paths = [str(tmp_path / "a.md"), str(tmp_path / "sub"), str(tmp_path / "c.txt"),
+             str(tmp_path / "missing.md")]
+    assert list(scanner.expand_paths(paths)) == [str(tmp_path / "a.md"),
+                                                 str(tmp_path / "sub" / "b.md")]
+
+
+def test_expand_paths_is_lazy(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(scanner.os.path, "isdir", lambda p: calls.append(p) or False)
+
+    files = scanner.expand_paths([str(tmp_path)])
+    assert calls == []
+    list(files)
+    assert calls == [str(tmp_path)]
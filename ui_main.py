@@ -1,14 +1,23 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton, QFileDialog, QProgressBar,
     QMenuBar, QMenu, QFrame, QHBoxLayout, QMessageBox, QGraphicsDropShadowEffect,
-    QLineEdit
+    QLineEdit, QPlainTextEdit
 )
 from PyQt6.QtCore import Qt, QTimer
 from PyQt6.QtGui  import QColor, QDragEnterEvent, QDropEvent, QFont, QIcon, QPixmap
 
 import os
 import sys
-import core_logic
+from worker import BatchWorker
+import events
+import note_index
+import report
+import scanner
+
+# 日志面板保留的行数
+LOG_PANEL_LINES = 1000
+# 日志面板的刷新间隔（毫秒），每次把这段时间内的消息一次性追加
+LOG_FLUSH_INTERVAL = 200
 
 def resource_path(relative_path):
     """获取资源的绝对路径，兼容开发环境和PyInstaller打包后的环境"""
@@ -32,6 +41,14 @@ class MainWindow(QWidget):
         self.resize(800, 600)
         self.setWindowTitle(self.texts()["title"])
         self.setAcceptDrops(True)
+        # 后台处理线程
+        self.worker = None
+        # 最近一次处理的 (文件路径, 图片数) 列表
+        self.last_results = []
+        self.last_report = None
+        # 处理消息先进入环形缓冲区，由定时器批量显示到日志面板
+        self.log_sink = events.RingBufferSink()
+        events.set_sink(self.log_sink)
         
         # 设置应用图标
         icon_path = resource_path(os.path.join("resources", "logo.png"))
@@ -257,6 +274,31 @@ class MainWindow(QWidget):
         """)
         main_layout.addWidget(self.status_label)
 
+        # ------ 耗时摘要 ------
+        self.report_label = QLabel()
+        self.report_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.report_label.setWordWrap(True)
+        self.report_label.setStyleSheet("font-size: 12px; color: #7f8c8d;")
+        main_layout.addWidget(self.report_label)
+
+        # ------ 日志面板 ------
+        self.log_view = QPlainTextEdit()
+        self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(LOG_PANEL_LINES)
+        self.log_view.setFixedHeight(110)
+        self.log_view.setStyleSheet("""
+            QPlainTextEdit {
+                border: 1px solid rgba(127, 140, 141, 0.3);
+                border-radius: 6px;
+                background: rgba(127, 140, 141, 0.08);
+                font-size: 12px;
+            }
+        """)
+        main_layout.addWidget(self.log_view)
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_FLUSH_INTERVAL)
+        self.log_timer.timeout.connect(self.flush_log)
+
         # ------ 进度条 ------
         self.progress = QProgressBar()
         self.progress.setFixedHeight(12)
@@ -275,6 +317,28 @@ class MainWindow(QWidget):
         """)
         main_layout.addWidget(self.progress)
 
+        # ------ 取消按钮（仅处理时显示） ------
+        self.btn_cancel = QPushButton(self.texts()["cancel_button"])
+        self.btn_cancel.setStyleSheet("""
+            QPushButton {
+                background: rgba(77, 166, 255, 0.15);
+                color: #4da6ff;
+                border: 1px solid rgba(77, 166, 255, 0.3);
+                border-radius: 6px;
+                padding: 5px 15px;
+                font-size: 13px;
+                max-width: 100px;
+            }
+            QPushButton:hover { 
+                background: rgba(77, 166, 255, 0.25);
+            }
+            QPushButton:pressed { 
+                background: rgba(77, 166, 255, 0.35);
+            }
+        """)
+        self.btn_cancel.hide()
+        main_layout.addWidget(self.btn_cancel, 0, Qt.AlignmentFlag.AlignCenter)
+
         # 添加阴影效果到主要按钮
         for b in (self.btn_file, self.btn_folder):
             b.setGraphicsEffect(self.create_shadow_effect())
@@ -283,6 +347,7 @@ class MainWindow(QWidget):
         self.btn_file.clicked.connect(self.open_files)
         self.btn_folder.clicked.connect(self.open_folder)
         self.btn_theme.clicked.connect(self.toggle_theme)
+        self.btn_cancel.clicked.connect(self.cancel_processing)
 
     # 创建阴影效果
     def create_shadow_effect(self):
@@ -313,7 +378,12 @@ class MainWindow(QWidget):
                 "no_img_msg": "未找到需要处理的图片文件。",
                 "success_title": "处理成功",
                 "language_text": "语言",
-                "img_dir_label": "图片目录"
+                "img_dir_label": "图片目录",
+                "cancel_button": "取消",
+                "cancelled_msg": "已取消：处理了 {0} 个文件，重命名 {1} 个图片文件。",
+                "error_msg": "处理出错：{0}",
+                "report_msg": "耗时 {0:.2f} 秒：{1}",
+                "log_dropped": "……省略 {0} 条消息"
             },
             "en": {
                 "title": "Markdown Image Rename Tool",
@@ -326,7 +396,12 @@ class MainWindow(QWidget):
                 "no_img_msg": "No images found to process.",
                 "success_title": "Success",
                 "language_text": "Language",
-                "img_dir_label": "Image Directory"
+                "img_dir_label": "Image Directory",
+                "cancel_button": "Cancel",
+                "cancelled_msg": "Cancelled: processed {0} files, renamed {1} image files.",
+                "error_msg": "Processing failed: {0}",
+                "report_msg": "Took {0:.2f}s: {1}",
+                "log_dropped": "... {0} messages omitted"
             }
         }[self.lang]
 
@@ -342,6 +417,7 @@ class MainWindow(QWidget):
         self.drop_box.setText(t["drag_hint"])
         self.btn_lang.setText(t["language_text"])
         self.img_dir_label.setText(t["img_dir_label"])
+        self.btn_cancel.setText(t["cancel_button"])
 
     # ---------- 文件选择 ----------
     def open_files(self):
@@ -351,10 +427,9 @@ class MainWindow(QWidget):
     def open_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "Select Folder")
         if folder:
-            md_files = []
-            for root, _, files in os.walk(folder):
-                md_files += [os.path.join(root, f) for f in files if f.endswith(".md")]
-            self.handle_items(md_files)
+            # 在后台线程中边扫描边处理；目录处理使用增量索引，跳过上次处理后未改动的文件
+            md_files = scanner.iter_md_files(folder, self.img_dir_name())
+            self.handle_items(md_files, note_index.default_index_path(folder))
 
     # ---------- 拖拽 ----------
     def dragEnterEvent(self, e: QDragEnterEvent):
@@ -390,7 +465,14 @@ class MainWindow(QWidget):
 
     def dropEvent(self, e: QDropEvent):
         paths = [u.toLocalFile() for u in e.mimeData().urls()]
-        self.handle_items(paths)
+        paths = [p for p in paths if p]
+        if paths:
+            # 拖入的目录与"选择目录处理"一样递归扫描，扫描在后台线程中边进行边处理；
+            # 只拖入一个目录时使用该目录的增量索引
+            index_path = None
+            if len(paths) == 1 and os.path.isdir(paths[0]):
+                index_path = note_index.default_index_path(paths[0])
+            self.handle_items(scanner.expand_paths(paths, self.img_dir_name()), index_path)
         if self.theme == "light":
             self.reset_drop_style()
         else:
@@ -419,27 +501,99 @@ class MainWindow(QWidget):
         """)
 
     # ---------- 处理 ----------
-    def handle_items(self, paths):
+    def img_dir_name(self):
+        """获取用户设置的图片目录"""
+        img_dir_name = self.img_dir_input.text().strip()
+        if not img_dir_name:
+            img_dir_name = "img"  # 默认值
+        return img_dir_name
+
+    def handle_items(self, paths, index_path=None):
+        """处理文件列表，paths 也可以是扫描器产出的生成器"""
         if not paths:
             return
+        # 上一次处理尚未结束
+        if self.worker is not None and self.worker.isRunning():
+            return
             
-        total_img_count = 0
         self.progress.setValue(0)
         self.status_label.setText("")
+        self.report_label.setText("")
+        self.log_view.clear()
+        self.log_sink.drain()
+        self.log_timer.start()
+        img_dir_name = self.img_dir_name()
         
-        # 获取用户设置的图片目录
-        img_dir_name = self.img_dir_input.text().strip()
-        if not img_dir_name:
-            img_dir_name = "img"  # 默认值
-        
-        for p in paths:
-            img_count = core_logic.process_md_file(p, self.update_progress, img_dir_name)
-            total_img_count += img_count
-        
+        # 在后台线程中按目录分组并行处理，避免界面卡死
+        self.worker = BatchWorker(paths, img_dir_name, index_path, self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.result_ready.connect(self.on_batch_finished)
+        self.worker.failed.connect(self.on_batch_failed)
+        self.set_busy(True)
+        self.worker.start()
+
+    def flush_log(self):
+        """把缓冲区中的消息一次性追加到日志面板"""
+        batch, dropped = self.log_sink.drain()
+        lines = [event.message for event in batch]
+        if dropped:
+            lines.insert(0, self.texts()["log_dropped"].format(dropped))
+        if lines:
+            self.log_view.appendPlainText("\n".join(lines))
+
+    def set_busy(self, busy):
+        """处理期间禁用选择按钮并显示取消按钮"""
+        if not busy:
+            self.log_timer.stop()
+            self.flush_log()
+        self.btn_file.setEnabled(not busy)
+        self.btn_folder.setEnabled(not busy)
+        self.btn_cancel.setEnabled(True)
+        self.btn_cancel.setVisible(busy)
+        if not busy:
+            self.progress.setRange(0, 100)
+
+    def cancel_processing(self):
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.btn_cancel.setEnabled(False)
+
+    def on_batch_failed(self, message):
+        self.set_busy(False)
+        self.status_label.setText(self.texts()["error_msg"].format(message))
+        self.status_label.setStyleSheet(f"""
+            color: {'#e74c3c' if self.theme == 'light' else '#ff6b6b'};
+            font-weight: 600;
+            font-size: 15px;
+            min-height: 24px;
+        """)
+
+    def on_batch_finished(self, result):
+        self.set_busy(False)
+        self.last_results = result.results
+        total_img_count = result.images
+        t = self.texts()
+
+        # 各阶段耗时摘要，完整报告保存在 last_report 中
+        self.last_report = report.build_report(result, self.worker.elapsed,
+                                               img_dir=self.img_dir_name())
+        self.report_label.setText(t["report_msg"].format(
+            self.last_report["elapsed"], report.format_stages(self.last_report, self.lang)))
+
+        if result.cancelled:
+            self.status_label.setText(t["cancelled_msg"].format(result.files, total_img_count))
+            self.status_label.setStyleSheet(f"""
+                color: {'#e67e22' if self.theme == 'light' else '#f39c12'};
+                font-weight: 600;
+                font-size: 15px;
+                min-height: 24px;
+            """)
+            QTimer.singleShot(3000, lambda: self.status_label.setText(""))
+            return
+
         self.progress.setValue(100)
         
         # 显示成功消息
-        t = self.texts()
         if total_img_count > 0:
             success_text = t["success_msg"].format(total_img_count)
             self.status_label.setText(success_text)
@@ -529,7 +683,18 @@ class MainWindow(QWidget):
 
     def update_progress(self, cur, tot):
         if tot > 0:
+            self.progress.setRange(0, 100)
             self.progress.setValue(int(cur / tot * 100))
+        else:
+            # 仍在扫描目录，总数未知时显示忙碌状态
+            self.progress.setRange(0, 0)
+
+    def closeEvent(self, e):
+        # 关闭窗口时停止后台处理，等待已提交的文件处理完
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+        super().closeEvent(e)
 
     # ---------- 主题切换 ----------
     def toggle_theme(self):
@@ -641,6 +806,7 @@ class MainWindow(QWidget):
             """
             self.btn_theme.setStyleSheet(btn_style)
             self.btn_lang.setStyleSheet(btn_style)
+            self.btn_cancel.setStyleSheet(btn_style)
         else:
             self.theme = "light"
             self.setStyleSheet("""
@@ -745,4 +911,5 @@ class MainWindow(QWidget):
             """
             self.btn_theme.setStyleSheet(btn_style)
             self.btn_lang.setStyleSheet(btn_style)
+            self.btn_cancel.setStyleSheet(btn_style)
     
@@ -0,0 +1,201 @@
+"""监视模式：笔记保存后自动处理其中的图片
+
+优先使用 watchdog（inotify/FSEvents/ReadDirectoryChangesW）接收文件事件，
+未安装 watchdog 时退回到定时轮询。
+
+    - 同一文件短时间内的多次写入会合并为一次处理（防抖）
+    - 只处理发生变化的那个 .md 文件
+    - 忽略图片目录中的变化，以及本工具自己写回 .md 文件产生的事件
+"""
+import os
+import time
+import threading
+from collections import Counter
+
+import core_logic
+import events
+import scanner
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    HAVE_WATCHDOG = True
+except ImportError:
+    HAVE_WATCHDOG = False
+
+# 默认防抖时间（秒）：最后一次写入后等待这么久再处理
+DEFAULT_DEBOUNCE = 0.5
+# 轮询模式下的默认扫描间隔（秒）
+DEFAULT_POLL_INTERVAL = 1.0
+# 轮询模式下没有变化时扫描间隔逐次加倍，最长为这么多秒；发现变化后恢复为 poll_interval
+MAX_POLL_INTERVAL = 8.0
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+if HAVE_WATCHDOG:
+    class _EventHandler(FileSystemEventHandler):
+        """把 watchdog 事件转交给 Watcher"""
+
+        def __init__(self, watcher):
+            super().__init__()
+            self.watcher = watcher
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self.watcher.notify(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self.watcher.notify(event.src_path)
+
+        def on_moved(self, event):
+            # 编辑器常用"写临时文件再改名"的方式保存
+            if not event.is_directory:
+                self.watcher.notify(event.dest_path)
+
+
+class Watcher:
+    """监视目录并增量处理保存的Markdown文件
+
+    Args:
+        root: 要监视的根目录
+        img_dir_name: 图片保存目录名称，默认为"img"
+        debounce: 防抖时间（秒）
+        poll_interval: 轮询模式下的扫描间隔（秒），空闲时逐渐延长到 MAX_POLL_INTERVAL
+        use_polling: 即使安装了 watchdog 也使用轮询
+        on_processed: 每处理完一个文件后的回调，参数为 (文件路径, 图片数)
+    """
+
+    def __init__(self, root, img_dir_name="img", debounce=DEFAULT_DEBOUNCE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_polling=False, on_processed=None):
+        self.root = os.path.abspath(root)
+        self.img_dir_name = img_dir_name
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_polling = use_polling or not HAVE_WATCHDOG
+        self.on_processed = on_processed
+        self.stats = Counter()
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # 待处理文件 -> 最早处理时间
+        self._pending = {}
+        # 本工具写回后文件的 (修改时间, 大小)，用于忽略自己产生的事件；事件处理后删除
+        self._own_writes = {}
+        # 轮询模式下上次扫描到的 文件 -> (修改时间, 大小)
+        self._snapshot = None
+
+    def _is_candidate(self, path):
+        if not path.endswith(".md"):
+            return False
+        parts = os.path.relpath(path, self.root).split(os.sep)[:-1]
+        return not any(p == self.img_dir_name or p.startswith(".")
+                       or p in scanner.DEFAULT_IGNORED_DIRS for p in parts)
+
+    def notify(self, path):
+        """登记一次文件变化，可以从任意线程调用"""
+        path = os.path.abspath(path)
+        if not self._is_candidate(path):
+            return
+        with self._lock:
+            self._pending[path] = time.monotonic() + self.debounce
+        self._wakeup.set()
+
+    def _scan(self):
+        """轮询模式：扫描目录树，登记变化过的文件，返回是否有变化"""
+        snapshot = {}
+        for path in scanner.iter_md_files(self.root, self.img_dir_name):
+            key = _stat_key(path)
+            if key is not None:
+                snapshot[path] = key
+        previous, self._snapshot = self._snapshot, snapshot
+        # 第一次扫描只建立基准，不处理已有文件
+        if previous is None:
+            return False
+        changed = False
+        for path, key in snapshot.items():
+            if previous.get(path) != key:
+                self.notify(path)
+                changed = True
+        return changed or len(previous) != len(snapshot)
+
+    def _take_due(self):
+        """取出已过防抖时间的文件，返回 (文件列表, 距下一个到期的秒数)"""
+        now = time.monotonic()
+        with self._lock:
+            due = [p for p, t in self._pending.items() if t <= now]
+            for p in due:
+                del self._pending[p]
+            next_deadline = min(self._pending.values(), default=None)
+        timeout = None if next_deadline is None else max(0.0, next_deadline - now)
+        return due, timeout
+
+    def _process(self, path):
+        key = _stat_key(path)
+        own = self._own_writes.pop(path, None)
+        if key is None or own == key:
+            # 文件已被删除，或是本工具刚写回的内容，没有新的修改
+            return
+        img_count = core_logic.process_md_file(path, None, self.img_dir_name, self.stats)
+        written = _stat_key(path)
+        if written != key:
+            # 写回了文件，随后会收到这次写入产生的事件
+            self._own_writes[path] = written
+        if self.on_processed:
+            self.on_processed(path, img_count)
+
+    def run(self, stop_event=None):
+        """阻塞运行，直到 stop_event 被设置
+
+        watchdog 模式下空闲时只等待事件，每秒最多醒来一次检查停止标志；
+        轮询模式每隔 poll_interval 扫描一次，连续没有变化时间隔逐次加倍，最长 MAX_POLL_INTERVAL。
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+
+        observer = None
+        if self.use_polling:
+            self._scan()
+        else:
+            observer = Observer()
+            observer.schedule(_EventHandler(self), self.root, recursive=True)
+            observer.start()
+        events.emit(events.INFO, "开始监视: {}（{}模式）", self.root,
+                    "轮询" if self.use_polling else "watchdog")
+
+        interval = self.poll_interval
+        next_poll = time.monotonic() + interval
+        try:
+            while not stop_event.is_set():
+                self._wakeup.clear()
+                due, timeout = self._take_due()
+                for path in due:
+                    self._process(path)
+
+                if self.use_polling:
+                    now = time.monotonic()
+                    if now >= next_poll:
+                        if self._scan():
+                            interval = self.poll_interval
+                        else:
+                            interval = min(interval * 2, max(self.poll_interval, MAX_POLL_INTERVAL))
+                        next_poll = now + interval
+                        continue
+                    wait_time = next_poll - now
+                    timeout = wait_time if timeout is None else min(timeout, wait_time)
+
+                # stop 时也需要及时醒来
+                if timeout is None or timeout > 1.0:
+                    timeout = 1.0
+                self._wakeup.wait(timeout)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
@@ -0,0 +1,60 @@
+"""后台处理线程，避免在GUI线程中执行耗时的批量处理"""
+import time
+import threading
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+import batch
+
+# 进度信号的最小发送间隔（秒）
+PROGRESS_INTERVAL = 0.1
+
+
+class BatchWorker(QThread):
+    """在后台线程中运行 batch.process_batch
+
+    信号:
+        progress(已完成文件数, 文件总数): 节流后的进度
+        result_ready(BatchResult): 处理结束（包括被取消）后发送，总耗时保存在 elapsed 属性中
+        failed(错误信息): 批量处理本身出错时发送
+    """
+    progress = pyqtSignal(int, int)
+    result_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, md_files, img_dir_name="img", index_path=None, parent=None):
+        super().__init__(parent)
+        self.md_files = md_files
+        self.img_dir_name = img_dir_name
+        self.index_path = index_path
+        self._cancel_event = threading.Event()
+        self._last_emit = 0.0
+        self.elapsed = 0.0
+
+    def cancel(self):
+        """请求取消，已提交的文件会处理完再停止"""
+        self._cancel_event.set()
+
+    def _on_progress(self, cur, tot):
+        # 节流：总数已知时最后一次进度总是发送；边扫描边处理时总数为 0，全部节流，
+        # 最终结果由 result_ready 给出
+        now = time.monotonic()
+        if (tot > 0 and cur >= tot) or now - self._last_emit >= PROGRESS_INTERVAL:
+            self._last_emit = now
+            self.progress.emit(cur, tot)
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            result = batch.process_batch(
+                self.md_files,
+                self.img_dir_name,
+                progress_callback=self._on_progress,
+                cancel_event=self._cancel_event,
+                index_path=self.index_path,
+            )
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.elapsed = time.perf_counter() - start
+        self.result_ready.emit(result)